@@ -0,0 +1,215 @@
+# analytics.py
+"""Sales analytics over date ranges: top sellers, an hour-of-day x weekday heatmap and per-product velocity.
+
+Every day of sales is summarized once (per product: units, revenue, the
+day itself and its latest name; per weekday and hour: revenue, units and
+bills) and whole months are the sums of their days. A range is answered by
+adding up the summaries of the whole months it spans and of the single
+days at its ends, so after the first request a year of history costs a few
+dozen dictionary merges rather than a scan of every sales line. Summaries
+are cached with the day's or month's sales totals as their version: a new
+bill only invalidates its own day, its month and the ranges that include it.
+"""
+import calendar
+import heapq
+from datetime import date
+from itertools import groupby
+from operator import add, itemgetter
+
+from metrics import phase
+
+HOURS = 24
+WEEKDAYS = tuple(calendar.day_abbr)  # ('Mon', ..., 'Sun'), the order of date.weekday()
+
+# Fields of a velocity row, in the order they are sent
+VELOCITY_FIELDNAMES = ['product_id', 'product_name', 'quantity', 'revenue', 'days_sold', 'last_sold',
+                       'units_per_day', 'revenue_per_day']
+
+_COLUMNS = itemgetter('bill_id', 'time', 'product_id', 'product_name', 'quantity', 'total_amount')
+
+
+def _hour(value):
+    """Returns the hour of an 'HH:MM:SS' time, or 0 if it does not parse."""
+    try:
+        hour = int(value[:2])
+    except (TypeError, ValueError):
+        return 0
+    return hour if 0 <= hour < HOURS else 0
+
+
+def _version(totals):
+    return (totals.revenue, totals.transactions, totals.items)
+
+
+class SalesSummary:
+    """Per-product totals and a weekday x hour grid of one day, month or range of sales.
+
+    ``products`` maps a product id to [units, revenue, days sold, last day
+    sold, product name]. The grid is three flat lists of 7 * 24 cells
+    (weekday-major): revenue, units and bills. Summaries are shared through
+    the cache and must not be modified; ``merge`` builds new ones.
+    """
+
+    __slots__ = ('products', 'revenue', 'items', 'transactions', 'first_day', 'last_day')
+
+    def __init__(self):
+        self.products = {}
+        self.revenue = [0.0] * (7 * HOURS)
+        self.items = [0] * (7 * HOURS)
+        self.transactions = [0] * (7 * HOURS)
+        self.first_day = None
+        self.last_day = None
+
+    def __len__(self):
+        # Cache accounting: one "row" per product
+        return len(self.products) + 1
+
+    @classmethod
+    def of_day(cls, day, rows):
+        """Summarizes the sales lines of one 'YYYY-MM-DD' day in a single grouped pass."""
+        summary = cls()
+        if not rows:
+            return summary
+        summary.first_day = summary.last_day = day
+        base = date.fromisoformat(day).weekday() * HOURS
+        products = summary.products
+        revenue, items, transactions = summary.revenue, summary.items, summary.transactions
+        bills = set()
+        for bill_id, time, product_id, name, quantity, amount in map(_COLUMNS, rows):
+            entry = products.get(product_id)
+            if entry is None:
+                products[product_id] = [quantity, amount, 1, day, name]
+            else:
+                entry[0] += quantity
+                entry[1] += amount
+                entry[4] = name
+            cell = base + _hour(time)
+            revenue[cell] += amount
+            items[cell] += quantity
+            # A bill's lines share one time, so it counts in a single cell
+            if bill_id not in bills:
+                bills.add(bill_id)
+                transactions[cell] += 1
+        return summary
+
+    @classmethod
+    def merge(cls, summaries):
+        """Returns the sum of ``summaries``, which cover disjoint days, oldest first."""
+        merged = cls()
+        products = merged.products
+        for summary in summaries:
+            if summary.first_day is None:
+                continue
+            for product_id, (quantity, revenue, days, last_day, name) in summary.products.items():
+                entry = products.get(product_id)
+                if entry is None:
+                    products[product_id] = [quantity, revenue, days, last_day, name]
+                else:
+                    entry[0] += quantity
+                    entry[1] += revenue
+                    entry[2] += days
+                    entry[3] = last_day
+                    entry[4] = name
+            merged.revenue = list(map(add, merged.revenue, summary.revenue))
+            merged.items = list(map(add, merged.items, summary.items))
+            merged.transactions = list(map(add, merged.transactions, summary.transactions))
+            merged.first_day = merged.first_day or summary.first_day
+            merged.last_day = summary.last_day
+        return merged
+
+    def top(self, count, by='revenue'):
+        """Returns the ``count`` best-selling products by 'revenue' or 'quantity'."""
+        index = 1 if by == 'revenue' else 0
+        best = heapq.nlargest(count, self.products.items(), key=lambda item: (item[1][index], -item[0]))
+        return [{'product_id': product_id, 'product_name': name, 'quantity': quantity,
+                 'revenue': round(revenue, 2), 'days_sold': days, 'last_sold': last_day}
+                for product_id, (quantity, revenue, days, last_day, name) in best]
+
+    def heatmap(self):
+        """Returns revenue, units and bills per weekday (Mon first) and hour, as 7 lists of 24."""
+        def grid(cells, digits=None):
+            rows = [cells[weekday * HOURS:(weekday + 1) * HOURS] for weekday in range(7)]
+            return [[round(value, digits) for value in row] for row in rows] if digits else rows
+
+        return {'weekdays': list(WEEKDAYS), 'hours': list(range(HOURS)), 'revenue': grid(self.revenue, 2),
+                'items': grid(self.items), 'transactions': grid(self.transactions)}
+
+    def velocity(self, days):
+        """Returns a row per product with its units and revenue per day over a range ``days`` long.
+
+        Rows come fastest-selling first.
+        """
+        days = max(days, 1)
+        rows = [{'product_id': product_id, 'product_name': name, 'quantity': quantity,
+                 'revenue': round(revenue, 2), 'days_sold': sold, 'last_sold': last_day,
+                 'units_per_day': round(quantity / days, 4), 'revenue_per_day': round(revenue / days, 2)}
+                for product_id, (quantity, revenue, sold, last_day, name) in self.products.items()]
+        rows.sort(key=lambda row: (-row['units_per_day'], row['product_id']))
+        return rows
+
+
+def range_days(summary, date_from=None, date_to=None):
+    """Returns the number of days from ``date_from`` (or the first sale) to ``date_to`` (or the last)."""
+    first = date_from or summary.first_day
+    last = date_to or summary.last_day
+    if first is None or last is None:
+        return 0
+    return (date.fromisoformat(last) - date.fromisoformat(first)).days + 1
+
+
+class SalesAnalytics:
+    """Builds and caches SalesSummary objects per store, day, month and requested range.
+
+    ``cache`` is a DataStore of its own, so analytics never push parsed
+    sales out of the data cache. ``sales`` is a store's SalesLedger or
+    PartitionedSales; anything with ``days``, ``day``, ``month`` and
+    ``rows_for_day`` works.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def summary(self, username, sales, date_from=None, date_to=None):
+        """Returns the SalesSummary of ``username``'s sales from ``date_from`` to ``date_to`` (inclusive).
+
+        The cached summary is versioned by the totals of the days and months
+        it covers, so bills outside the range leave it in place.
+        """
+        parts = self._parts(sales, date_from, date_to)
+        version = tuple((name, _version(totals)) for name, totals, _ in parts)
+        return self.cache.get(('range', username, date_from, date_to), version,
+                              lambda: self._summarize(username, sales, parts))
+
+    def _parts(self, sales, date_from, date_to):
+        """Returns (month or day, its Totals, its days) for the whole months and single days in a range."""
+        days = [day for day in sales.days()
+                if day and (date_from is None or day >= date_from) and (date_to is None or day <= date_to)]
+        parts = []
+        for month, month_days in groupby(days, key=lambda day: day[:7]):
+            month_days = list(month_days)
+            if self._covers_month(month, date_from, date_to):
+                parts.append((month, sales.month(month), month_days))
+            else:
+                parts.extend((day, sales.day(day), [day]) for day in month_days)
+        return parts
+
+    def _summarize(self, username, sales, parts):
+        with phase('analytics'):
+            return SalesSummary.merge(
+                self._month(username, sales, name, totals, days) if len(name) == len('YYYY-MM')
+                else self._day(username, sales, name, totals)
+                for name, totals, days in parts)
+
+    @staticmethod
+    def _covers_month(month, date_from, date_to):
+        year, number = int(month[:4]), int(month[5:7])
+        last = f"{month}-{calendar.monthrange(year, number)[1]:02d}"
+        return (date_from is None or date_from <= f"{month}-01") and (date_to is None or date_to >= last)
+
+    def _month(self, username, sales, month, totals, days):
+        return self.cache.get(('month', username, month), _version(totals), lambda: SalesSummary.merge(
+            self._day(username, sales, day, sales.day(day)) for day in days))
+
+    def _day(self, username, sales, day, totals):
+        return self.cache.get(('day', username, day), _version(totals),
+                              lambda: SalesSummary.of_day(day, sales.rows_for_day(day)))
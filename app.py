@@ -1,14 +1,86 @@
 # app.py
-from flask import Flask, jsonify, render_template, request, redirect, url_for, flash
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-import csv
-from datetime import datetime, timedelta
+from flask import Flask, Response, g, jsonify, make_response, render_template, request, redirect, url_for, flash
+from flask.json.provider import DefaultJSONProvider
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from werkzeug.utils import secure_filename
+from datetime import datetime
+import atexit
+import hashlib
 import os
+import threading
+import time
+import click
+from datastore import DataStore, INVENTORY_FIELDNAMES, SALES_FIELDNAMES, to_int, to_float
+from storage import create_backend, CsvBackend, SqliteBackend
+from listing import ListingArgs, sort_rows, respond, bad_listing_request
+from status import STATUSES, StatusRules
+from events import EventBus
+from bulk import IMPORT_FORMATS, MAX_REPORTED_ERRORS, import_format, read_records, clean_record, export_csv, export_ndjson
+from metrics import (REQUEST_SECONDS, REQUESTS, Gauge, TimedBackend, exposition, phase,
+                     start_request, finish_request)
+from profiling import SlowRequestProfiler
+from passwords import DEFAULT_METHOD, HasherBusy, PasswordHasher
+from analytics import VELOCITY_FIELDNAMES, SalesAnalytics, range_days
+from forecast import REORDER_FIELDNAMES, ReorderForecaster, ReorderRules
 
 app = Flask(__name__)
 # You MUST set a secret key for sessions to work
 app.config['SECRET_KEY'] = 'your_secret_key_here' 
+# Upper bound on parsed CSV rows kept in memory across all users
+app.config['DATA_CACHE_MAX_ROWS'] = int(os.environ.get('DATA_CACHE_MAX_ROWS', 500000))
+# Upper bound on product entries kept in the sales analytics summaries
+app.config['ANALYTICS_CACHE_MAX_ROWS'] = int(os.environ.get('ANALYTICS_CACHE_MAX_ROWS', 500000))
+# Where users, inventory and sales live: 'csv' (default) or 'sqlite'
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'csv')
+app.config['DATA_DIR'] = os.environ.get('DATA_DIR', '.')
+app.config['SQLITE_PATH'] = os.environ.get('SQLITE_PATH', 'pharmacy.db')
+# Keep binary column snapshots next to the CSV files for faster cold loads
+app.config['CSV_SNAPSHOTS'] = os.environ.get('CSV_SNAPSHOTS', '0') == '1'
+# Build every store's cached data and KPI totals at startup instead of on first use
+app.config['WARM_CACHE'] = os.environ.get('WARM_CACHE', '0') == '1'
+# Items expiring within this many days are "Expiring Soon"; at or below this quantity, "Low Stock"
+app.config['EXPIRING_SOON_DAYS'] = int(os.environ.get('EXPIRING_SOON_DAYS', 90))
+app.config['LOW_STOCK_QUANTITY'] = int(os.environ.get('LOW_STOCK_QUANTITY', 20))
+# Reorder forecasts: days of sales the rate is taken from, days an order takes to arrive and
+# days it should last, and worker processes forecasting all stores at startup (0 = none)
+app.config['REORDER_WINDOW_DAYS'] = int(os.environ.get('REORDER_WINDOW_DAYS', 30))
+app.config['REORDER_LEAD_DAYS'] = int(os.environ.get('REORDER_LEAD_DAYS', 7))
+app.config['REORDER_COVER_DAYS'] = int(os.environ.get('REORDER_COVER_DAYS', 30))
+app.config['REORDER_WORKERS'] = int(os.environ.get('REORDER_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Password hashing: Werkzeug method spelled out in full (as stored in hashes), worker
+# processes (0 = hash on the request thread) and how many sign-ins may wait for them
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 4 * max(1, app.config['PASSWORD_HASH_WORKERS'])))
+# Write a sampled profile of every request slower than this many milliseconds (0 = off)
+app.config['PROFILE_SLOW_REQUESTS_MS'] = int(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+app.config['PROFILE_INTERVAL_MS'] = int(os.environ.get('PROFILE_INTERVAL_MS', 5))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Counts JSON encoding towards the serialization phase on /metrics."""
+
+    def dumps(self, obj, **kwargs):
+        with phase('serialization'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+# Parsed inventory/sales rows, shared between requests
+store = DataStore(max_rows=app.config['DATA_CACHE_MAX_ROWS'])
+backend = TimedBackend(create_backend(app.config, store))
+Gauge('pharmacy_cache_rows', 'Parsed rows currently held in the data cache.', lambda: store.total_rows)
+# Per-day, per-month and per-range sales summaries for the analytics endpoints
+analytics = SalesAnalytics(DataStore(max_rows=app.config['ANALYTICS_CACHE_MAX_ROWS']))
+# Reorder forecasts per store, kept alongside the analytics summaries
+forecaster = ReorderForecaster(backend, analytics, app.config, app.config['REORDER_WORKERS'])
+# Live inventory/bill events for the open pages of each store
+event_bus = EventBus()
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                                 app.config['PASSWORD_HASH_QUEUE'])
+atexit.register(password_hasher.shutdown)
+Gauge('pharmacy_password_hash_pending', 'Password hashes and checks running or queued.',
+      lambda: password_hasher.pending)
 
 # --- Authentication & User Management ---
 
@@ -19,35 +91,48 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 
-class User(UserMixin):
-    """User class for Flask-Login"""
-    def __init__(self, id, username, password_hash):
-        self.id = id
-        self.username = username
-        self.password_hash = password_hash
-
-    @staticmethod
-    def get(user_id):
-        """Load user by ID"""
-        users = load_data_from_csv('users.csv')
-        for user in users:
-            if user.get('id') == user_id:
-                return User(user['id'], user['username'], user['password_hash'])
-        return None
+def get_user(user_id):
+    """Load user by ID"""
+    return backend.load_user_registry().get(user_id)
 
-    @staticmethod
-    def get_by_username(username):
-        """Load user by username"""
-        users = load_data_from_csv('users.csv')
-        for user in users:
-            if user.get('username').lower() == username.lower():
-                return User(user['id'], user['username'], user['password_hash'])
-        return None
+def get_user_by_username(username):
+    """Load user by username"""
+    return backend.load_user_registry().find(username)
 
 @login_manager.user_loader
 def load_user(user_id):
     """Required callback for Flask-Login to load a user from session"""
-    return User.get(user_id)
+    return get_user(user_id)
+
+# Seconds a client is asked to wait when every password worker is busy
+PASSWORD_RETRY_AFTER_SECONDS = 2
+
+def hasher_busy(template):
+    """Re-renders an auth form with 503 Service Unavailable while the hashing backlog is full."""
+    flash('Too many sign-ins at once. Please try again in a moment.', 'danger')
+    response = make_response(render_template(template), 503)
+    response.headers['Retry-After'] = str(PASSWORD_RETRY_AFTER_SECONDS)
+    return response
+
+def rehash_password(user, password):
+    """Re-hashes a just-verified password with the configured parameters, in the background."""
+    try:
+        future = password_hasher.submit_hash(password)
+    except HasherBusy:
+        return  # Next time they log in
+    old_hash = user.password_hash
+
+    def store(future):
+        if future.exception() is not None:
+            print(f"Error rehashing the password of {user.username}: {future.exception()}")
+            return
+        with backend.registry_lock():
+            current = get_user(user.id)
+            # Skip it if the password changed in the meantime
+            if current is not None and current.password_hash == old_hash:
+                backend.update_password_hash(user.id, future.result())
+
+    future.add_done_callback(store)
 
 # --- Authentication Routes (NEW) ---
 
@@ -59,9 +144,15 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        user = User.get_by_username(username)
+        user = get_user_by_username(username)
 
-        if user and check_password_hash(user.password_hash, password):
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, password)
+        except HasherBusy:
+            return hasher_busy('login.html')
+        if valid:
+            if password_hasher.needs_rehash(user.password_hash):
+                rehash_password(user, password)
             login_user(user, remember=True)
             flash('Logged in successfully!', 'success')
             return redirect(url_for('home'))
@@ -79,37 +170,20 @@ def register():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        if User.get_by_username(username):
+        # Turn a taken name away before paying for a hash; re-checked below under the lock
+        if get_user_by_username(username):
             flash('Username already exists.', 'danger')
             return redirect(url_for('register'))
-
-        users = load_data_from_csv('users.csv')
-        user_fieldnames = ['id', 'username', 'password_hash']
-        
         try:
-            new_id = max([int(u['id']) for u in users if u.get('id', '').isdigit()]) + 1 if users else 1
-        except (ValueError, IndexError):
-            new_id = 1
-        
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256:1000000')
-        
-        new_user = {
-            'id': new_id,
-            'username': username,
-            'password_hash': hashed_password
-        }
-        users.append(new_user)
-        save_data_to_csv('users.csv', users, user_fieldnames)
-
-        # --- Create user-specific files ---
-        # This is the core of your request
-        inventory_fieldnames = ['id', 'name', 'Manufacturer', 'expiry_date', 'quantity', 'price']
-        sales_fieldnames = ['bill_id', 'date', 'time', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_amount']
-        
-        # Create empty inventory file
-        save_data_to_csv(f"{username}_inventory.csv", [], inventory_fieldnames)
-        # Create empty sales file
-        save_data_to_csv(f"{username}_sales.csv", [], sales_fieldnames)
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy:
+            return hasher_busy('register.html')
+        with backend.registry_lock():
+            if get_user_by_username(username):
+                flash('Username already exists.', 'danger')
+                return redirect(url_for('register'))
+            # Creates the user and their (empty) inventory; the sales files follow on first use
+            backend.create_user(username, hashed_password)
         
         flash('Account created! You can now log in.', 'success')
         return redirect(url_for('login'))
@@ -125,13 +199,224 @@ def logout():
 
 # --- Helper Functions (MODIFIED) ---
 
-def get_user_inventory_file():
-    """Gets the inventory file path for the currently logged-in user."""
-    return f"{current_user.username}_inventory.csv"
+def load_user_inventory():
+    """Returns the logged-in user's cached, indexed Inventory."""
+    return backend.load_inventory(current_user.username)
+
+def save_user_inventory(inventory):
+    """Persists the logged-in user's Inventory and keeps it as the cached copy."""
+    backend.save_inventory(current_user.username, inventory)
+
+def publish_change(event, data):
+    """Sends a change event to every open page of the logged-in user's store."""
+    event_bus.publish(current_user.username, event, data)
+
+def upsert_medicine(inventory, data):
+    """Adds a medicine, or restocks the one with the same name and Manufacturer.
+
+    Returns (row, units added, True if the medicine is new); raises
+    ValueError for a bad quantity or price of an existing medicine.
+    """
+    medicine_name = data.get('name', '').strip()
+    medicine_manufacturer = data.get('Manufacturer', '').strip()
+
+    item = inventory.find(medicine_name, medicine_manufacturer)
+    if item is not None:
+        try:
+            changes = {'quantity': item['quantity'] + int(data.get('quantity', 0))}
+            if data.get('price'):
+                changes['price'] = float(data.get('price'))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid quantity or price.")
+        row = inventory.update(item['id'], **changes)
+        return row, row['quantity'] - item['quantity'], False
+
+    row = inventory.add({
+        'id': inventory.next_id(),
+        'name': medicine_name,
+        'Manufacturer': data.get('Manufacturer'),
+        'expiry_date': data.get('expiry_date'),
+        'quantity': to_int(data.get('quantity')),
+        'price': to_float(data.get('price'))
+    })
+    return row, row['quantity'], True
+
+class BillError(Exception):
+    """A bill that cannot be checked out; ``status`` is the HTTP status to answer with."""
 
-def get_user_sales_file():
-    """Gets the sales file path for the currently logged-in user."""
-    return f"{current_user.username}_sales.csv"
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def build_bill(inventory, items_sold, stock, bill_id, now):
+    """Validates one bill's lines and returns (sales lines, new quantity per item id).
+
+    ``stock`` holds quantities already reduced by earlier bills of a batch;
+    items not in it are checked against the inventory. Nothing is changed;
+    raises BillError if any line is invalid.
+    """
+    current_date = now.strftime('%Y-%m-%d')
+    current_time = now.strftime('%H:%M:%S')
+    new_sales_entries = []
+    # Remaining stock per item id after this bill
+    new_quantities = {}
+
+    for item_sold in items_sold:
+        if not isinstance(item_sold, dict):
+            raise BillError("Each bill line needs an id and a quantity.")
+        try:
+            item_id = int(item_sold.get('id'))
+        except (TypeError, ValueError):
+            raise BillError(f"Invalid item ID {item_sold.get('id')!r}.")
+        try:
+            quantity_sold = int(item_sold.get('quantity', 0))
+        except (TypeError, ValueError):
+            quantity_sold = 0
+
+        if quantity_sold <= 0:
+            raise BillError(f"Invalid quantity for item ID {item_id}.")
+
+        inv_item = inventory.get(item_id)
+        if inv_item is None:
+            raise BillError(f"Item with ID {item_id} not found in inventory.", 404)
+
+        current_quantity = new_quantities.get(item_id, stock.get(item_id, inv_item['quantity']))
+        if current_quantity < quantity_sold:
+            raise BillError(f"Not enough stock for {inv_item.get('name')}.")
+
+        new_quantities[item_id] = current_quantity - quantity_sold
+        new_sales_entries.append({
+            'bill_id': bill_id,
+            'date': current_date,
+            'time': current_time,
+            'product_id': item_id,
+            'product_name': inv_item.get('name'),
+            'quantity': quantity_sold,
+            'unit_price': inv_item.get('price'),
+            'total_amount': round(inv_item['price'] * quantity_sold, 2)
+        })
+    return new_sales_entries, new_quantities
+
+def publish_bill(inventory, bill_id, lines, new_quantities):
+    """Sends a saved bill, and the stock it changed, to the store's open pages."""
+    changed_items = [inventory.get(item_id) for item_id in new_quantities]
+    items_sold = sum(line['quantity'] for line in lines)
+    publish_change('bill', {
+        "bill_id": bill_id,
+        "lines": lines,
+        "items": [dict(item, status=get_medicine_status(item)) for item in changed_items],
+        "revenue": round(sum(line['total_amount'] for line in lines), 2),
+        "items_sold": items_sold,
+        "quantity_delta": -items_sold
+    })
+
+def load_user_sales():
+    """Returns the logged-in user's cached SalesLedger (rows plus running KPI totals)."""
+    return backend.load_sales(current_user.username)
+
+def normalize_status(status):
+    """Maps "Low Stock", "low-stock" and "status-low-stock" alike to "low-stock"."""
+    status = status.strip().lower().replace(' ', '-')
+    return status[len('status-'):] if status.startswith('status-') else status
+
+def parse_date_arg(name):
+    """Returns a 'YYYY-MM-DD' query argument, or None; raises ValueError if malformed."""
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format.")
+    return value
+
+def list_user_sales(date_from=None, date_to=None, exclude_day=None):
+    """Sends the logged-in user's sales within the given dates, filtered, sorted and paged per the query string.
+
+    Supports ``date_from``/``date_to`` (narrowing the endpoint's own range),
+    ``product`` (product id or part of its name), ``q`` (bill id, product or
+    date, like the sales page search box), plus the ListingArgs options.
+    """
+    try:
+        listing = ListingArgs(request.args, SALES_FIELDNAMES)
+        requested_from, requested_to = parse_date_arg('date_from'), parse_date_arg('date_to')
+    except ValueError as e:
+        return bad_listing_request(e)
+    date_from = max(filter(None, [date_from, requested_from]), default=None)
+    date_to = min(filter(None, [date_to, requested_to]), default=None)
+
+    sales = load_user_sales()
+    rows = sales.select(date_from, date_to, exclude_day, reverse=listing.reverse_natural)
+    # Counted from the per-day totals, so a page reads only the days it shows
+    total = sales.count(date_from, date_to, exclude_day)
+
+    product = request.args.get('product', '').strip().lower()
+    if product.isdigit():
+        rows = (s for s in rows if s['product_id'] == int(product))
+    elif product:
+        rows = (s for s in rows if product in s.get('product_name', '').lower())
+    query = request.args.get('q', '').strip().lower()
+    if query:
+        rows = (s for s in rows
+                if query in s.get('product_name', '').lower() or query in str(s['bill_id'])
+                or query in s.get('date', ''))
+    if product or query:
+        total = None
+    return respond(sort_rows(rows, listing), listing, total=total)
+
+def warm_cache():
+    """Loads every store's inventory and sales (and so builds the KPI totals, status columns and sales analytics) ahead of the first request."""
+    for username in backend.usernames():
+        backend.load_inventory(username).columns()
+        analytics.summary(username, backend.load_sales(username))
+
+def status_rules():
+    """Returns the configured Expiring Soon / Low Stock thresholds."""
+    return StatusRules(app.config['EXPIRING_SOON_DAYS'], app.config['LOW_STOCK_QUANTITY'])
+
+def status_attacher(inventory):
+    """Returns a function copying a row of ``inventory`` with its status attached.
+
+    Statuses come from one classification pass over the whole inventory,
+    which is reused until the inventory or the date changes.
+    """
+    rules, today = status_rules(), datetime.now().toordinal()
+    return lambda item: dict(item, status=inventory.status_of(item, rules, today))
+
+def reorder_rules():
+    """Returns the configured sales window, lead time and cover for reorder forecasts."""
+    return ReorderRules(app.config['REORDER_WINDOW_DAYS'], app.config['REORDER_LEAD_DAYS'],
+                        app.config['REORDER_COVER_DAYS'])
+
+def refresh_reorder_forecasts():
+    """Forecasts every store in the worker pool so first requests are served from the cache."""
+    forecasts = forecaster.refresh(backend.usernames(), reorder_rules(), datetime.now().toordinal())
+    return {username: sum(1 for row in rows if row['suggested_quantity'] > 0)
+            for username, rows in forecasts.items()}
+
+def is_low_stock(quantity):
+    """True for a quantity that is in stock but at or below the low stock threshold."""
+    return 0 < quantity <= app.config['LOW_STOCK_QUANTITY']
+
+def inventory_totals(inventory):
+    """Returns (total units, number of low stock items), read off the quantity column."""
+    quantities = inventory.columns().quantity
+    return sum(quantities), sum(1 for quantity in quantities if is_low_stock(quantity))
+
+def status_distribution(inventory):
+    """Returns the share of items per status, in whole percent."""
+    if not inventory:
+        return {}
+    _, counts = inventory.statuses(status_rules(), datetime.now().toordinal())
+    status_counts = {status['text']: count for status, count in zip(STATUSES, counts)}
+    total = len(inventory)
+    return {
+        "in_stock_percent": round((status_counts['In Stock'] / total) * 100) if total > 0 else 0,
+        "low_stock_percent": round((status_counts['Low Stock'] / total) * 100) if total > 0 else 0,
+        "out_of_stock_percent": round((status_counts['Out of Stock'] / total) * 100) if total > 0 else 0,
+        "expiring_soon_percent": round((status_counts['Expiring Soon'] / total) * 100) if total > 0 else 0
+    }
 
 @app.context_processor
 def inject_user():
@@ -140,45 +425,18 @@ def inject_user():
 
 def get_medicine_status(medicine):
     """Determines the status of a medicine based on quantity and expiry date."""
-    try:
-        expiry_date = datetime.strptime(medicine['expiry_date'], '%Y-%m-%d')
-        quantity = int(medicine.get('quantity', 0))
-        today = datetime.now()
-        ninety_days_from_now = today + timedelta(days=90) 
-
-        if quantity <= 0:
-            return {'text': 'Out of Stock', 'className': 'status-out-of-stock'}
-        if today <= expiry_date <= ninety_days_from_now: 
-            return {'text': 'Expiring Soon', 'className': 'status-expiring-soon'}
-        if quantity <= 20:
-            return {'text': 'Low Stock', 'className': 'status-low-stock'}
-        return {'text': 'In Stock', 'className': 'status-in-stock'}
-    except (ValueError, KeyError):
-        return {'text': 'Unknown', 'className': ''}
-
-def load_data_from_csv(filename):
-    """Generic function to load data from a given CSV file."""
-    data = []
-    if not os.path.exists(filename):
-        return data
-    try:
-        with open(filename, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                data.append(row)
-    except Exception as e:
-        print(f"Error reading {filename}: {e}")
-    return data
-
-def save_data_to_csv(filename, data, fieldnames):
-    """Generic function to save data to a given CSV file."""
-    try:
-        with open(filename, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
-    except Exception as e:
-        print(f"Error writing to {filename}: {e}")
+    return STATUSES[status_rules().classify_row(medicine, datetime.now().toordinal())]
+
+# Changed rows sent in one live update; bigger changes tell pages to refetch instead
+LIVE_UPDATE_MAX_ITEMS = 100
+
+# Bills accepted by one /api/billing/batch request, and the longest idempotency key
+BATCH_MAX_BILLS = 500
+IDEMPOTENCY_KEY_MAX_LENGTH = 200
+
+# Typeahead results returned by /api/inventory/search unless ?limit= asks otherwise
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
 
 # --- Main Page Routes (MODIFIED & PROTECTED) ---
 
@@ -192,19 +450,18 @@ def home():
 @login_required  # Protect this route
 def inventory_page():
     # Load user-specific inventory
-    inventory = load_data_from_csv(get_user_inventory_file())
-    for item in inventory:
-        item['status'] = get_medicine_status(item)
+    inventory = load_user_inventory()
+    attach = status_attacher(inventory)
+    inventory = [attach(item) for item in inventory]
     return render_template('inventory.html', inventory=inventory, username=current_user.username)
 
 @app.route('/low_stock')
 @login_required  # Protect this route
 def low_stock_page():
     # Load user-specific inventory
-    inventory = load_data_from_csv(get_user_inventory_file())
-    low_stock_items = [item for item in inventory if item.get('quantity') and 0 < int(item.get('quantity', 0)) <= 20]
-    for item in low_stock_items:
-        item['status'] = get_medicine_status(item)
+    inventory = load_user_inventory()
+    attach = status_attacher(inventory)
+    low_stock_items = [attach(item) for item in inventory if is_low_stock(item['quantity'])]
     return render_template('low_stock.html', low_stock_items=low_stock_items, username=current_user.username)
 
 @app.route('/billing')
@@ -233,67 +490,120 @@ def search_inventory():
     query = request.args.get('q', '').lower()
     if not query:
         return jsonify([])
+    try:
+        limit = max(min(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT), 0)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"success": False, "message": "limit and offset must be integers."}), 400
     # Load user-specific inventory
-    inventory = load_data_from_csv(get_user_inventory_file())
-    
-    filtered_inventory = [
-        item for item in inventory if
-        (query in item.get('name', '').lower() or query in item.get('Manufacturer', '').lower())
-    ]
-    
-    for item in filtered_inventory:
-        item['status'] = get_medicine_status(item)
-        
-    return jsonify(filtered_inventory)
+    inventory = load_user_inventory()
+    attach = status_attacher(inventory)
+    return jsonify([attach(item) for item in inventory.search(query, offset + limit)[offset:]])
 
 @app.route('/api/inventory/add', methods=['POST'])
 @login_required
 def add_medicine():
     data = request.get_json()
-    # Load user-specific inventory
-    user_inventory_file = get_user_inventory_file()
-    inventory = load_data_from_csv(user_inventory_file)
-    fieldnames = ['id', 'name', 'Manufacturer', 'expiry_date', 'quantity', 'price']
-    
-    medicine_name = data.get('name', '').strip()
-    medicine_manufacturer = data.get('Manufacturer', '').strip()
-    
-    medicine_found = False
-    message = ""
-    for item in inventory:
-        if item.get('name', '').strip().lower() == medicine_name.lower() and \
-           item.get('Manufacturer', '').strip().lower() == medicine_manufacturer.lower():
-            try:
-                item['quantity'] = str(int(item.get('quantity', 0)) + int(data.get('quantity', 0)))
-                if data.get('price'):
-                    item['price'] = data.get('price')
-                medicine_found = True
-                message = "Medicine quantity updated."
-                break
-            except (ValueError, TypeError):
-                return jsonify({"success": False, "message": "Invalid quantity or price."}), 400
-
-    if not medicine_found:
+    # Hold the store's lock so concurrent updates to the same medicine aren't lost
+    with backend.lock(current_user.username):
+        # Load user-specific inventory
+        inventory = load_user_inventory()
         try:
-            new_id = max([int(item['id']) for item in inventory if item.get('id', '').isdigit()]) + 1 if inventory else 1
-        except (ValueError, IndexError):
-            new_id = 1
-        
-        new_medicine_data = {
-            'id': new_id,
-            'name': medicine_name,
-            'Manufacturer': data.get('Manufacturer'),
-            'expiry_date': data.get('expiry_date'),
-            'quantity': data.get('quantity'),
-            'price': data.get('price')
-        }
-        inventory.append(new_medicine_data)
-        message = "New medicine added."
-
-    # Save to user-specific inventory
-    save_data_to_csv(user_inventory_file, inventory, fieldnames)
+            row, quantity_delta, created = upsert_medicine(inventory, data)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        message = "New medicine added." if created else "Medicine quantity updated."
+
+        # Save to user-specific inventory
+        save_user_inventory(inventory)
+        publish_change('inventory', {
+            "items": [dict(row, status=get_medicine_status(row))],
+            "quantity_delta": quantity_delta
+        })
     return jsonify({"success": True, "message": message})
 
+@app.route('/api/inventory/import', methods=['POST'])
+@login_required
+def import_inventory():
+    """Adds or restocks many medicines from a CSV or NDJSON upload with a single write.
+
+    The upload is a multipart ``file`` field or the raw request body. Rows are
+    merged like /api/inventory/add (a row with the name and Manufacturer of an
+    existing medicine restocks it); invalid rows are skipped and reported by
+    line number.
+    """
+    upload = request.files.get('file')
+    medicines = []
+    errors = []
+    failed = 0
+    try:
+        fmt = import_format(request.args.get('format'),
+                            upload.mimetype if upload else request.mimetype,
+                            upload.filename if upload else None)
+        # Parse and validate the whole upload before taking the store's lock
+        for line, record, error in read_records(upload.stream if upload else request.stream, fmt):
+            if error is None:
+                try:
+                    medicines.append(clean_record(record))
+                    continue
+                except ValueError as e:
+                    error = str(e)
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "message": error})
+    except UnicodeDecodeError:
+        return jsonify({"success": False, "message": "The upload must be UTF-8 text."}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    added = updated = 0
+    if medicines:
+        with backend.lock(current_user.username):
+            inventory = load_user_inventory()
+            changed = {}
+            quantity_delta = 0
+            for medicine in medicines:
+                row, delta, created = upsert_medicine(inventory, medicine)
+                changed[row['id']] = row
+                quantity_delta += delta
+                if created:
+                    added += 1
+                else:
+                    updated += 1
+            save_user_inventory(inventory)
+            if len(changed) <= LIVE_UPDATE_MAX_ITEMS:
+                publish_change('inventory', {
+                    "items": [dict(row, status=get_medicine_status(row)) for row in changed.values()],
+                    "quantity_delta": quantity_delta
+                })
+            else:
+                publish_change('resync', {})
+
+    return jsonify({
+        "success": True,
+        "added": added,
+        "updated": updated,
+        "failed": failed,
+        "errors": errors
+    })
+
+@app.route('/api/inventory/export')
+@login_required
+def export_inventory():
+    """Streams the whole inventory as a CSV (default) or NDJSON download."""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"success": False, "message": "format must be 'csv' or 'ndjson'."}), 400
+    # Rows are replaced, never modified, so this list of references is a consistent snapshot
+    rows = list(load_user_inventory().rows)
+    filename = secure_filename(f"{current_user.username}_inventory.{fmt}") or f"inventory.{fmt}"
+    if fmt == 'csv':
+        body, mimetype = export_csv(rows), 'text/csv'
+    else:
+        body, mimetype = export_ndjson(rows), 'application/x-ndjson'
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 
 @app.route('/api/billing/create', methods=['POST'])
 @login_required
@@ -304,229 +614,448 @@ def create_bill():
     if not items_sold:
         return jsonify({"success": False, "message": "No items in bill."}), 400
 
-    # Load user-specific files
-    user_inventory_file = get_user_inventory_file()
-    user_sales_file = get_user_sales_file()
-    
-    inventory = load_data_from_csv(user_inventory_file)
-    sales = load_data_from_csv(user_sales_file)
+    # One bill at a time per store: the stock check and the decrement must not interleave
+    with backend.lock(current_user.username):
+        # Load user-specific files
+        inventory = load_user_inventory()
+
+        try:
+            # Bill ids only grow, so the ledger's last line holds the highest one
+            new_bill_id = backend.next_bill_id(current_user.username)
+
+            now = datetime.now()
+            try:
+                new_sales_entries, new_quantities = build_bill(inventory, items_sold, {}, new_bill_id, now)
+            except BillError as e:
+                return jsonify({"success": False, "message": e.message}), e.status
+
+            for item_id, quantity in new_quantities.items():
+                inventory.update(item_id, quantity=quantity)
+
+            # Save to user-specific files
+            save_user_inventory(inventory)
+            # The sales file is an append-only ledger; never rewrite its history
+            backend.append_sales(current_user.username, new_sales_entries)
+            publish_bill(inventory, new_bill_id, new_sales_entries, new_quantities)
+
+            return jsonify({
+                "success": True, 
+                "message": "Sale processed successfully.",
+                "bill_id": new_bill_id
+            })
     
-    inventory_fieldnames = ['id', 'name', 'Manufacturer', 'expiry_date', 'quantity', 'price']
-    sales_fieldnames = ['bill_id', 'date', 'time', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_amount']
+        except Exception as e:
+            print(f"Error in create_bill: {e}")
+            return jsonify({"success": False, "message": f"An server error occurred: {e}"}), 500
 
-    try:
-        if not sales:
-            new_bill_id = 1
-        else:
-            new_bill_id = max(int(s.get('bill_id', 0)) for s in sales if s.get('bill_id', '0').isdigit()) + 1
+@app.route('/api/billing/batch', methods=['POST'])
+@login_required
+def create_bills():
+    """Checks out bills queued by an offline till, in order, saving the store once.
 
-        now = datetime.now()
-        current_date = now.strftime('%Y-%m-%d')
-        current_time = now.strftime('%H:%M:%S')
+    Each bill needs an ``idempotency_key``; a bill whose key was already
+    processed is not charged again and reports the bill id it created. Every
+    bill is checked against the stock left by the bills before it and is
+    applied whole or not at all. The keys and sales lines are written before
+    the stock, so a batch that fails part way is never charged twice when
+    the till sends it again.
+    """
+    bills = (request.get_json(silent=True) or {}).get('bills')
+    if not isinstance(bills, list) or not bills:
+        return jsonify({"success": False, "message": "No bills in batch."}), 400
+    if len(bills) > BATCH_MAX_BILLS:
+        return jsonify({"success": False, "message": f"At most {BATCH_MAX_BILLS} bills per batch."}), 400
 
-        new_sales_entries = []
-        
-        for item_sold in items_sold:
-            item_id = str(item_sold.get('id'))
-            quantity_sold = int(item_sold.get('quantity', 0))
+    username = current_user.username
+    results = []
+    with backend.lock(username):
+        inventory = load_user_inventory()
+        try:
+            keys = [bill.get('idempotency_key') for bill in bills if isinstance(bill, dict)]
+            seen = backend.find_bill_ids(username, [key for key in keys if isinstance(key, str)])
 
-            if quantity_sold <= 0:
-                 return jsonify({"success": False, "message": f"Invalid quantity for item ID {item_id}."}), 400
+            next_bill_id = backend.next_bill_id(username)
+            now = datetime.now()
+            # Stock after the bills accepted so far; applied to the inventory at the end
+            stock = {}
+            accepted = []  # (bill id, lines, that bill's new quantities)
+            new_keys = []
 
-            item_found_in_inventory = False
-            
-            for inv_item in inventory:
-                if inv_item.get('id') == item_id:
-                    current_quantity = int(inv_item.get('quantity', 0))
-                    
-                    if current_quantity < quantity_sold:
-                        return jsonify({"success": False, "message": f"Not enough stock for {inv_item.get('name')}."}), 400
-                    
-                    inv_item['quantity'] = str(current_quantity - quantity_sold)
-                    item_found_in_inventory = True
-                    
-                    new_sales_entries.append({
-                        'bill_id': new_bill_id,
-                        'date': current_date,
-                        'time': current_time,
-                        'product_id': item_id,
-                        'product_name': inv_item.get('name'),
-                        'quantity': quantity_sold,
-                        'unit_price': inv_item.get('price'),
-                        'total_amount': round(float(inv_item.get('price', 0)) * quantity_sold, 2)
-                    })
-                    break
-            
-            if not item_found_in_inventory:
-                return jsonify({"success": False, "message": f"Item with ID {item_id} not found in inventory."}), 404
+            for bill in bills:
+                key = bill.get('idempotency_key') if isinstance(bill, dict) else None
+                if not isinstance(key, str) or not key.strip() or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                    results.append({"idempotency_key": key, "success": False,
+                                    "message": "Each bill needs an idempotency_key string."})
+                    continue
+                if key in seen:
+                    results.append({"idempotency_key": key, "success": True, "duplicate": True,
+                                    "bill_id": seen[key], "message": "Bill already processed."})
+                    continue
+                items_sold = bill.get('items') or []
+                try:
+                    if not isinstance(items_sold, list) or not items_sold:
+                        raise BillError("No items in bill.")
+                    lines, new_quantities = build_bill(inventory, items_sold, stock, next_bill_id, now)
+                except BillError as e:
+                    results.append({"idempotency_key": key, "success": False, "message": e.message})
+                    continue
+                stock.update(new_quantities)
+                accepted.append((next_bill_id, lines, new_quantities))
+                new_keys.append({'key': key, 'bill_id': next_bill_id})
+                seen[key] = next_bill_id
+                results.append({"idempotency_key": key, "success": True, "duplicate": False,
+                                "bill_id": next_bill_id, "message": "Sale processed successfully."})
+                next_bill_id += 1
 
-        # Save to user-specific files
-        save_data_to_csv(user_inventory_file, inventory, inventory_fieldnames)
-        
-        all_sales = sales + new_sales_entries
-        save_data_to_csv(user_sales_file, all_sales, sales_fieldnames)
+            if accepted:
+                backend.append_sales(username, [line for _, lines, _ in accepted for line in lines], new_keys)
+                for item_id, quantity in stock.items():
+                    inventory.update(item_id, quantity=quantity)
+                save_user_inventory(inventory)
+                for bill_id, lines, new_quantities in accepted:
+                    publish_bill(inventory, bill_id, lines, new_quantities)
 
-        return jsonify({
-            "success": True, 
-            "message": "Sale processed successfully.",
-            "bill_id": new_bill_id
-        })
-    
-    except Exception as e:
-        print(f"Error in create_bill: {e}")
-        return jsonify({"success": False, "message": f"An server error occurred: {e}"}), 500
+        except Exception as e:
+            print(f"Error in create_bills: {e}")
+            return jsonify({"success": False, "message": f"An server error occurred: {e}"}), 500
+
+    return jsonify({
+        "success": all(result["success"] for result in results),
+        "processed": sum(1 for result in results if result["success"] and not result["duplicate"]),
+        "duplicates": sum(1 for result in results if result.get("duplicate")),
+        "failed": sum(1 for result in results if not result["success"]),
+        "results": results
+    })
 
 # --- All other API routes refactored ---
 
 @app.route('/api/inventory/summary')
 @login_required
 def inventory_summary():
-    inventory = load_data_from_csv(get_user_inventory_file())
-    total_quantity = sum(int(item.get('quantity', 0)) for item in inventory)
+    total_quantity, _ = inventory_totals(load_user_inventory())
     return jsonify({"total_quantity": total_quantity})
 
 @app.route('/api/inventory/low_stock')
 @login_required
 def low_stock_summary():
-    inventory = load_data_from_csv(get_user_inventory_file())
-    low_stock_count = sum(1 for item in inventory if item.get('quantity') and 0 < int(item.get('quantity', 0)) <= 20)
+    _, low_stock_count = inventory_totals(load_user_inventory())
     return jsonify({"low_stock_count": low_stock_count})
 
 @app.route('/api/sales/summary')
 @login_required
 def sales_summary():
-    sales = load_data_from_csv(get_user_sales_file())
+    sales = load_user_sales()
     today_str = datetime.now().strftime('%Y-%m-%d')
-    todays_sales = sum(float(s.get('total_amount', 0)) for s in sales if s.get('date') == today_str)
-    return jsonify({"todays_sales": todays_sales})
+    return jsonify({"todays_sales": round(sales.day(today_str).revenue, 2)})
 
 @app.route('/api/sales/today')
 @login_required
 def get_todays_sales():
-    sales = load_data_from_csv(get_user_sales_file())
     today_str = datetime.now().strftime('%Y-%m-%d')
-    return jsonify([s for s in sales if s.get('date') == today_str])
+    return list_user_sales(date_from=today_str, date_to=today_str)
 
 @app.route('/api/sales/previous/all')
 @login_required
 def get_previous_sales():
-    sales = load_data_from_csv(get_user_sales_file())
     today_str = datetime.now().strftime('%Y-%m-%d')
-    return jsonify([s for s in sales if s.get('date') != today_str])
+    return list_user_sales(exclude_day=today_str)
 
 @app.route('/api/sales/kpi_summary/today')
 @login_required
 def sales_kpi_summary_today():
-    sales = load_data_from_csv(get_user_sales_file())
+    sales = load_user_sales()
     today_str = datetime.now().strftime('%Y-%m-%d')
-    todays_sales = [s for s in sales if s.get('date') == today_str]
-    return jsonify({
-        "total_revenue": sum(float(s.get('total_amount', 0)) for s in todays_sales),
-        "total_transactions": len(set(s.get('bill_id') for s in todays_sales)),
-        "total_items_sold": sum(int(s.get('quantity', 0)) for s in todays_sales)
-    })
+    return jsonify(sales.day(today_str).to_dict())
 
 @app.route('/api/sales/kpi_summary/previous')
 @login_required
 def sales_kpi_summary_previous():
-    sales = load_data_from_csv(get_user_sales_file())
+    sales = load_user_sales()
     today_str = datetime.now().strftime('%Y-%m-%d')
-    previous_sales = [s for s in sales if s.get('date') != today_str]
-    return jsonify({
-        "total_revenue": sum(float(s.get('total_amount', 0)) for s in previous_sales),
-        "total_transactions": len(set(s.get('bill_id') for s in previous_sales)),
-        "total_items_sold": sum(int(s.get('quantity', 0)) for s in previous_sales)
-    })
+    return jsonify((sales.total - sales.day(today_str)).to_dict())
+
+@app.route('/api/inventory/reorder')
+@login_required
+def reorder_forecast():
+    """Lists the products to reorder, soonest stock-out first, with how much to order.
+
+    Based on each product's sales rate over the last REORDER_WINDOW_DAYS days,
+    its quantity and its expiry date; ``all=1`` includes products that need
+    nothing. Supports the ListingArgs options.
+    """
+    try:
+        listing = ListingArgs(request.args, REORDER_FIELDNAMES)
+    except ValueError as e:
+        return bad_listing_request(e)
+    rows = forecaster.forecast(current_user.username, reorder_rules(), datetime.now().toordinal())
+    if request.args.get('all') != '1':
+        rows = [row for row in rows if row['suggested_quantity'] > 0]
+    rows = reversed(rows) if listing.reverse_natural else iter(rows)
+    return respond(sort_rows(rows, listing), listing)
 
 @app.route('/api/inventory/expiring_soon')
 @login_required
 def expiring_soon():
-    inventory = load_data_from_csv(get_user_inventory_file())
-    today = datetime.now()
-    ninety_days_from_now = today + timedelta(days=90) 
-    expiring_soon_items = []
-    for item in inventory:
-        try:
-            expiry_date = datetime.strptime(item['expiry_date'], '%Y-%m-%d')
-            if today <= expiry_date <= ninety_days_from_now: 
-                item['status'] = get_medicine_status(item)
-                expiring_soon_items.append(item)
-        except (ValueError, KeyError):
-            continue
-    return jsonify(expiring_soon_items)
+    inventory = load_user_inventory()
+    attach = status_attacher(inventory)
+    # Range query on the expiry-sorted index, soonest first
+    expiring = inventory.expiring(status_rules(), datetime.now().toordinal())
+    return jsonify([attach(item) for item in expiring])
 
 @app.route('/api/inventory/status_distribution')
 @login_required
 def get_status_distribution():
-    inventory = load_data_from_csv(get_user_inventory_file())
-    if not inventory: return jsonify({})
-    status_counts = {'In Stock': 0, 'Low Stock': 0, 'Out of Stock': 0, 'Expiring Soon': 0}
-    for item in inventory:
-        status_text = get_medicine_status(item)['text']
-        if status_text in status_counts:
-            status_counts[status_text] += 1
-    total = len(inventory)
-    return jsonify({
-        "in_stock_percent": round((status_counts['In Stock'] / total) * 100) if total > 0 else 0,
-        "low_stock_percent": round((status_counts['Low Stock'] / total) * 100) if total > 0 else 0,
-        "out_of_stock_percent": round((status_counts['Out of Stock'] / total) * 100) if total > 0 else 0,
-        "expiring_soon_percent": round((status_counts['Expiring Soon'] / total) * 100) if total > 0 else 0
-    })
+    return jsonify(status_distribution(load_user_inventory()))
 
 @app.route('/api/inventory/all')
 @login_required
 def get_all_inventory():
-    inventory = load_data_from_csv(get_user_inventory_file())
-    for item in inventory:
-        item['status'] = get_medicine_status(item)
-    return jsonify(inventory)
+    try:
+        listing = ListingArgs(request.args, INVENTORY_FIELDNAMES)
+    except ValueError as e:
+        return bad_listing_request(e)
+    inventory = load_user_inventory()
+    rows = reversed(inventory.rows) if listing.reverse_natural else iter(inventory.rows)
+    total = len(inventory)
+
+    query = request.args.get('q', '').strip().lower()
+    if query:
+        rows = (item for item in rows
+                if query in item.get('name', '').lower() or query in item.get('Manufacturer', '').lower())
+    status = normalize_status(request.args.get('status', ''))
+    if status:
+        rules, today = status_rules(), datetime.now().toordinal()
+        rows = (item for item in rows
+                if normalize_status(inventory.status_of(item, rules, today)['text']) == status)
+    if query or status:
+        total = None
+    return respond(sort_rows(rows, listing), listing, status_attacher(inventory), total)
 
 @app.route('/api/sales/all')
 @login_required
 def get_all_sales():
-    sales = load_data_from_csv(get_user_sales_file())
-    return jsonify(sales)
+    return list_user_sales()
 
 @app.route('/api/sales/kpi_summary/all')
 @login_required
 def sales_kpi_summary_all():
-    sales = load_data_from_csv(get_user_sales_file())
-    return jsonify({
-        "total_revenue": sum(float(s.get('total_amount', 0)) for s in sales),
-        "total_transactions": len(set(s.get('bill_id') for s in sales)),
-        "total_items_sold": sum(int(s.get('quantity', 0)) for s in sales)
-    })
+    sales = load_user_sales()
+    return jsonify(sales.total.to_dict())
 
 @app.route('/api/sales/monthly')
 @login_required
 def get_monthly_sales():
-    sales = load_data_from_csv(get_user_sales_file())
-    today = datetime.now()
-    current_month_str = today.strftime('%Y-%m-')
-    
-    monthly_sales = [
-        s for s in sales 
-        if s.get('date') and s['date'].startswith(current_month_str)
-    ]
-    return jsonify(monthly_sales)
+    current_month_str = datetime.now().strftime('%Y-%m')
+    return list_user_sales(date_from=f"{current_month_str}-01", date_to=f"{current_month_str}-31")
 
 @app.route('/api/sales/kpi_summary/monthly')
 @login_required
 def sales_kpi_summary_monthly():
-    sales = load_data_from_csv(get_user_sales_file())
-    today = datetime.now()
-    current_month_str = today.strftime('%Y-%m-')
-    
-    monthly_sales = [
-        s for s in sales 
-        if s.get('date') and s['date'].startswith(current_month_str)
-    ]
-    
-    return jsonify({
-        "total_revenue": sum(float(s.get('total_amount', 0)) for s in monthly_sales),
-        "total_transactions": len(set(s.get('bill_id') for s in monthly_sales)),
-        "total_items_sold": sum(int(s.get('quantity', 0)) for s in monthly_sales)
-    })
+    sales = load_user_sales()
+    current_month_str = datetime.now().strftime('%Y-%m')
+    return jsonify(sales.month(current_month_str).to_dict())
+
+# --- Dashboard ---
+
+# Expiring items sent with the dashboard; the "View all" modal fetches the full list
+DASHBOARD_EXPIRING_ITEMS = 5
+
+def dashboard_etag(today_str):
+    """Returns the ETag of the logged-in user's dashboard.
+
+    It is derived from the storage version of the user's inventory and sales,
+    the date and the status thresholds, so it can be checked without loading
+    any data.
+    """
+    username = current_user.username
+    state = (backend.name, username, backend.data_version(username), today_str, status_rules().key())
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+@app.route('/api/dashboard')
+@login_required
+def dashboard():
+    """Returns every dashboard widget in one response, or 304 if the client's copy is current."""
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    etag = dashboard_etag(today_str)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        inventory = load_user_inventory()
+        sales = load_user_sales()
+        total_quantity, low_stock_count = inventory_totals(inventory)
+        attach = status_attacher(inventory)
+        expiring = inventory.expiring(status_rules(), datetime.now().toordinal())
+        response = jsonify({
+            "total_quantity": total_quantity,
+            "low_stock_count": low_stock_count,
+            "todays_sales": round(sales.day(today_str).revenue, 2),
+            "status_distribution": status_distribution(inventory),
+            "expiring_soon": [attach(item) for item in expiring[:DASHBOARD_EXPIRING_ITEMS]],
+            "expiring_soon_count": len(expiring)
+        })
+    response.set_etag(etag)
+    # Let the browser keep the copy but revalidate it on every load
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# --- Sales analytics ---
+
+# Products returned by /api/sales/analytics/top unless ?limit= asks otherwise
+TOP_PRODUCTS_DEFAULT_LIMIT = 10
+TOP_PRODUCTS_MAX_LIMIT = 500
+
+def analytics_range():
+    """Returns (date_from, date_to, SalesSummary) for the logged-in user and the requested dates.
+
+    Raises ValueError for malformed dates.
+    """
+    date_from, date_to = parse_date_arg('date_from'), parse_date_arg('date_to')
+    summary = analytics.summary(current_user.username, load_user_sales(), date_from, date_to)
+    return date_from or summary.first_day, date_to or summary.last_day, summary
+
+@app.route('/api/sales/analytics/top')
+@login_required
+def top_products():
+    """Returns the best-selling products between ``date_from`` and ``date_to`` by revenue or quantity."""
+    by = request.args.get('by', 'revenue')
+    if by not in ('revenue', 'quantity'):
+        return jsonify({"success": False, "message": "by must be 'revenue' or 'quantity'."}), 400
+    try:
+        limit = min(int(request.args.get('limit', TOP_PRODUCTS_DEFAULT_LIMIT)), TOP_PRODUCTS_MAX_LIMIT)
+        date_from, date_to, summary = analytics_range()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"date_from": date_from, "date_to": date_to, "by": by,
+                    "products": summary.top(max(limit, 0), by)})
+
+@app.route('/api/sales/analytics/heatmap')
+@login_required
+def sales_heatmap():
+    """Returns revenue, units and bills per weekday and hour of day between ``date_from`` and ``date_to``."""
+    try:
+        date_from, date_to, summary = analytics_range()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify(dict(summary.heatmap(), date_from=date_from, date_to=date_to))
+
+@app.route('/api/sales/analytics/velocity')
+@login_required
+def sales_velocity():
+    """Lists units and revenue per day of every product sold between ``date_from`` and ``date_to``.
+
+    Fastest sellers come first; supports the ListingArgs options.
+    """
+    try:
+        listing = ListingArgs(request.args, VELOCITY_FIELDNAMES)
+        date_from, date_to, summary = analytics_range()
+    except ValueError as e:
+        return bad_listing_request(e)
+    rows = summary.velocity(range_days(summary, date_from, date_to))
+    rows = reversed(rows) if listing.reverse_natural else iter(rows)
+    return respond(sort_rows(rows, listing), listing)
+
+# --- Live updates ---
+
+# Seconds between keep-alive comments on an idle event stream
+EVENTS_KEEPALIVE_SECONDS = 15
+
+@app.route('/api/events')
+@login_required
+def event_stream():
+    """Streams the store's inventory and bill events to the browser as Server-Sent Events."""
+    subscription = event_bus.subscribe(current_user.username)
+
+    def generate():
+        try:
+            # Ask the browser to reconnect quickly if the connection drops
+            yield 'retry: 3000\n\n'
+            while True:
+                message = subscription.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+                # Comments keep proxies from timing out and let us notice closed connections
+                yield message if message is not None else ': keep-alive\n\n'
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- Metrics ---
+
+profiler = None
+if app.config['PROFILE_SLOW_REQUESTS_MS'] > 0:
+    profiler = SlowRequestProfiler(app.config['PROFILE_SLOW_REQUESTS_MS'], app.config['PROFILE_INTERVAL_MS'],
+                                   app.config['PROFILE_DIR'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    start_request()
+    if profiler is not None:
+        profiler.begin()
+
+@app.after_request
+def record_request(response):
+    """Records the request's latency, status and phase times (streamed bodies: until the first chunk)."""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    # The URL rule, not the path, so /api/inventory/<id> is one series rather than one per item
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.observe(elapsed, route=route, method=request.method)
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    phases = finish_request()
+    if profiler is not None:
+        path = profiler.end(elapsed, {'route': route, 'method': request.method, 'path': request.path,
+                                      'status': response.status_code,
+                                      'phases_ms': {name: round(seconds * 1000, 3)
+                                                    for name, seconds in phases.items()}})
+        if path:
+            print(f"Slow request {request.method} {request.path} took {elapsed * 1000:.0f}ms, profile: {path}")
+    return response
+
+@app.teardown_request
+def stop_request_profile(error):
+    if profiler is not None:
+        profiler.discard()
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of request, storage and cache metrics (no login; keep it off public networks)."""
+    return Response(exposition(), mimetype='text/plain; version=0.0.4')
+
+# --- CLI ---
+
+@app.cli.command('import-csv')
+@click.option('--db', 'db_path', default=None, help='SQLite database to import into (default: SQLITE_PATH).')
+@click.option('--data-dir', default=None, help='Directory holding users.csv and the per-user CSV files (default: DATA_DIR).')
+def import_csv_command(db_path, data_dir):
+    """Imports users.csv, *_inventory.csv and *_sales.csv into the SQLite backend."""
+    source = CsvBackend(data_dir or app.config['DATA_DIR'])
+    target = SqliteBackend(db_path or app.config['SQLITE_PATH'])
+    summary = target.import_csv(source)
+    click.echo(f"Imported {summary['users']} users, {summary['inventory']} inventory rows "
+               f"and {summary['sales']} sales rows into {target.path}.")
+
+@app.cli.command('compact-sales')
+def compact_sales_command():
+    """Rolls the closed days of every store's hot sales segment into its monthly segments (CSV backend)."""
+    if backend.name != 'csv':
+        raise click.ClickException("Only the CSV backend partitions sales.")
+    moved = sum(backend.compact_sales(username) for username in backend.usernames())
+    click.echo(f"Moved {moved} sales lines into monthly segments.")
+
+@app.cli.command('forecast-reorder')
+def forecast_reorder_command():
+    """Forecasts stock-outs and reorder quantities for every store, using REORDER_WORKERS processes."""
+    for username, count in sorted(refresh_reorder_forecasts().items()):
+        click.echo(f"{username}: {count} products to reorder")
 
 if __name__ == '__main__':
+    # With the reloader, this file also runs in a watcher process that serves nothing
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if app.config['WARM_CACHE']:
+            warm_cache()
+        if app.config['REORDER_WORKERS'] > 0:
+            threading.Thread(target=refresh_reorder_forecasts, name='reorder-forecasts', daemon=True).start()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,114 @@
+# benchmarks/auth_overhead.py
+"""Per-request authentication overhead: linear users.csv scan vs the user registry.
+
+Seeds a throwaway data directory with many registered users, then times
+
+* the bare lookup Flask-Login's user_loader does on every request, once the
+  old way (re-read users.csv and scan it) and once through the registry, and
+* a small authenticated request through the Flask test client with each
+  user_loader installed.
+
+Usage:
+    python benchmarks/auth_overhead.py --users 10000 --requests 500
+    STORAGE_BACKEND=sqlite python benchmarks/auth_overhead.py --json
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+from common import import_app
+
+
+def seed(app_module, count):
+    """Registers ``count`` users directly in storage and returns their ids."""
+    backend = app_module.backend
+    if backend.name == 'csv':
+        from datastore import write_csv_rows, USER_FIELDNAMES
+        rows = [{'id': n, 'username': f'store{n}', 'password_hash': 'unused'} for n in range(1, count + 1)]
+        write_csv_rows(backend.users_file(), rows, USER_FIELDNAMES)
+        return [str(row['id']) for row in rows]
+    return [str(backend.create_user(f'store{n}', 'unused')) for n in range(1, count + 1)]
+
+
+def legacy_get_user(backend):
+    """The user_loader as it was: re-read every user and scan for the id."""
+    from users import User
+
+    def get_user(user_id):
+        for user in backend.load_users():
+            if user.get('id') == user_id:
+                return User(user['id'], user['username'], user['password_hash'])
+        return None
+    return get_user
+
+
+def per_call(func, args, repeat):
+    """Returns the mean seconds per call of ``func`` over ``repeat`` calls cycling through ``args``."""
+    start = time.perf_counter()
+    for n in range(repeat):
+        func(args[n % len(args)])
+    return (time.perf_counter() - start) / repeat
+
+
+def per_request(app_module, user_ids, requests):
+    """Returns the mean seconds per authenticated GET /api/sales/kpi_summary/today."""
+    clients = []
+    for user_id in user_ids:
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = user_id
+            session['_fresh'] = True
+        clients.append(client)
+    start = time.perf_counter()
+    for n in range(requests):
+        response = clients[n % len(clients)].get('/api/sales/kpi_summary/today')
+        if response.status_code != 200:
+            raise SystemExit(f"request failed with status {response.status_code}")
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000, help='registered users to seed')
+    parser.add_argument('--lookups', type=int, default=2000, help='bare user_loader calls per variant')
+    parser.add_argument('--requests', type=int, default=500, help='test client requests per variant')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='pharmacy-auth-')
+    app_module = import_app(data_dir, 'auth.db')
+    user_ids = seed(app_module, args.users)
+    rng = random.Random(0)
+    sample = [rng.choice(user_ids) for _ in range(64)]
+
+    legacy = legacy_get_user(app_module.backend)
+    registry = app_module.get_user
+    results = {
+        'backend': app_module.backend.name,
+        'users': args.users,
+        'lookup_legacy_us': per_call(legacy, sample, max(1, args.lookups // 10)) * 1e6,
+        'lookup_registry_us': per_call(registry, sample, args.lookups) * 1e6,
+    }
+    app_module.get_user = legacy
+    results['request_legacy_ms'] = per_request(app_module, sample, args.requests) * 1e3
+    app_module.get_user = registry
+    results['request_registry_ms'] = per_request(app_module, sample, args.requests) * 1e3
+    results['lookup_speedup'] = results['lookup_legacy_us'] / results['lookup_registry_us']
+    results['request_speedup'] = results['request_legacy_ms'] / results['request_registry_ms']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{results['users']} users, {results['backend']} backend")
+        print(f"user_loader lookup: {results['lookup_legacy_us']:.1f} us -> "
+              f"{results['lookup_registry_us']:.2f} us ({results['lookup_speedup']:.0f}x)")
+        print(f"authenticated request: {results['request_legacy_ms']:.2f} ms -> "
+              f"{results['request_registry_ms']:.2f} ms ({results['request_speedup']:.1f}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# benchmarks/bench_routes.py
+"""Latency and throughput of every route, against generated data.
+
+Generates a synthetic data directory (see generate_data.py) unless
+``--data-dir`` points at an existing one, then drives each route through the
+Flask test client: sequentially by default, or from ``--concurrency``
+threads at once (each thread its own logged-in client, spread over the
+generated users). For every route it reports p50/p95/p99/mean latency,
+throughput and status codes, plus the cold first-load time and the
+process's peak RSS.
+
+Usage:
+    python benchmarks/bench_routes.py --skus 50000 --sales 1000000 --requests 200
+    python benchmarks/bench_routes.py --concurrency 8 --json > results.json
+    STORAGE_BACKEND=sqlite python benchmarks/bench_routes.py --only dashboard,search
+
+/api/events is left out: it is a stream that stays open.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate_data  # noqa: E402
+from common import import_app, logged_in_client, percentile  # noqa: E402
+
+
+def peak_rss_mb():
+    """Returns the process's peak resident set size in MiB, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Scenario:
+    """One route to benchmark: ``send(client, rng)`` makes a request and returns the response.
+
+    ``anonymous`` scenarios get a client that is not logged in.
+    """
+
+    def __init__(self, name, send, requests_scale=1.0, anonymous=False):
+        self.name = name
+        self.send = send
+        self.requests_scale = requests_scale
+        self.anonymous = anonymous
+
+
+def build_scenarios(names, skus):
+    """Returns the Scenarios for every route, sharing a vocabulary of search terms."""
+    terms = [name[:length].lower() for name in generate_data.BASE_NAMES for length in (3, 5)]
+    counter = iter(range(1, 1 << 62))
+    key_lock = threading.Lock()
+
+    def next_number():
+        with key_lock:
+            return next(counter)
+
+    def random_id(rng):
+        return rng.randint(1, max(1, skus))
+
+    def get(path):
+        return lambda client, rng: client.get(path)
+
+    def search(client, rng):
+        return client.get('/api/inventory/search', query_string={'q': rng.choice(terms)})
+
+    def add_medicine(client, rng):
+        return client.post('/api/inventory/add', json={
+            'name': f'Bench Restock {rng.randint(1, 50)}', 'Manufacturer': 'Bench Labs',
+            'expiry_date': '2030-01-01', 'quantity': 1000, 'price': '10'})
+
+    def create_bill(client, rng):
+        return client.post('/api/billing/create', json={
+            'items': [{'id': random_id(rng), 'quantity': 1} for _ in range(rng.randint(1, 4))]})
+
+    def batch(client, rng):
+        return client.post('/api/billing/batch', json={'bills': [
+            {'idempotency_key': f'bench-{next_number()}',
+             'items': [{'id': random_id(rng), 'quantity': 1} for _ in range(rng.randint(1, 4))]}
+            for _ in range(10)]})
+
+    def bulk_import(client, rng):
+        body = 'name,Manufacturer,expiry_date,quantity,price\n' + ''.join(
+            f'Bench Import {rng.randint(1, 500)},Bench Labs,2031-01-01,10,5\n' for _ in range(100))
+        return client.post('/api/inventory/import', data=body.encode(), content_type='text/csv')
+
+    def dashboard_revalidate(client, rng):
+        # Only the revalidation is timed after the first call; the data does not change in between
+        if not hasattr(client, 'dashboard_etag'):
+            client.dashboard_etag = client.get('/api/dashboard').headers.get('ETag')
+        return client.get('/api/dashboard', headers={'If-None-Match': client.dashboard_etag})
+
+    def login(client, rng):
+        return client.post('/login', data={'username': generate_data.username(1),
+                                           'password': generate_data.PASSWORD})
+
+    def register(client, rng):
+        return client.post('/register', data={'username': f'benchnew{next_number()}_{os.getpid()}',
+                                              'password': generate_data.PASSWORD})
+
+    scenarios = [
+        Scenario('page_home', get('/')),
+        Scenario('page_inventory', get('/inventory'), 0.2),
+        Scenario('page_low_stock', get('/low_stock'), 0.5),
+        Scenario('page_billing', get('/billing')),
+        Scenario('page_sales', get('/sales')),
+        Scenario('page_account', get('/account')),
+        Scenario('search', search),
+        Scenario('inventory_summary', get('/api/inventory/summary')),
+        Scenario('inventory_low_stock', get('/api/inventory/low_stock')),
+        Scenario('inventory_expiring_soon', get('/api/inventory/expiring_soon')),
+        Scenario('inventory_reorder', get('/api/inventory/reorder?limit=50')),
+        Scenario('inventory_status_distribution', get('/api/inventory/status_distribution')),
+        Scenario('inventory_all_page', get('/api/inventory/all?limit=50&offset=100')),
+        Scenario('inventory_all_full', get('/api/inventory/all'), 0.1),
+        Scenario('inventory_export', get('/api/inventory/export'), 0.1),
+        Scenario('sales_summary', get('/api/sales/summary')),
+        Scenario('sales_today', get('/api/sales/today?limit=50&order=desc')),
+        Scenario('sales_previous_page', get('/api/sales/previous/all?limit=50&order=desc')),
+        Scenario('sales_all_page', get('/api/sales/all?limit=50&order=desc')),
+        Scenario('sales_monthly_page', get('/api/sales/monthly?limit=50&order=desc')),
+        Scenario('sales_all_full', get('/api/sales/all'), 0.05),
+        Scenario('kpi_today', get('/api/sales/kpi_summary/today')),
+        Scenario('kpi_previous', get('/api/sales/kpi_summary/previous')),
+        Scenario('kpi_all', get('/api/sales/kpi_summary/all')),
+        Scenario('kpi_monthly', get('/api/sales/kpi_summary/monthly')),
+        Scenario('analytics_top', get('/api/sales/analytics/top?limit=10')),
+        Scenario('analytics_heatmap', get('/api/sales/analytics/heatmap')),
+        Scenario('analytics_velocity_page', get('/api/sales/analytics/velocity?limit=50')),
+        Scenario('dashboard', get('/api/dashboard')),
+        Scenario('dashboard_304', dashboard_revalidate),
+        Scenario('add_medicine', add_medicine),
+        Scenario('inventory_import_100', bulk_import, 0.2),
+        Scenario('billing_create', create_bill),
+        Scenario('billing_batch_10', batch, 0.2),
+        # Password hashing dominates these by design
+        Scenario('login', login, 0.05, anonymous=True),
+        Scenario('register', register, 0.05, anonymous=True),
+    ]
+    if names:
+        unknown = set(names) - {scenario.name for scenario in scenarios}
+        if unknown:
+            raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in scenarios if scenario.name in names]
+    return scenarios
+
+
+def run_scenario(app_module, scenario, user_ids, requests, concurrency, seed):
+    """Sends ``requests`` requests for ``scenario`` from ``concurrency`` threads; returns its stats."""
+    latencies = []
+    statuses = Counter()
+    guard = threading.Lock()
+    per_thread = [requests // concurrency + (1 if n < requests % concurrency else 0) for n in range(concurrency)]
+
+    def worker(n):
+        rng = random.Random(seed * 7919 + n)
+        if scenario.anonymous:
+            client = app_module.app.test_client()
+        else:
+            client = logged_in_client(app_module, user_ids[n % len(user_ids)])
+        mine = []
+        codes = Counter()
+        for _ in range(per_thread[n]):
+            if scenario.anonymous:
+                # A fresh client, without the session the last login left behind
+                client = app_module.app.test_client()
+            started = time.perf_counter()
+            response = scenario.send(client, rng)
+            response.get_data()
+            mine.append(time.perf_counter() - started)
+            codes[response.status_code] += 1
+        with guard:
+            latencies.extend(mine)
+            statuses.update(codes)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    milliseconds = [value * 1000 for value in latencies]
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for code, count in statuses.items() if code >= 500),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'p50_ms': round(percentile(milliseconds, 0.50), 3) if milliseconds else None,
+        'p95_ms': round(percentile(milliseconds, 0.95), 3) if milliseconds else None,
+        'p99_ms': round(percentile(milliseconds, 0.99), 3) if milliseconds else None,
+        'mean_ms': round(sum(milliseconds) / len(milliseconds), 3) if milliseconds else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', help='existing data directory to use instead of generating one '
+                                           '(its users must be bench1, bench2, ... as generate_data.py writes)')
+    parser.add_argument('--users', type=int, default=2, help='users to generate')
+    parser.add_argument('--skus', type=int, default=5000, help='medicines per generated user')
+    parser.add_argument('--sales', type=int, default=50000, help='sales lines per generated user')
+    parser.add_argument('--days', type=int, default=365, help='days of generated sales history')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=100, help='requests per route (scaled down for slow routes)')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per route')
+    parser.add_argument('--only', default='', help='comma-separated scenario names to run')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    generated = None
+    if data_dir is None:
+        data_dir = tempfile.mkdtemp(prefix='pharmacy-bench-')
+        generated = generate_data.generate(data_dir, args.users, args.skus, args.sales, args.days, args.seed)
+
+    # SQLITE_PATH may point at a database already imported from --data-dir
+    app_module = import_app(data_dir, os.environ.get('SQLITE_PATH', 'bench.db'))
+    if app_module.backend.name == 'sqlite':
+        from storage import CsvBackend
+        app_module.backend.import_csv(CsvBackend(data_dir))
+    users = app_module.backend.load_user_registry()
+    user_ids = [user.id for user in (users.find(generate_data.username(n)) for n in range(1, args.users + 1))
+                if user is not None]
+    if not user_ids:
+        raise SystemExit(f"No bench users found in {data_dir}")
+
+    # Time to parse a store's data on first use, then keep it warm for the routes
+    app_module.store.clear()
+    client = logged_in_client(app_module, user_ids[0])
+    started = time.perf_counter()
+    client.get('/api/dashboard').get_data()
+    client.get('/api/sales/kpi_summary/all').get_data()
+    cold_load_ms = round((time.perf_counter() - started) * 1000, 1)
+    for user_id in user_ids[1:]:
+        logged_in_client(app_module, user_id).get('/api/dashboard').get_data()
+
+    names = {name.strip() for name in args.only.split(',') if name.strip()}
+    routes = {}
+    for scenario in build_scenarios(names, args.skus):
+        requests = max(args.concurrency, int(args.requests * scenario.requests_scale))
+        routes[scenario.name] = run_scenario(app_module, scenario, user_ids, requests, args.concurrency, args.seed)
+        if not args.json:
+            stats = routes[scenario.name]
+            print(f"{scenario.name:32} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  "
+                  f"p99 {stats['p99_ms']:9.2f} ms  {stats['throughput_rps']:9.1f} req/s  "
+                  f"{stats['status_codes']}", flush=True)
+
+    results = {
+        'config': {
+            'backend': app_module.backend.name,
+            'data_dir': data_dir,
+            'generated': generated,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'cold_load_ms': cold_load_ms,
+        'routes': routes,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"cold load {cold_load_ms} ms, peak RSS {results['peak_rss_mb']} MiB, backend {app_module.backend.name}")
+    failed = [name for name, stats in routes.items() if stats['errors']]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
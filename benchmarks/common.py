@@ -0,0 +1,34 @@
+# benchmarks/common.py
+"""Helpers shared by the benchmark scripts: importing the app, logged-in clients and percentiles."""
+import math
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_app(data_dir, database):
+    """Imports app.py configured to keep its data in ``data_dir``, with SQLite in ``database`` there."""
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['SQLITE_PATH'] = os.path.join(data_dir, database)
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    app_module.app.config['TESTING'] = True
+    return app_module
+
+
+def logged_in_client(app_module, user_id):
+    """Returns a test client whose session is already logged in as ``user_id``."""
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank ``fraction`` percentile of ``values``, or 0.0 if there are none."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(math.ceil(fraction * len(values)) - 1, 0))]
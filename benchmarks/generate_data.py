@@ -0,0 +1,191 @@
+# benchmarks/generate_data.py
+"""Synthetic users, inventories and sales histories for benchmarking.
+
+Writes ``users.csv`` plus ``<username>_inventory.csv`` and a
+``<username>_sales/`` directory of monthly segments per user into a data
+directory, in the same layout the app uses (point DATA_DIR at it, or import it
+into SQLite with ``flask --app app import-csv``). Everything is derived from ``--seed``, so
+the same arguments always produce the same files. Rows are streamed to disk,
+so millions of sales lines do not need to fit in memory.
+
+Every user's password is ``benchmark``.
+
+Usage:
+    python benchmarks/generate_data.py --out /tmp/bench-data --users 2 --skus 50000 --sales 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datastore import (INVENTORY_FIELDNAMES, SALES_FIELDNAMES, SALES_MANIFEST_FIELDNAMES,  # noqa: E402
+                       USER_FIELDNAMES, write_csv_rows)
+from sales import SalesManifest, Totals  # noqa: E402
+from storage import CsvBackend  # noqa: E402
+
+PASSWORD = 'benchmark'
+
+BASE_NAMES = [
+    'Paracetamol', 'Ibuprofen', 'Amoxicillin', 'Azithromycin', 'Cetirizine', 'Metformin', 'Atorvastatin',
+    'Omeprazole', 'Pantoprazole', 'Amlodipine', 'Losartan', 'Dolo', 'Crocin', 'Dettol', 'Betadine',
+    'Volini', 'Combiflam', 'Allegra', 'Montair', 'Ondansetron', 'Ranitidine', 'Levocetirizine',
+    'Vitamin C', 'Vitamin D3', 'Calcium', 'Zinc', 'ORS', 'Gaviscon', 'Digene', 'Benadryl',
+    'Ciprofloxacin', 'Doxycycline', 'Clotrimazole', 'Fluconazole', 'Niclosamide', 'Diclofenac',
+]
+FORMS = ['Tablet', 'Capsule', 'Syrup', 'Gel', 'Drops', 'Injection', 'Cream', 'Sachet']
+STRENGTHS = ['5mg', '10mg', '25mg', '50mg', '100mg', '250mg', '500mg', '650mg', '1g']
+MANUFACTURERS = [
+    'Cipla', 'Sun Pharma', "Dr. Reddy's", 'Lupin', 'Mankind', 'Alkem', 'Torrent', 'Zydus',
+    'Glenmark', 'Abbott', 'Pfizer', 'GSK', 'Bayer', 'Johnson & Johnson', 'Reckitt', 'Himalaya',
+]
+
+
+def username(n):
+    return f'bench{n}'
+
+
+def medicine_name(rng, n):
+    """Returns a plausible, unique medicine name for SKU number ``n``."""
+    name = f"{rng.choice(BASE_NAMES)} {rng.choice(STRENGTHS)} {rng.choice(FORMS)}"
+    # Past the number of distinct combinations, a pack size keeps names unique
+    return name if n <= 2000 else f"{name} x{n}"
+
+
+def write_users(data_dir, count):
+    """Writes users.csv with ``count`` users sharing one password hash (hashing is slow by design)."""
+    from werkzeug.security import generate_password_hash
+    from passwords import DEFAULT_METHOD
+    password_hash = generate_password_hash(PASSWORD, method=DEFAULT_METHOD)
+    with open(os.path.join(data_dir, 'users.csv'), 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=USER_FIELDNAMES)
+        writer.writeheader()
+        for n in range(1, count + 1):
+            writer.writerow({'id': n, 'username': username(n), 'password_hash': password_hash})
+
+
+def write_inventory(path, skus, rng, today):
+    """Writes ``skus`` medicines; returns their (id, name, price) for the sales generator."""
+    catalog = []
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(INVENTORY_FIELDNAMES)
+        for item_id in range(1, skus + 1):
+            name = medicine_name(rng, item_id)
+            price = round(rng.uniform(5, 800), 2)
+            # Mostly well stocked, with some low and out-of-stock items and near expiries
+            roll = rng.random()
+            if roll < 0.03:
+                quantity = 0
+            elif roll < 0.15:
+                quantity = rng.randint(1, 20)
+            else:
+                quantity = rng.randint(21, 5000)
+            expiry = today + timedelta(days=rng.randint(-30, 900))
+            writer.writerow([item_id, name, rng.choice(MANUFACTURERS), expiry.isoformat(), quantity, price])
+            catalog.append((item_id, name, price))
+    return catalog
+
+
+def write_sales(backend, user, lines, catalog, rng, today, days):
+    """Writes about ``lines`` sales lines spread over the last ``days`` days, oldest first.
+
+    Earlier days go into monthly segments listed in the manifest and today's
+    lines into the hot segment, as the app leaves them after a compaction.
+    """
+    if not catalog:
+        lines = 0
+    os.makedirs(backend.sales_dir(user), exist_ok=True)
+    start = today - timedelta(days=days - 1)
+    per_day = lines / days if days else 0
+    manifest = SalesManifest()
+    bill_id = 0
+    written = 0
+    file = writer = None
+    segment = None
+    try:
+        for offset in range(days):
+            day = (start + timedelta(days=offset)).isoformat()
+            path = backend.hot_sales_file(user) if offset == days - 1 else backend.sales_segment_file(user, day[:7])
+            if path != segment:
+                if file is not None:
+                    file.close()
+                file = open(path, 'w', newline='', encoding='utf-8')
+                writer = csv.writer(file)
+                writer.writerow(SALES_FIELDNAMES)
+                segment = path
+            target = round(per_day * (offset + 1)) if offset < days - 1 else lines
+            seconds = 8 * 3600
+            totals = Totals()
+            first = written
+            while written < target:
+                bill_id += 1
+                totals.transactions += 1
+                seconds = min(seconds + rng.randint(10, 600), 23 * 3600 + 59 * 60)
+                clock = f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+                for _ in range(min(rng.randint(1, 5), target - written)):
+                    item_id, name, price = rng.choice(catalog)
+                    quantity = rng.randint(1, 4)
+                    amount = round(price * quantity, 2)
+                    writer.writerow([bill_id, day, clock, item_id, name, quantity, price, amount])
+                    totals.revenue += amount
+                    totals.items += quantity
+                    written += 1
+            if offset < days - 1 and written > first:
+                manifest.add(day, totals, written - first, bill_id)
+    finally:
+        if file is not None:
+            file.close()
+    if segment != backend.hot_sales_file(user):
+        write_csv_rows(backend.hot_sales_file(user), [], SALES_FIELDNAMES)
+    write_csv_rows(backend.sales_manifest_file(user), manifest.to_rows(), SALES_MANIFEST_FIELDNAMES)
+    return written
+
+
+def generate(data_dir, users=1, skus=1000, sales=10000, days=365, seed=1, today=None):
+    """Generates a full data directory and returns a summary dict."""
+    os.makedirs(data_dir, exist_ok=True)
+    today = today or date.today()
+    started = time.perf_counter()
+    write_users(data_dir, users)
+    backend = CsvBackend(data_dir)
+    total_lines = 0
+    for n in range(1, users + 1):
+        rng = random.Random(seed * 1000003 + n)
+        name = username(n)
+        catalog = write_inventory(os.path.join(data_dir, f'{name}_inventory.csv'), skus, rng, today)
+        total_lines += write_sales(backend, name, sales, catalog, rng, today, days)
+    return {
+        'data_dir': data_dir,
+        'users': users,
+        'skus_per_user': skus,
+        'sales_lines': total_lines,
+        'days': days,
+        'seed': seed,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', required=True, help='data directory to write (created if missing)')
+    parser.add_argument('--users', type=int, default=1, help='users to create (bench1, bench2, ...)')
+    parser.add_argument('--skus', type=int, default=1000, help='medicines per user')
+    parser.add_argument('--sales', type=int, default=10000, help='sales lines per user')
+    parser.add_argument('--days', type=int, default=365, help='days of sales history, ending today')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    summary = generate(args.out, args.users, args.skus, args.sales, args.days, args.seed)
+    print(f"{summary['users']} user(s) x {summary['skus_per_user']} SKUs, {summary['sales_lines']} sales lines "
+          f"over {summary['days']} days written to {summary['data_dir']} in {summary['seconds']}s "
+          f"(password: {PASSWORD})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# benchmarks/login_throughput.py
+"""Login throughput under concurrent load: hashing on the request threads vs the worker pool.
+
+Seeds a throwaway data directory with users, then for each variant runs
+``--threads`` threads that log in over and over for ``--seconds`` while a
+probe thread keeps requesting a cheap signed-in endpoint, and reports
+
+* logins per second, login latency and how many were turned away with 503,
+* the probe's latency, i.e. what a login storm costs everyone else.
+
+The "inline" variant hashes on the request thread with no limit, as before
+the worker pool; "pool" uses PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE.
+
+Usage:
+    python benchmarks/login_throughput.py --threads 16 --seconds 10
+    python benchmarks/login_throughput.py --workers 4 --queue 8 --json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from common import import_app, percentile
+
+PASSWORD = 'benchmark'
+
+
+def seed(app_module, count):
+    """Registers ``count`` users sharing one password hash; returns their usernames."""
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(PASSWORD, method=app_module.password_hasher.method)
+    names = [f'store{n}' for n in range(1, count + 1)]
+    for name in names:
+        app_module.backend.create_user(name, password_hash)
+    return names
+
+
+def run(app_module, usernames, threads, seconds):
+    """Runs the login storm plus the probe; returns a results dict."""
+    app = app_module.app
+    probe_client = app.test_client()
+    probe_client.post('/login', data={'username': usernames[0], 'password': PASSWORD})
+    stop = time.perf_counter() + seconds
+    logins, rejected, failed, probes = [], [], [], []
+    lock = threading.Lock()
+
+    def storm(offset):
+        n = offset
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            # A fresh client per attempt, so every request really checks a password
+            response = app.test_client().post('/login', data={'username': usernames[n % len(usernames)],
+                                                              'password': PASSWORD})
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code == 302:
+                    logins.append(elapsed)
+                elif response.status_code == 503:
+                    rejected.append(elapsed)
+                else:
+                    failed.append(response.status_code)
+            n += threads
+            if response.status_code == 503:
+                # What a browser honouring Retry-After would roughly do, without stretching the run
+                time.sleep(0.05)
+
+    def probe():
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            probe_client.get('/api/sales/kpi_summary/today').get_data()
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=storm, args=(n,)) for n in range(threads)]
+    workers.append(threading.Thread(target=probe))
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+    return {
+        'logins_per_second': len(logins) / wall,
+        'logins': len(logins),
+        'rejected_503': len(rejected),
+        'failed': len(failed),
+        'login_p50_ms': percentile(logins, 0.5) * 1e3,
+        'login_p95_ms': percentile(logins, 0.95) * 1e3,
+        'rejected_p50_ms': percentile(rejected, 0.5) * 1e3,
+        'probe_p50_ms': percentile(probes, 0.5) * 1e3,
+        'probe_p95_ms': percentile(probes, 0.95) * 1e3,
+        'probe_p99_ms': percentile(probes, 0.99) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='users to seed')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent login threads')
+    parser.add_argument('--seconds', type=float, default=10, help='length of each run')
+    parser.add_argument('--workers', type=int, default=None, help='pool processes (default: PASSWORD_HASH_WORKERS)')
+    parser.add_argument('--queue', type=int, default=None, help='pool backlog (default: PASSWORD_HASH_QUEUE)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    app_module = import_app(tempfile.mkdtemp(prefix='pharmacy-login-'), 'login.db')
+    from passwords import PasswordHasher
+    method = app_module.password_hasher.method
+    workers = args.workers if args.workers is not None else app_module.app.config['PASSWORD_HASH_WORKERS']
+    queue = args.queue if args.queue is not None else app_module.app.config['PASSWORD_HASH_QUEUE']
+    usernames = seed(app_module, args.users)
+
+    results = {'backend': app_module.backend.name, 'method': method, 'threads': args.threads, 'cpus': os.cpu_count()}
+    variants = [('inline', PasswordHasher(method, 0, max(args.threads, 1) * 2)),
+                ('pool', PasswordHasher(method, workers, queue))]
+    for name, hasher in variants:
+        app_module.password_hasher = hasher
+        if hasher.workers:
+            # Start the worker processes before the clock starts
+            hasher.hash(PASSWORD)
+        results[name] = dict(run(app_module, usernames, args.threads, args.seconds),
+                             workers=hasher.workers, queue=hasher.max_pending)
+        hasher.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{args.threads} login threads, {results['cpus']} CPUs, {method}, {results['backend']} backend")
+        for name, _ in variants:
+            r = results[name]
+            print(f"{name:7s} workers={r['workers']} queue={r['queue']}: {r['logins_per_second']:.1f} logins/s "
+                  f"(p50 {r['login_p50_ms']:.0f} ms, p95 {r['login_p95_ms']:.0f} ms), "
+                  f"{r['rejected_503']} turned away with 503 (p50 {r['rejected_p50_ms']:.1f} ms); "
+                  f"other requests p50 {r['probe_p50_ms']:.1f} ms, p95 {r['probe_p95_ms']:.1f} ms, "
+                  f"p99 {r['probe_p99_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# benchmarks/snapshot_load.py
+"""Cold load time and memory: parsing the CSV files vs loading their binary snapshots.
+
+Generates a data directory (or uses ``--data-dir``), then loads one store's
+inventory and its whole sales history into a fresh cache three times: from
+the CSV files, once more while writing the snapshots, and from the
+snapshots. Memory is the traced allocation of the loaded rows per row.
+
+Usage:
+    python benchmarks/snapshot_load.py --skus 50000 --sales 1000000
+    python benchmarks/snapshot_load.py --data-dir /tmp/bench-data --json
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_data  # noqa: E402
+from datastore import DataStore  # noqa: E402
+from storage import CsvBackend  # noqa: E402
+
+
+def load_store(backend, username):
+    """Loads the inventory and every sales line of ``username``; returns (inventory, sales lines)."""
+    inventory = backend.load_inventory(username)
+    sales = backend.load_sales(username)
+    return inventory, list(sales)
+
+
+def measure(data_dir, username, snapshots, trace):
+    """Returns (seconds, traced bytes or None, rows) for one cold load."""
+    backend = CsvBackend(data_dir, DataStore(max_rows=10 ** 9), snapshots)
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    inventory, sales = load_store(backend, username)
+    elapsed = time.perf_counter() - started
+    traced = None
+    if trace:
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return elapsed, traced, len(inventory) + len(sales)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', help='existing data directory (default: generate one)')
+    parser.add_argument('--user', default=generate_data.username(1), help='store to load')
+    parser.add_argument('--skus', type=int, default=50000, help='medicines per generated user')
+    parser.add_argument('--sales', type=int, default=500000, help='sales lines per generated user')
+    parser.add_argument('--days', type=int, default=365, help='days of generated sales history')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = tempfile.mkdtemp(prefix='pharmacy-snapshot-')
+        generate_data.generate(data_dir, 1, args.skus, args.sales, args.days)
+    # Split up a legacy sales file first so it is not part of the timings
+    CsvBackend(data_dir).load_sales(args.user)
+
+    csv_seconds, _, rows = measure(data_dir, args.user, False, False)
+    _, csv_bytes, _ = measure(data_dir, args.user, False, True)
+    write_seconds, _, _ = measure(data_dir, args.user, True, False)
+    snapshot_seconds, _, _ = measure(data_dir, args.user, True, False)
+    _, snapshot_bytes, _ = measure(data_dir, args.user, True, True)
+    results = {
+        'rows': rows,
+        'csv_load_ms': csv_seconds * 1e3,
+        'csv_load_and_write_snapshots_ms': write_seconds * 1e3,
+        'snapshot_load_ms': snapshot_seconds * 1e3,
+        'speedup': csv_seconds / snapshot_seconds,
+        'csv_bytes_per_row': csv_bytes / max(rows, 1),
+        'snapshot_bytes_per_row': snapshot_bytes / max(rows, 1),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{rows} rows (inventory and sales) of {args.user} in {data_dir}")
+        print(f"cold load: {results['csv_load_ms']:.0f} ms from CSV -> {results['snapshot_load_ms']:.0f} ms "
+              f"from snapshots ({results['speedup']:.1f}x); first load with snapshots on "
+              f"{results['csv_load_and_write_snapshots_ms']:.0f} ms")
+        print(f"memory: {results['csv_bytes_per_row']:.0f} -> {results['snapshot_bytes_per_row']:.0f} bytes per row")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# benchmarks/stress_billing.py
+"""Concurrency stress test for /api/billing/create.
+
+Seeds a throwaway store, then has many threads (optionally in several
+processes) sell the same few medicines at once through the Flask test
+client. Afterwards it checks that no stock update was lost:
+
+* every medicine's final quantity equals its starting quantity minus the
+  units of all successful bills,
+* the sales ledger holds exactly the lines of the successful bills, and
+* no bill id was handed out twice.
+
+Usage:
+    python benchmarks/stress_billing.py --threads 16 --bills 50 --processes 2
+    STORAGE_BACKEND=sqlite python benchmarks/stress_billing.py
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+from multiprocessing import Process, Queue
+
+from common import import_app, logged_in_client
+
+USERNAME = 'stress'
+ITEMS = 5
+START_QUANTITY = 100000
+
+
+def seed(app_module):
+    """Creates the stress user with ITEMS medicines and returns its id."""
+    backend = app_module.backend
+    user_id = backend.create_user(USERNAME, 'unused')
+    with backend.lock(USERNAME):
+        inventory = backend.load_inventory(USERNAME)
+        for n in range(1, ITEMS + 1):
+            inventory.add({'id': n, 'name': f'Medicine {n}', 'Manufacturer': 'Stress Labs',
+                           'expiry_date': '2099-12-31', 'quantity': START_QUANTITY, 'price': 1.5})
+        backend.save_inventory(USERNAME, inventory)
+    return user_id
+
+
+def run_worker(data_dir, user_id, threads, bills, seed_value, results):
+    """Fires ``threads * bills`` bills and puts (sold units per item id, bill ids) on ``results``."""
+    app_module = import_app(data_dir, 'stress.db')
+    sold = Counter()
+    bill_ids = []
+    failures = []
+    guard = threading.Lock()
+
+    def till(n):
+        rng = random.Random(seed_value * 1000 + n)
+        client = logged_in_client(app_module, user_id)
+        for _ in range(bills):
+            lines = [{'id': rng.randint(1, ITEMS), 'quantity': rng.randint(1, 3)}
+                     for _ in range(rng.randint(1, 4))]
+            response = client.post('/api/billing/create', json={'items': lines})
+            body = response.get_json()
+            with guard:
+                if response.status_code == 200 and body.get('success'):
+                    bill_ids.append(body['bill_id'])
+                    for line in lines:
+                        sold[line['id']] += line['quantity']
+                else:
+                    failures.append((response.status_code, body))
+
+    workers = [threading.Thread(target=till, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((dict(sold), bill_ids, failures))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='concurrent tills per process')
+    parser.add_argument('--bills', type=int, default=25, help='bills per till')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes sharing the data directory')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='pharmacy-stress-')
+    app_module = import_app(data_dir, 'stress.db')
+    user_id = seed(app_module)
+
+    results = Queue()
+    if args.processes == 1:
+        run_worker(data_dir, user_id, args.threads, args.bills, 0, results)
+        outcomes = [results.get()]
+    else:
+        procs = [Process(target=run_worker, args=(data_dir, user_id, args.threads, args.bills, p, results))
+                 for p in range(args.processes)]
+        for proc in procs:
+            proc.start()
+        outcomes = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    sold = Counter()
+    bill_ids = []
+    failures = []
+    for outcome_sold, outcome_bills, outcome_failures in outcomes:
+        sold.update(outcome_sold)
+        bill_ids.extend(outcome_bills)
+        failures.extend(outcome_failures)
+
+    # Read back from storage, bypassing anything this process has cached
+    app_module.store.clear()
+    inventory = app_module.backend.load_inventory(USERNAME)
+    sales = app_module.backend.load_sales(USERNAME)
+
+    problems = []
+    for item_id in range(1, ITEMS + 1):
+        expected = START_QUANTITY - sold[item_id]
+        actual = inventory.get(item_id)['quantity']
+        if actual != expected:
+            problems.append(f"item {item_id}: quantity {actual}, expected {expected}")
+    duplicates = [bill for bill, count in Counter(bill_ids).items() if count > 1]
+    if duplicates:
+        problems.append(f"bill ids issued more than once: {sorted(duplicates)[:10]}")
+    if set(s['bill_id'] for s in sales) != set(bill_ids):
+        problems.append(f"ledger has {len(set(s['bill_id'] for s in sales))} bills, {len(bill_ids)} succeeded")
+    ledger_units = Counter()
+    for s in sales:
+        ledger_units[s['product_id']] += s['quantity']
+    if ledger_units != sold:
+        problems.append("units in the sales ledger do not match units sold")
+    if failures:
+        problems.append(f"{len(failures)} bills failed, e.g. {failures[0]}")
+
+    print(f"{len(bill_ids)} bills from {args.processes} process(es) x {args.threads} thread(s), "
+          f"{sum(sold.values())} units sold, data in {data_dir}")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: stock, ledger and bill ids are consistent")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# bulk.py
+"""Streaming parsing of inventory uploads (CSV or NDJSON) and streaming inventory export."""
+import csv
+import io
+import json
+
+from datastore import INVENTORY_FIELDNAMES
+from status import NO_EXPIRY, expiry_ordinal
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Errors listed in an import report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# Upload column names are matched case-insensitively
+_COLUMNS = {name.lower(): name for name in INVENTORY_FIELDNAMES}
+
+
+def import_format(requested, mimetype, filename):
+    """Picks 'csv' or 'ndjson' from an explicit ``format`` argument, the upload's type or its name."""
+    if requested:
+        requested = requested.lower()
+        if requested not in IMPORT_FORMATS:
+            raise ValueError("format must be 'csv' or 'ndjson'.")
+        return requested
+    if 'ndjson' in (mimetype or '') or 'jsonl' in (mimetype or ''):
+        return 'ndjson'
+    if (filename or '').lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_records(stream, fmt):
+    """Lazily yields (line number, record dict or None, error message or None) from a binary upload.
+
+    Rows are decoded one at a time, so the upload is never held in memory
+    as a whole.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Each line must be a JSON object."
+                continue
+            yield line_number, record, None
+        return
+
+    reader = csv.DictReader(text)
+    if reader.fieldnames is None:
+        return
+    if 'name' not in (field.strip().lower() for field in reader.fieldnames if field):
+        raise ValueError("The CSV header must include a 'name' column.")
+    for record in reader:
+        # The header is line 1
+        yield reader.line_num, record, None
+
+
+def clean_record(record):
+    """Validates an uploaded row and returns it in add_medicine's shape; raises ValueError."""
+    fields = {}
+    for key, value in record.items():
+        column = _COLUMNS.get((key or '').strip().lower())
+        if column is not None:
+            fields[column] = value.strip() if isinstance(value, str) else value
+
+    name = fields.get('name') or ''
+    if not isinstance(name, str) or not name:
+        raise ValueError("name is required.")
+    medicine = {'name': name, 'Manufacturer': str(fields.get('Manufacturer') or '')}
+
+    quantity = fields.get('quantity')
+    try:
+        if isinstance(quantity, float) or isinstance(quantity, bool):
+            raise ValueError
+        medicine['quantity'] = int(quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f"quantity must be a whole number, got {quantity!r}.")
+    if medicine['quantity'] < 0:
+        raise ValueError("quantity cannot be negative.")
+
+    price = fields.get('price')
+    if price not in (None, ''):
+        try:
+            medicine['price'] = float(price)
+        except (TypeError, ValueError):
+            raise ValueError(f"price must be a number, got {price!r}.")
+        if medicine['price'] < 0:
+            raise ValueError("price cannot be negative.")
+
+    expiry_date = fields.get('expiry_date')
+    if expiry_date not in (None, ''):
+        if not isinstance(expiry_date, str) or expiry_ordinal(expiry_date) == NO_EXPIRY:
+            raise ValueError(f"expiry_date must be a date in YYYY-MM-DD format, got {expiry_date!r}.")
+        medicine['expiry_date'] = expiry_date
+    return medicine
+
+
+def export_csv(rows):
+    """Yields ``rows`` as CSV text (header first), a line at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=INVENTORY_FIELDNAMES, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def export_ndjson(rows):
+    """Yields ``rows`` as NDJSON, one object per line."""
+    for row in rows:
+        yield json.dumps({field: row.get(field) for field in INVENTORY_FIELDNAMES}) + '\n'
@@ -0,0 +1,253 @@
+# datastore.py
+"""CSV row helpers and the in-memory cache shared by the storage backends."""
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from metrics import ROWS_PARSED, BYTES_WRITTEN, CACHE_LOOKUPS, STORAGE_ERRORS
+
+INVENTORY_FIELDNAMES = ['id', 'name', 'Manufacturer', 'expiry_date', 'quantity', 'price']
+SALES_FIELDNAMES = ['bill_id', 'date', 'time', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_amount']
+USER_FIELDNAMES = ['id', 'username', 'password_hash']
+# Idempotency keys of bills submitted in batches, with the bill id each one created
+BILL_KEY_FIELDNAMES = ['key', 'bill_id', 'date']
+# Per-day totals of the sales days rolled into monthly segments
+SALES_MANIFEST_FIELDNAMES = ['date', 'rows', 'revenue', 'transactions', 'items', 'last_bill_id']
+
+# --- Row typing ---
+
+def to_int(value):
+    """Converts a CSV field to int, treating blanks and junk as 0."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+def to_float(value):
+    """Converts a CSV field to float, treating blanks and junk as 0.0."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+INVENTORY_TYPES = {'id': to_int, 'quantity': to_int, 'price': to_float}
+SALES_TYPES = {'bill_id': to_int, 'product_id': to_int, 'quantity': to_int,
+               'unit_price': to_float, 'total_amount': to_float}
+BILL_KEY_TYPES = {'bill_id': to_int}
+SALES_MANIFEST_TYPES = {'rows': to_int, 'revenue': to_float, 'transactions': to_int, 'items': to_int,
+                        'last_bill_id': to_int}
+
+def type_row(row, types):
+    """Returns a copy of a raw CSV row with its numeric fields converted."""
+    typed = {key: (value if value is not None else '') for key, value in row.items() if key is not None}
+    for field, convert in types.items():
+        typed[field] = convert(typed.get(field))
+    return typed
+
+# --- CSV files ---
+
+def file_version(filename):
+    """Returns a token that changes whenever the file is rewritten or appended to, or None if missing."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def read_csv_rows(filename, types=None):
+    """Reads every row of a CSV file, typed with ``types``; a missing file reads as empty."""
+    rows = []
+    if not os.path.exists(filename):
+        return rows
+    try:
+        with open(filename, mode='r', newline='', encoding='utf-8') as file:
+            rows = [type_row(row, types or {}) for row in csv.DictReader(file)]
+    except Exception as e:
+        STORAGE_ERRORS.inc(operation='read')
+        print(f"Error reading {filename}: {e}")
+    ROWS_PARSED.inc(len(rows), source='csv')
+    return rows
+
+def _replace_file(filename, write):
+    """Atomically replaces ``filename`` with what ``write(file)`` writes. Returns False if that failed.
+
+    The data goes to a temporary file in the same directory which then
+    replaces the original, so a crash mid-write never leaves a truncated file
+    behind.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode='w', newline='', encoding='utf-8') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+            BYTES_WRITTEN.inc(os.fstat(file.fileno()).st_size)
+        try:
+            mode = os.stat(filename).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, filename)
+    except Exception as e:
+        STORAGE_ERRORS.inc(operation='write')
+        print(f"Error writing to {filename}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+    return True
+
+def write_csv_rows(filename, rows, fieldnames):
+    """Atomically rewrites a CSV file with ``rows``. Returns False if the write failed."""
+    def write(file):
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+    return _replace_file(filename, write)
+
+def write_json_file(filename, value):
+    """Atomically rewrites a JSON file with ``value``. Returns False if the write failed."""
+    return _replace_file(filename, lambda file: json.dump(value, file, separators=(',', ':')))
+
+def read_json_file(filename):
+    """Returns the value stored in a JSON file, or None if it is missing or unreadable."""
+    try:
+        with open(filename, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        STORAGE_ERRORS.inc(operation='read')
+        print(f"Error reading {filename}: {e}")
+        return None
+
+def append_csv_rows(filename, rows, fieldnames):
+    """Appends ``rows`` to a CSV file in one fsync'd write; errors are raised.
+
+    Costs O(len(rows)) regardless of the file's size. The header is written
+    first if the file is missing or empty.
+    """
+    version = file_version(filename)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    if version is None or version[1] == 0:
+        writer.writeheader()
+    elif not _ends_with_newline(filename):
+        buffer.write('\r\n')
+    writer.writerows(rows)
+    data = buffer.getvalue()
+    try:
+        with open(filename, mode='a', newline='', encoding='utf-8') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+    except OSError:
+        STORAGE_ERRORS.inc(operation='append')
+        raise
+    BYTES_WRITTEN.inc(len(data.encode('utf-8')))
+
+def _ends_with_newline(filename):
+    with open(filename, mode='rb') as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) in (b'\n', b'\r')
+
+# --- Cache ---
+
+class DataStore:
+    """LRU cache of parsed data, each entry tagged with the version it was read at.
+
+    Backends pass the current version of the underlying data (a file's mtime
+    and size, a database generation counter, ...) on every lookup, so changes
+    made outside this process are picked up on the next read. Cached values are
+    shared between requests: rows must be treated as read-only (copy a row
+    before changing it) and changes persisted through the backend. Entries are
+    evicted least-recently-used once the total cached row count exceeds
+    ``max_rows``.
+    """
+
+    def __init__(self, max_rows=500000):
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (version, value)
+        self._total_rows = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_rows(self):
+        """The number of rows currently cached."""
+        return self._total_rows
+
+    def get(self, key, version, load):
+        """Returns the cached value for ``key`` if it is still at ``version``, else caches ``load()``."""
+        cached = self.peek(key, version)
+        if cached is not None:
+            return cached
+        value = load()
+        self.put(key, version, value)
+        return value
+
+    def peek(self, key, version):
+        """Returns the cached value for ``key`` if it is still at ``version``, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or version is None or entry[0] != version:
+                CACHE_LOOKUPS.inc(result='miss')
+                return None
+            self._entries.move_to_end(key)
+            CACHE_LOOKUPS.inc(result='hit')
+            return entry[1]
+
+    def put(self, key, version, value):
+        """Caches ``value`` as the contents of ``key`` at ``version``."""
+        with self._lock:
+            self._pop(key)
+            if version is None:
+                return
+            self._entries[key] = (version, value)
+            self._total_rows += len(value)
+            # Evict least-recently-used entries, but never the one just stored
+            while self._total_rows > self.max_rows and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._total_rows -= len(evicted)
+
+    def extend(self, key, before, after, rows):
+        """Appends ``rows`` to a cached list that was at ``before`` and is now at ``after``.
+
+        If the entry moved on from ``before`` (someone else wrote too) it is
+        dropped and re-read on next access.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry[0] != before or after is None:
+                self._pop(key)
+                return
+            entry[1].extend(rows)
+            self._entries[key] = (after, entry[1])
+            self._total_rows += len(rows)
+
+    def invalidate(self, key):
+        """Drops the cached value for ``key``."""
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        """Drops every cached value."""
+        with self._lock:
+            self._entries.clear()
+            self._total_rows = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_rows -= len(entry[1])
@@ -0,0 +1,93 @@
+# events.py
+"""In-process publish/subscribe of per-store change events, sent to browsers as Server-Sent Events."""
+import json
+import queue
+import threading
+
+# Messages buffered per connected client before it is told to resync instead
+QUEUE_SIZE = 100
+
+
+def format_event(event, data):
+    """Returns one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """One connected client's queue of pending messages."""
+
+    __slots__ = ('channel', '_queue', '_overflowed')
+
+    def __init__(self, channel, queue_size=QUEUE_SIZE):
+        self.channel = channel
+        self._queue = queue.Queue(queue_size)
+        self._overflowed = False
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            # Never block the publisher on a slow client; it refetches instead
+            self._overflowed = True
+
+    def get(self, timeout=None):
+        """Returns the next message, or None if nothing arrived within ``timeout`` seconds.
+
+        A client that fell behind gets a single "resync" event in place of
+        the messages it missed.
+        """
+        if self._overflowed:
+            self._overflowed = False
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            return format_event('resync', {})
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """Fans events out to every client subscribed to a channel (one channel per store).
+
+    Each event is serialized once, however many clients receive it, and
+    publishing to a channel nobody listens on costs a dict lookup. Events only
+    reach clients connected to the same process.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of Subscriptions
+
+    def subscribe(self, channel):
+        """Returns a new Subscription to ``channel``; pass it to ``unsubscribe`` when done."""
+        subscription = Subscription(channel, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event, data):
+        """Sends ``event`` with JSON-serializable ``data`` to the subscribers of ``channel``.
+
+        Returns the number of subscribers it was queued for.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        if not subscribers:
+            return 0
+        message = format_event(event, data)
+        for subscription in subscribers:
+            subscription.put(message)
+        return len(subscribers)
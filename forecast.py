@@ -0,0 +1,164 @@
+# forecast.py
+"""Reorder forecasts: when each product will run out and how much to order, from its recent sales rate."""
+import json
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from analytics import SalesAnalytics
+from datastore import DataStore
+from status import NO_EXPIRY, expiry_ordinal
+from storage import create_backend
+
+# Fields of a forecast row, in the order they are sent
+REORDER_FIELDNAMES = ['id', 'name', 'Manufacturer', 'quantity', 'expiry_date', 'units_per_day',
+                      'days_until_stockout', 'stockout_date', 'expires_first', 'reorder_by', 'suggested_quantity']
+
+# Settings a worker process needs to open the same storage as the server
+BACKEND_SETTINGS = ('STORAGE_BACKEND', 'DATA_DIR', 'SQLITE_PATH', 'CSV_SNAPSHOTS')
+
+
+class ReorderRules:
+    """How far back the sales rate looks, how long an order takes to arrive and how long it should last."""
+
+    __slots__ = ('window_days', 'lead_days', 'cover_days')
+
+    def __init__(self, window_days=30, lead_days=7, cover_days=30):
+        self.window_days = max(window_days, 1)
+        self.lead_days = lead_days
+        self.cover_days = cover_days
+
+    def key(self):
+        return (self.window_days, self.lead_days, self.cover_days)
+
+
+def forecast(inventory, units_sold, rules, today):
+    """Returns a forecast row per inventory row, soonest stock-out first.
+
+    ``units_sold`` maps product ids to the units sold in the
+    ``rules.window_days`` days before ``today`` (an ordinal). Stock still on
+    the shelf at its expiry date counts as gone then, so a product can run
+    out (``expires_first``) before its quantity is sold. The suggested
+    quantity tops what can still be sold up to the sales expected until a
+    new order arrives and has lasted ``rules.cover_days``. Products that did
+    not sell in the window get no stock-out date and no suggestion.
+    """
+    horizon = rules.lead_days + rules.cover_days
+    rows = []
+    for item in inventory:
+        rate = units_sold.get(item['id'], 0) / rules.window_days
+        quantity = max(item['quantity'], 0)
+        ordinal = expiry_ordinal(item.get('expiry_date'))
+        days_to_expiry = None if ordinal == NO_EXPIRY else max(ordinal - today, 0)
+        days_left = stockout_date = reorder_by = None
+        expires_first = False
+        suggested = 0
+        if rate > 0:
+            days_left = quantity / rate
+            if days_to_expiry is not None and days_to_expiry < days_left:
+                days_left, expires_first = days_to_expiry, True
+            stockout_date = date.fromordinal(today + int(days_left)).isoformat()
+            reorder_by = date.fromordinal(today + max(int(days_left) - rules.lead_days, 0)).isoformat()
+            suggested = max(math.ceil(rate * (horizon - days_left)), 0)
+        rows.append({'id': item['id'], 'name': item.get('name', ''), 'Manufacturer': item.get('Manufacturer', ''),
+                     'quantity': item['quantity'], 'expiry_date': item.get('expiry_date', ''),
+                     'units_per_day': round(rate, 4),
+                     'days_until_stockout': None if days_left is None else round(days_left, 1),
+                     'stockout_date': stockout_date, 'expires_first': expires_first, 'reorder_by': reorder_by,
+                     'suggested_quantity': suggested})
+    rows.sort(key=lambda row: (row['days_until_stockout'] is None, row['days_until_stockout'] or 0, row['id']))
+    return rows
+
+
+def forecast_store(backend, analytics, username, rules, today):
+    """Returns (data version, forecast rows) for one store.
+
+    The sales rate covers the ``rules.window_days`` whole days before
+    ``today``, a range whose summary stays cached until tomorrow.
+    """
+    version = backend.data_version(username)
+    inventory = backend.load_inventory(username)
+    day = date.fromordinal(today)
+    summary = analytics.summary(username, backend.load_sales(username),
+                                (day - timedelta(days=rules.window_days)).isoformat(),
+                                (day - timedelta(days=1)).isoformat())
+    units_sold = {product_id: entry[0] for product_id, entry in summary.products.items()}
+    return version, forecast(inventory, units_sold, rules, today)
+
+
+def _forecast_in_worker(settings, username, rules, today):
+    # Fresh caches per store, so a worker holds no more than one store's data at a time
+    backend = create_backend(settings, DataStore())
+    return forecast_store(backend, SalesAnalytics(DataStore()), username, rules, today)
+
+
+class ReorderForecaster:
+    """Keeps every store's reorder forecast until its data, the date or the rules change.
+
+    ``refresh`` forecasts many stores at once across ``workers`` processes,
+    each opening the storage itself, so the server process neither does the
+    work nor loads the data. Forecasts are saved through the backend as well
+    as held in ``cache``, so one made by ``flask forecast-reorder`` serves
+    every server process; ``forecast`` answers one store from the cache or
+    the saved forecast, or computes it on the calling thread if both are stale.
+    """
+
+    def __init__(self, backend, analytics, config, workers=2):
+        self.backend = backend
+        self.analytics = analytics
+        self.cache = analytics.cache
+        self.settings = {key: config.get(key) for key in BACKEND_SETTINGS}
+        self.workers = workers
+
+    def _version(self, data_version, rules, today):
+        # A string, so a saved forecast compares equal in any process
+        return json.dumps([data_version, today, rules.key()])
+
+    def forecast(self, username, rules, today):
+        """Returns the forecast rows of ``username`` for ``today`` (an ordinal)."""
+        key = ('reorder', username)
+        version = self._version(self.backend.data_version(username), rules, today)
+        cached = self.cache.peek(key, version)
+        if cached is not None:
+            return cached
+        saved = self.backend.load_reorder_forecast(username)
+        if saved is not None and saved[0] == version:
+            self.cache.put(key, version, saved[1])
+            return saved[1]
+        data_version, rows = forecast_store(self.backend, self.analytics, username, rules, today)
+        self._store(username, self._version(data_version, rules, today), rows)
+        return rows
+
+    def _store(self, username, version, rows):
+        self.cache.put(('reorder', username), version, rows)
+        self.backend.save_reorder_forecast(username, version, rows)
+
+    def refresh(self, usernames, rules, today):
+        """Forecasts every store in ``usernames`` and saves the results; returns {username: rows}.
+
+        Stores that fail are reported and left out.
+        """
+        results = {}
+
+        def store(username, version, rows):
+            self._store(username, self._version(version, rules, today), rows)
+            results[username] = rows
+
+        if self.workers <= 0:
+            for username in usernames:
+                try:
+                    store(username, *forecast_store(self.backend, self.analytics, username, rules, today))
+                except Exception as e:
+                    print(f"Error forecasting reorders of {username}: {e}")
+            return results
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(_forecast_in_worker, self.settings, username, rules, today): username
+                       for username in usernames}
+            for future in as_completed(futures):
+                username = futures[future]
+                try:
+                    store(username, *future.result())
+                except Exception as e:
+                    print(f"Error forecasting reorders of {username}: {e}")
+        return results
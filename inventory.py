@@ -0,0 +1,150 @@
+# inventory.py
+"""Indexed, in-memory view of a user's inventory rows."""
+import threading
+
+from search import SearchIndex
+from status import STATUSES, InventoryColumns
+
+
+def normalize_key(name, manufacturer):
+    """Returns the case- and whitespace-insensitive (name, Manufacturer) lookup key."""
+    return ((name or '').strip().lower(), (manufacturer or '').strip().lower())
+
+
+class Inventory:
+    """Inventory rows indexed by id and by normalized (name, Manufacturer).
+
+    Iterating yields rows in file order, so an Inventory can be used wherever a
+    list of rows was. Rows are replaced rather than modified in place, which
+    keeps rows already handed to other requests unchanged.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = []
+        self.max_id = 0
+        self._by_id = {}
+        self._position = {}  # id -> index into self.rows
+        self._by_key = {}
+        self._changed = set()  # ids added or updated since the last take_changes()
+        self._search = None    # built on the first search, then kept up to date
+        self._columns = None   # built on the first status query, then kept up to date
+        # Held while rows change and while an index is built or caught up, so it sees every change
+        self._index_lock = threading.Lock()
+        self._search_build_lock = threading.Lock()
+        # Nobody else sees the object yet, so the rows go in without the lock
+        for row in rows:
+            self._insert(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def get(self, item_id):
+        """Returns the row with ``item_id``, or None."""
+        return self._by_id.get(item_id)
+
+    def find(self, name, manufacturer):
+        """Returns the row matching ``name`` and ``manufacturer`` (case-insensitive), or None."""
+        return self._by_key.get(normalize_key(name, manufacturer))
+
+    def search(self, query, limit):
+        """Returns up to ``limit`` rows whose name or manufacturer contains ``query``, best matches first."""
+        if self._search is None:
+            self._build_search()
+        return [self._by_id[item_id] for item_id in self._search.search(query, limit)]
+
+    def _build_search(self):
+        # Built from a copy of the rows without the writers' lock, then caught
+        # up under it with the rows replaced or added in the meantime
+        with self._search_build_lock:
+            if self._search is not None:
+                return
+            rows = list(self.rows)
+            index = SearchIndex(rows)
+            with self._index_lock:
+                for old, new in zip(rows, self.rows):
+                    if old is not new:
+                        index.update(old, new)
+                for row in self.rows[len(rows):]:
+                    index.add(row)
+                self._search = index
+
+    def columns(self):
+        """Returns the InventoryColumns (expiry ordinals and quantities) of the rows, building them once."""
+        if self._columns is None:
+            with self._index_lock:
+                if self._columns is None:
+                    self._columns = InventoryColumns(self.rows)
+        return self._columns
+
+    def statuses(self, rules, today):
+        """Returns (codes, counts): the status code of every row, in row order, and rows per code."""
+        return self.columns().classify(rules, today)
+
+    def status_of(self, row, rules, today):
+        """Returns the status dict of ``row``, taken from the batch classification when possible."""
+        columns = self.columns()
+        codes, _ = columns.classify(rules, today)
+        position = self._position.get(row.get('id'))
+        if position is not None and position < len(codes) and self.rows[position] is row:
+            return STATUSES[codes[position]]
+        # A stale copy or a duplicate id; classify it on its own
+        return STATUSES[rules.classify_row(row, today)]
+
+    def expiring(self, rules, today):
+        """Returns the rows expiring within ``rules.expiring_days`` after ``today``, soonest first."""
+        rows = self.rows
+        return [rows[position] for position in self.columns().expiring(rules, today)]
+
+    def next_id(self):
+        """Returns the id to give the next new medicine."""
+        return self.max_id + 1
+
+    def add(self, row):
+        """Adds a new row, assigning the next id if it has none."""
+        if not row.get('id'):
+            row = dict(row, id=self.next_id())
+        with self._index_lock:
+            self._insert(row)
+        self._changed.add(row['id'])
+        return row
+
+    def update(self, item_id, **changes):
+        """Replaces the row with ``item_id`` by a copy carrying ``changes``."""
+        old = self._by_id[item_id]
+        new = dict(old, **changes)
+        old_key = normalize_key(old.get('name'), old.get('Manufacturer'))
+        new_key = normalize_key(new.get('name'), new.get('Manufacturer'))
+        with self._index_lock:
+            self.rows[self._position[item_id]] = new
+            self._by_id[item_id] = new
+            if self._by_key.get(old_key) is old:
+                del self._by_key[old_key]
+            self._by_key.setdefault(new_key, new)
+            if self._search is not None:
+                self._search.update(old, new)
+            if self._columns is not None:
+                self._columns.set(self._position[item_id], new)
+        self._changed.add(item_id)
+        return new
+
+    def take_changes(self):
+        """Returns the rows added or updated since the last call, for row-level persistence."""
+        changed, self._changed = self._changed, set()
+        return [self._by_id[item_id] for item_id in changed if item_id in self._by_id]
+
+    def _insert(self, row):
+        item_id = row.get('id')
+        self._position[item_id] = len(self.rows)
+        self.rows.append(row)
+        self._by_id[item_id] = row
+        # The first matching row wins, as with the old linear scan
+        self._by_key.setdefault(normalize_key(row.get('name'), row.get('Manufacturer')), row)
+        if self._search is not None:
+            self._search.add(row)
+        if self._columns is not None:
+            self._columns.append(row)
+        if isinstance(item_id, int) and item_id > self.max_id:
+            self.max_id = item_id
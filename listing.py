@@ -0,0 +1,112 @@
+# listing.py
+"""Pagination, sorting and NDJSON streaming for the list endpoints."""
+import json
+from itertools import islice
+
+from flask import Response, jsonify, stream_with_context
+
+MAX_PAGE_SIZE = 1000
+
+
+class ListingArgs:
+    """Paging/sorting options parsed from a request's query string."""
+
+    def __init__(self, args, sort_fields):
+        self.offset = _non_negative_int(args, 'offset', 0)
+        self.limit = _non_negative_int(args, 'limit', None)
+        if self.limit is not None:
+            self.limit = min(self.limit, MAX_PAGE_SIZE)
+        self.sort = args.get('sort') or None
+        if self.sort is not None and self.sort not in sort_fields:
+            raise ValueError(f"Cannot sort by {self.sort!r}; expected one of {', '.join(sort_fields)}.")
+        self.order = args.get('order', 'asc').lower()
+        if self.order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'.")
+        self.format = args.get('format', 'json').lower()
+        if self.format not in ('json', 'ndjson'):
+            raise ValueError("format must be 'json' or 'ndjson'.")
+
+    @property
+    def reverse_natural(self):
+        """True for ``order=desc`` without a ``sort`` field: natural order, newest first."""
+        return self.sort is None and self.order == 'desc'
+
+    @property
+    def paged(self):
+        """True if the client asked for a page rather than the whole list."""
+        return self.limit is not None or self.offset > 0
+
+
+def _non_negative_int(args, name, default):
+    value = args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a non-negative integer.")
+    if number < 0:
+        raise ValueError(f"{name} must be a non-negative integer.")
+    return number
+
+
+def sort_rows(rows, listing):
+    """Applies an explicit ``sort`` to ``rows``.
+
+    Without one the rows stay lazy and in the order given (callers hand in
+    reversed natural order when ``listing.reverse_natural`` is set). Sorting
+    materializes references to the rows, never copies.
+    """
+    if listing.sort is None:
+        return rows
+    field = listing.sort
+    return sorted(rows, key=lambda row: (row.get(field) is None, row.get(field)),
+                  reverse=listing.order == 'desc')
+
+
+def respond(rows, listing, transform=None, total=None):
+    """Sends ``rows`` as the full JSON list, a JSON page, or an NDJSON stream.
+
+    ``rows`` may be a lazy iterator; ``transform`` (e.g. attaching a status)
+    is only applied to rows that are actually sent. A page reads ``rows`` only
+    up to its end: its ``total`` is ``total`` if given, else ``len(rows)`` if
+    it has one, else null, and one extra row tells whether there is a next page.
+    """
+    transform = transform or (lambda row: row)
+    if listing.format == 'ndjson':
+        end = None if listing.limit is None else listing.offset + listing.limit
+
+        def generate():
+            for row in islice(rows, listing.offset, end):
+                yield json.dumps(transform(row)) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if not listing.paged:
+        return jsonify([transform(row) for row in rows])
+
+    if total is None and hasattr(rows, '__len__'):
+        total = len(rows)
+    end = listing.offset + listing.limit if listing.limit is not None else None
+    if end is None:
+        page = [transform(row) for row in islice(rows, listing.offset, None)]
+        next_offset = None
+    elif total is not None:
+        page = [transform(row) for row in islice(rows, listing.offset, end)]
+        next_offset = end if end < total else None
+    else:
+        page = list(islice(rows, listing.offset, end + 1))
+        next_offset = end if len(page) > listing.limit else None
+        page = [transform(row) for row in page[:listing.limit]]
+    return jsonify({
+        "items": page,
+        "total": total,
+        "offset": listing.offset,
+        "limit": listing.limit,
+        "next_offset": next_offset
+    })
+
+
+def bad_listing_request(error):
+    """Returns the 400 response for invalid paging/filter arguments."""
+    return jsonify({"success": False, "message": str(error)}), 400
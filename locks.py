@@ -0,0 +1,74 @@
+# locks.py
+"""Per-user locks that serialize read-modify-write cycles across threads and processes."""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to msvcrt byte-range locks
+    fcntl = None
+    import msvcrt
+
+
+class UserLocks:
+    """Hands out one lock per store, plus one for the user list.
+
+    Inside a process a ``threading.Lock`` per store serializes threads; across
+    processes an exclusive lock on ``<lock_dir>/.store-<username>.lock`` does.
+    Stores never wait on each other, only two writers for the same store do.
+    The user list has ``.users.lock``, apart from every store's lock whatever
+    the store is called, so a registration can set up the new store's files.
+    """
+
+    def __init__(self, lock_dir='.'):
+        self.lock_dir = lock_dir
+        self._thread_locks = {}
+        self._guard = threading.Lock()
+
+    def _thread_lock(self, key):
+        with self._guard:
+            lock = self._thread_locks.get(key)
+            if lock is None:
+                lock = self._thread_locks[key] = threading.Lock()
+            return lock
+
+    def lock(self, name):
+        """Holds the lock of the store ``name``."""
+        return self._hold(('store', name), f".store-{name}.lock")
+
+    def registry(self):
+        """Holds the lock of the user list."""
+        return self._hold(('users',), '.users.lock')
+
+    @contextmanager
+    def _hold(self, key, filename):
+        with self._thread_lock(key):
+            path = os.path.join(self.lock_dir, filename)
+            with open(path, 'a+b') as file:
+                _lock_file(file)
+                try:
+                    yield
+                finally:
+                    _unlock_file(file)
+
+
+def _lock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else:
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:  # LK_LOCK gives up after ~10 seconds; keep waiting
+                continue
+
+
+def _unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,173 @@
+# metrics.py
+"""Counters and histograms exposed in the Prometheus text format on /metrics."""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Per-request phase totals, for the slow request profiler
+_request = threading.local()
+
+# Request latency buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge:
+    """A value read from ``function`` whenever metrics are collected."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, function):
+        self.name = name
+        self.help = help
+        self.function = function
+        _registry.append(self)
+
+    def lines(self):
+        yield f"{self.name} {_number(self.function())}"
+
+
+class Histogram:
+    """Observations counted into cumulative ``le`` buckets per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def lines(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+def exposition():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.lines())
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram('pharmacy_request_duration_seconds',
+                            'Time to handle a request, until the response (or its first chunk) is ready.',
+                            ('route', 'method'))
+REQUESTS = Counter('pharmacy_requests_total', 'Requests handled.', ('route', 'method', 'status'))
+PHASE_SECONDS = Counter('pharmacy_phase_seconds_total',
+                        'Time spent in storage, status classification and JSON serialization.', ('phase',))
+ROWS_PARSED = Counter('pharmacy_rows_parsed_total', 'Rows read from CSV files, snapshots or SQLite.', ('source',))
+BYTES_WRITTEN = Counter('pharmacy_csv_bytes_written_total', 'Bytes written to CSV files.')
+CACHE_LOOKUPS = Counter('pharmacy_cache_lookups_total', 'Parsed-data cache lookups.', ('result',))
+STORAGE_ERRORS = Counter('pharmacy_storage_errors_total', 'Failed reads and writes of data files.',
+                         ('operation',))
+
+
+@contextmanager
+def phase(name):
+    """Adds the time spent in the block to the ``name`` phase, overall and for the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.inc(elapsed, phase=name)
+        phases = getattr(_request, 'phases', None)
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + elapsed
+
+
+def start_request():
+    """Starts collecting phase times for the request handled by this thread."""
+    _request.phases = {}
+
+
+def finish_request():
+    """Returns {phase: seconds} for this thread's request and stops collecting."""
+    phases = getattr(_request, 'phases', None) or {}
+    _request.phases = None
+    return phases
+
+
+class TimedBackend:
+    """Wraps a storage backend so every call but the locks adds to the storage phase time."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attribute = getattr(self._backend, name)
+        if name in ('lock', 'registry_lock') or not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            with phase('storage'):
+                return attribute(*args, **kwargs)
+        timed.__name__ = name
+        return timed
@@ -0,0 +1,109 @@
+# passwords.py
+"""Password hashing and verification in a pool of worker processes, with a bounded backlog."""
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:1000000'
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing backlog is full; the caller should ask the client to retry later."""
+
+
+def method_of(password_hash):
+    """Returns the method and parameters part of a Werkzeug hash ('pbkdf2:sha256:1000000')."""
+    return (password_hash or '').split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Runs Werkzeug's hashing and verification off the request threads.
+
+    A login or registration costs hundreds of milliseconds of CPU by design.
+    With ``workers`` processes that CPU is capped at ``workers`` cores however
+    many requests arrive at once, and the request thread just waits on the
+    result. At most ``max_pending`` jobs (running or queued) are accepted;
+    beyond that ``HasherBusy`` is raised at once instead of letting the queue,
+    and every waiting request's latency, grow without bound. With
+    ``workers=0`` the work runs on the calling thread, still bounded.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_pending=8):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """The number of jobs running or waiting for a worker."""
+        return self._pending
+
+    def _pool(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # Spawned rather than forked: the server process has threads running
+                    self._executor = ProcessPoolExecutor(self.workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _submit(self, function, *args):
+        """Returns a Future for ``function(*args)``, or raises HasherBusy."""
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            if self.workers > 0:
+                try:
+                    future = self._pool().submit(function, *args)
+                except BrokenProcessPool:
+                    # A worker died (killed, out of memory); start a fresh pool once
+                    with self._executor_lock:
+                        self._executor = None
+                    future = self._pool().submit(function, *args)
+            else:
+                future = Future()
+                try:
+                    future.set_result(function(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def hash(self, password):
+        """Returns a new hash of ``password`` with the configured method. Raises HasherBusy."""
+        return self.submit_hash(password).result()
+
+    def submit_hash(self, password):
+        """Starts hashing ``password``; returns a Future of the hash. Raises HasherBusy."""
+        return self._submit(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Returns whether ``password`` matches ``password_hash``. Raises HasherBusy."""
+        return self._submit(check_password_hash, password_hash, password).result()
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than the configured ones."""
+        return method_of(password_hash) != self.method
+
+    def shutdown(self):
+        """Waits for the queued work and stops the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
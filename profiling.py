@@ -0,0 +1,87 @@
+# profiling.py
+"""Opt-in sampling profiler that writes a profile for every request slower than a threshold."""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse(frame):
+    """Returns the stack ending at ``frame`` as 'outer;...;inner', the folded format flame graph tools read."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """Samples the stacks of threads handling requests and keeps the samples of slow ones.
+
+    A single background thread wakes every ``interval_ms`` and records where
+    each in-flight request's thread is, so requests pay nothing beyond two
+    dict operations. When a request took at least ``threshold_ms``, its
+    samples and phase breakdown are written as JSON to ``directory``; the
+    samples of fast requests are dropped.
+    """
+
+    def __init__(self, threshold_ms, interval_ms=5, directory='profiles'):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._active = {}  # thread ident -> Counter of folded stacks
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[collapse(frame)] += 1
+
+    def begin(self):
+        """Starts sampling the calling thread (and the sampler itself, on first use)."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                    self._thread.start()
+        self._active[threading.get_ident()] = Counter()
+
+    def end(self, elapsed, details):
+        """Stops sampling the calling thread; returns the profile's path if the request was slow."""
+        samples = self._active.pop(threading.get_ident(), None)
+        if samples is None or elapsed < self.threshold:
+            return None
+        started = datetime.now()
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', details.get('route', '')).strip('_') or 'root'
+        path = os.path.join(self.directory, f"{started:%Y%m%d-%H%M%S-%f}-{slug}-{round(elapsed * 1000)}ms.json")
+        profile = dict(details, elapsed_ms=round(elapsed * 1000, 3), interval_ms=self.interval * 1000,
+                       samples=sum(samples.values()),
+                       folded=[f"{stack} {count}" for stack, count in samples.most_common()])
+        try:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(profile, file, indent=2)
+        except OSError as e:
+            print(f"Error writing profile {path}: {e}")
+            return None
+        return path
+
+    def discard(self):
+        """Stops sampling the calling thread without writing anything."""
+        self._active.pop(threading.get_ident(), None)
@@ -0,0 +1,309 @@
+# sales.py
+"""Sales ledger with running KPI totals per day, per month and overall, whole or split by month."""
+
+
+class Totals:
+    """Revenue, distinct transactions and items sold for one period."""
+
+    __slots__ = ('revenue', 'transactions', 'items')
+
+    def __init__(self, revenue=0, transactions=0, items=0):
+        self.revenue = revenue
+        self.transactions = transactions
+        self.items = items
+
+    def __add__(self, other):
+        return Totals(self.revenue + other.revenue, self.transactions + other.transactions,
+                      self.items + other.items)
+
+    def __sub__(self, other):
+        return Totals(self.revenue - other.revenue, self.transactions - other.transactions,
+                      self.items - other.items)
+
+    def to_dict(self):
+        """Returns the totals in the shape the kpi_summary endpoints send."""
+        return {
+            # Running sums pick up float noise; amounts are in paise precision anyway
+            "total_revenue": round(self.revenue, 2),
+            "total_transactions": self.transactions,
+            "total_items_sold": self.items
+        }
+
+
+class SalesLedger:
+    """Sales rows in ledger order, with totals kept up to date as rows are added.
+
+    Totals are built once when the ledger is loaded and then updated by
+    ``extend`` for every new bill line, so KPI lookups never rescan the rows.
+    A transaction is a distinct bill_id within a day; create_bill writes all
+    lines of a bill with the same date, so month and all-time counts are the
+    sums of the daily ones.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = []
+        self.total = Totals()
+        self._days = {}       # 'YYYY-MM-DD' -> Totals
+        self._months = {}     # 'YYYY-MM' -> Totals
+        self._day_rows = {}   # 'YYYY-MM-DD' -> rows of that day, in ledger order
+        self._day_bills = {}  # 'YYYY-MM-DD' -> bill_ids seen that day
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def extend(self, rows):
+        """Appends rows to the ledger and folds them into the running totals."""
+        first = {}  # day -> index in its day's rows of the first new row
+        for row in rows:
+            self.rows.append(row)
+            day = row.get('date') or ''
+            day_rows = self._day_rows.get(day)
+            if day_rows is None:
+                day_rows = self._day_rows[day] = []
+                self._day_bills[day] = set()
+                self._days[day] = Totals()
+            if day not in first:
+                first[day] = len(day_rows)
+            day_rows.append(row)
+
+        # Sum each day's new rows at once rather than updating three Totals per row
+        for day, start in first.items():
+            new_rows = self._day_rows[day][start:]
+            bills = self._day_bills[day]
+            known = len(bills)
+            bills.update(row.get('bill_id') for row in new_rows)
+            added = Totals(sum(row['total_amount'] for row in new_rows), len(bills) - known,
+                           sum(row['quantity'] for row in new_rows))
+            month = day[:7]
+            self._days[day] = self._days[day] + added
+            self._months[month] = self._months.get(month, Totals()) + added
+            self.total = self.total + added
+
+    def day(self, day):
+        """Returns the Totals for a 'YYYY-MM-DD' date."""
+        return self._days.get(day) or Totals()
+
+    def days(self):
+        """Returns the dates that have sales, oldest first."""
+        return sorted(self._days)
+
+    def month(self, month):
+        """Returns the Totals for a 'YYYY-MM' month."""
+        return self._months.get(month) or Totals()
+
+    def rows_for_day(self, day):
+        """Returns the rows dated ``day``, in ledger order."""
+        return self._day_rows.get(day, [])
+
+    def count(self, date_from=None, date_to=None, exclude_day=None):
+        """Returns how many rows ``select`` would yield with the same dates, without touching them."""
+        if date_from is None and date_to is None:
+            excluded = self._day_rows.get(exclude_day, ()) if exclude_day is not None else ()
+            return len(self.rows) - len(excluded)
+        return sum(len(rows) for day, rows in self._day_rows.items()
+                   if (date_from is None or day >= date_from)
+                   and (date_to is None or day <= date_to)
+                   and day != exclude_day)
+
+    def select(self, date_from=None, date_to=None, exclude_day=None, reverse=False):
+        """Lazily yields rows dated from ``date_from`` to ``date_to`` ('YYYY-MM-DD', inclusive).
+
+        Without a date range rows come in ledger order; with one, day by day
+        using the per-day index so days outside the range are never touched.
+        ``exclude_day`` skips one date and ``reverse`` yields newest first.
+        """
+        if date_from is None and date_to is None:
+            rows = reversed(self.rows) if reverse else iter(self.rows)
+            if exclude_day is None:
+                return rows
+            return (row for row in rows if row.get('date') != exclude_day)
+        days = sorted(day for day in self._day_rows
+                      if (date_from is None or day >= date_from)
+                      and (date_to is None or day <= date_to)
+                      and day != exclude_day)
+        if reverse:
+            return (row for day in reversed(days) for row in reversed(self._day_rows[day]))
+        return (row for day in days for row in self._day_rows[day])
+
+
+class SalesManifest:
+    """Per-day totals of the sales lines rolled into monthly segments.
+
+    Loaded from a few hundred manifest rows a year, it answers day, month and
+    all-time totals and tells which segments a date range needs, without
+    opening any of them. Each day also records the highest bill id moved, so
+    lines left behind by an interrupted compaction can be told apart from
+    bills that arrived for that day afterwards.
+
+    ``version`` is the version of the manifest file the rows were read from;
+    segments and the hot segment filtered through this manifest are cached
+    under it, so they never outlive the manifest they were filtered with.
+    """
+
+    def __init__(self, rows=(), version=None):
+        self.version = version
+        self.total = Totals()
+        self.row_count = 0
+        self._days = {}    # 'YYYY-MM-DD' -> [Totals, row count, last bill id]
+        self._months = {}  # 'YYYY-MM' -> Totals
+        self._month_rows = {}  # 'YYYY-MM' -> row count
+        for row in rows:
+            self.add(row['date'], Totals(row['revenue'], row['transactions'], row['items']),
+                     row['rows'], row['last_bill_id'])
+
+    def __len__(self):
+        return len(self._days)
+
+    def __contains__(self, day):
+        return day in self._days
+
+    def add(self, day, totals, rows, last_bill_id):
+        """Records ``rows`` lines of ``day`` (adding up to ``totals``) as moved into its segment."""
+        entry = self._days.get(day)
+        if entry is None:
+            self._days[day] = [totals, rows, last_bill_id]
+        else:
+            entry[0] = entry[0] + totals
+            entry[1] += rows
+            entry[2] = max(entry[2], last_bill_id)
+        month = day[:7]
+        self._months[month] = self._months.get(month, Totals()) + totals
+        self._month_rows[month] = self._month_rows.get(month, 0) + rows
+        self.total = self.total + totals
+        self.row_count += rows
+
+    def add_ledger(self, ledger):
+        """Records every day of a SalesLedger of lines just moved into the segments."""
+        for day in ledger.days():
+            rows = ledger.rows_for_day(day)
+            self.add(day, ledger.day(day), len(rows), max(row['bill_id'] for row in rows))
+
+    def covers(self, row):
+        """Whether a sales line is one of those already moved into a monthly segment."""
+        entry = self._days.get(row['date'])
+        return entry is not None and row['bill_id'] <= entry[2]
+
+    def day(self, day):
+        entry = self._days.get(day)
+        return entry[0] if entry else Totals()
+
+    def month(self, month):
+        return self._months.get(month) or Totals()
+
+    def month_rows(self, month):
+        """Returns how many lines of ``month`` were moved into its segment."""
+        return self._month_rows.get(month, 0)
+
+    @property
+    def last_bill_id(self):
+        """The highest bill id moved into the segments, or 0."""
+        return max((entry[2] for entry in self._days.values()), default=0)
+
+    def day_rows(self, day):
+        """Returns how many lines of ``day`` were moved into its segment."""
+        entry = self._days.get(day)
+        return entry[1] if entry else 0
+
+    def days(self):
+        """Returns the compacted dates, oldest first."""
+        return sorted(self._days)
+
+    def to_rows(self):
+        """Returns the manifest rows to write back, oldest day first."""
+        rows = []
+        for day in self.days():
+            totals, count, last_bill_id = self._days[day]
+            rows.append({'date': day, 'rows': count, 'revenue': totals.revenue, 'transactions': totals.transactions,
+                         'items': totals.items, 'last_bill_id': last_bill_id})
+        return rows
+
+
+class PartitionedSales:
+    """A SalesLedger-like view over monthly segments plus the hot segment of recent days.
+
+    Totals come from the manifest and the (small) hot ledger, so KPI lookups
+    open no segment at all. ``select`` loads, through ``load_segment(month)``,
+    only the monthly segments of the days it yields. Rows come day by day,
+    in ledger order within a day.
+    """
+
+    def __init__(self, manifest, hot, load_segment):
+        self.manifest = manifest
+        self.hot = hot  # SalesLedger of the lines not compacted yet
+        self._load_segment = load_segment
+
+    def __len__(self):
+        return self.manifest.row_count + len(self.hot)
+
+    def __iter__(self):
+        return self.select()
+
+    @property
+    def total(self):
+        return self.manifest.total + self.hot.total
+
+    def day(self, day):
+        return self.manifest.day(day) + self.hot.day(day)
+
+    def month(self, month):
+        return self.manifest.month(month) + self.hot.month(month)
+
+    def days(self):
+        return sorted(set(self.manifest.days()).union(self.hot.days()))
+
+    def rows_for_day(self, day):
+        if day not in self.manifest:
+            return self.hot.rows_for_day(day)
+        return self._load_segment(day[:7]).rows_for_day(day) + self.hot.rows_for_day(day)
+
+    def _days_between(self, date_from, date_to, exclude_day):
+        return [day for day in self.days()
+                if (date_from is None or day >= date_from)
+                and (date_to is None or day <= date_to)
+                and day != exclude_day]
+
+    def count(self, date_from=None, date_to=None, exclude_day=None):
+        """Returns how many rows ``select`` would yield, from the manifest and hot segment alone."""
+        return sum(self.manifest.day_rows(day) + len(self.hot.rows_for_day(day))
+                   for day in self._days_between(date_from, date_to, exclude_day))
+
+    def select(self, date_from=None, date_to=None, exclude_day=None, reverse=False):
+        """Lazily yields rows dated from ``date_from`` to ``date_to``, like ``SalesLedger.select``."""
+        days = self._days_between(date_from, date_to, exclude_day)
+        if reverse:
+            return (row for day in reversed(days) for row in reversed(self.rows_for_day(day)))
+        return (row for day in days for row in self.rows_for_day(day))
+
+
+class BillKeys:
+    """Idempotency keys of bills submitted by offline tills, mapped to the bills they created.
+
+    Keys are written before their bills' lines, so a key can name a bill that
+    never reached the ledger; a key recorded again replaces its earlier row.
+    ``last_bill_id`` is the highest bill id any key was given.
+    """
+
+    def __init__(self, rows=()):
+        self._bills = {}  # key -> (bill id, the bill's 'YYYY-MM-DD' date or None)
+        self.last_bill_id = 0
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self._bills)
+
+    def get(self, key):
+        """Returns (bill id, date of the bill) for ``key``, or None; keys written without a date have None."""
+        return self._bills.get(key)
+
+    def extend(self, rows):
+        """Records {'key': ..., 'bill_id': ..., 'date': ...} rows; the last bill for a key wins."""
+        for row in rows:
+            self._bills[row['key']] = (row['bill_id'], row.get('date') or None)
+            self.last_bill_id = max(self.last_bill_id, row['bill_id'])
@@ -0,0 +1,214 @@
+# search.py
+"""Ranked substring search over medicine names and manufacturers."""
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from operator import add
+
+# Queries whose ranked results are kept until the next change to a name or manufacturer
+CACHED_QUERIES = 256
+
+# Joins the names (and the manufacturers) into one searchable string; never part of a query
+_SEPARATOR = '\0'
+
+
+def normalize(text):
+    """Lower-cases and trims text the same way for indexing and querying."""
+    return (text or '').strip().lower()
+
+
+class _SortedDocs:
+    """An immutable snapshot of the indexed items, sorted by (name, id).
+
+    Names starting with a query are one run of the sorted list, found by
+    bisection. Every other match is found with ``str.find`` over all names
+    (or all manufacturers) joined in the same order, so each rank comes out
+    already sorted and the search stops as soon as it has enough rows.
+    """
+
+    def __init__(self, docs, names, ids, manufacturers, generation):
+        self.docs = docs  # id -> (name, manufacturer) as of this snapshot
+        self.names = names
+        self.ids = ids
+        self.manufacturers = manufacturers
+        self.generation = generation
+        self.name_text = _SEPARATOR.join(names)
+        self.name_starts = self._starts(names)
+        self.manufacturer_text = _SEPARATOR.join(manufacturers)
+        self.manufacturer_starts = self._starts(manufacturers)
+
+    @classmethod
+    def build(cls, docs, generation):
+        """Sorts ``docs`` ({id: (name, manufacturer)}) from scratch."""
+        entries = sorted((name, item_id, manufacturer) for item_id, (name, manufacturer) in docs.items())
+        return cls(docs, [entry[0] for entry in entries], [entry[1] for entry in entries],
+                   [entry[2] for entry in entries], generation)
+
+    def changed(self, docs, item_ids, generation):
+        """Returns a snapshot of ``docs`` built from this one, where only ``item_ids`` changed."""
+        names, ids, manufacturers = list(self.names), list(self.ids), list(self.manufacturers)
+        for item_id in item_ids:
+            old = self.docs.get(item_id)
+            if old is not None:
+                position = self._position(names, ids, old[0], item_id)
+                del names[position], ids[position], manufacturers[position]
+            new = docs.get(item_id)
+            if new is not None:
+                position = self._position(names, ids, new[0], item_id)
+                names.insert(position, new[0])
+                ids.insert(position, item_id)
+                manufacturers.insert(position, new[1])
+        return _SortedDocs(docs, names, ids, manufacturers, generation)
+
+    @staticmethod
+    def _position(names, ids, name, item_id):
+        # Where (name, item_id) is, or goes, in the sorted lists
+        position = bisect_left(names, name)
+        while position < len(names) and names[position] == name and ids[position] < item_id:
+            position += 1
+        return position
+
+    @staticmethod
+    def _starts(values):
+        # Each value starts after the ones before it and their separators
+        return list(map(add, accumulate(map(len, values), initial=0), range(len(values))))
+
+    def _containing(self, text, starts, needle):
+        """Yields, in sorted order, the position of every item whose text contains ``needle``."""
+        last = len(starts) - 1
+        found = text.find(needle)
+        while found != -1:
+            doc = bisect_right(starts, found) - 1
+            yield doc
+            if doc == last:
+                return
+            found = text.find(needle, starts[doc + 1])
+
+    def _two_ranks(self, text, starts, query, room, skip, first):
+        """Returns up to ``room`` positions of items containing ``query``: those ``first`` accepts, then the rest.
+
+        Items ``skip`` accepts were already ranked higher.
+        """
+        better, worse = [], []
+        for doc in self._containing(text, starts, query):
+            if skip(doc):
+                continue
+            if first(doc):
+                better.append(doc)
+                if len(better) == room:
+                    break
+            elif len(worse) < room:
+                worse.append(doc)
+        return better + worse[:room - len(better)]
+
+    def search(self, query, limit):
+        names, manufacturers = self.names, self.manufacturers
+        # Exact names, then name prefixes: one run of the sorted names
+        found = []
+        position = bisect_left(names, query)
+        while position < len(names) and len(found) < limit and names[position].startswith(query):
+            found.append(position)
+            position += 1
+        word = ' ' + query
+        if len(found) < limit:
+            # Word prefixes, then other substrings of the names
+            found += self._two_ranks(self.name_text, self.name_starts, query, limit - len(found),
+                                     lambda doc: names[doc].startswith(query), lambda doc: word in names[doc])
+        if len(found) < limit:
+            # Manufacturer prefixes, then other manufacturer matches, of items the name did not match
+            found += self._two_ranks(self.manufacturer_text, self.manufacturer_starts, query, limit - len(found),
+                                     lambda doc: query in names[doc],
+                                     lambda doc: manufacturers[doc].startswith(query))
+        return [self.ids[doc] for doc in found]
+
+
+# Up to this many changed items, a new snapshot is patched from the previous one rather than sorted again
+INCREMENTAL_CHANGES = 1000
+
+
+class SearchIndex:
+    """Finds items whose name or manufacturer contains a query, best matches first.
+
+    The sorted snapshot the search runs on is built on the first search
+    after a name or manufacturer changes, outside the lock that ``add`` and
+    ``update`` take, so writers never wait for it. Ranked results are cached
+    per query until the next such change, so a repeated keystroke costs a
+    dictionary lookup.
+    """
+
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()        # guards _docs, _changed_ids, _generation and _results
+        self._build_lock = threading.Lock()  # one snapshot build at a time
+        self._docs = {}  # id -> (normalized name, normalized manufacturer)
+        self._changed_ids = set()  # ids added or re-indexed since the snapshot was taken
+        self._generation = 0
+        self._sorted = None
+        self._results = OrderedDict()  # query -> (ranked ids, whether that is every match)
+        for row in rows:
+            self._add(row)
+
+    def add(self, row):
+        """Indexes a new row."""
+        with self._lock:
+            self._add(row)
+            self._changed(row.get('id'))
+
+    def update(self, old, new):
+        """Re-indexes a row whose name or manufacturer may have changed."""
+        if (old.get('name'), old.get('Manufacturer')) == (new.get('name'), new.get('Manufacturer')):
+            return
+        with self._lock:
+            self._docs.pop(old.get('id'), None)
+            self._add(new)
+            self._changed(old.get('id'), new.get('id'))
+
+    def search(self, query, limit):
+        """Returns up to ``limit`` ids of items whose name or manufacturer contains ``query``, best first.
+
+        Name matches rank before manufacturer matches; within those, exact
+        names, then name prefixes, then word prefixes, then other substrings,
+        each in name order.
+        """
+        query = normalize(query)
+        if not query or limit <= 0 or _SEPARATOR in query:
+            return []
+        with self._lock:
+            cached = self._results.get(query)
+            if cached is not None and (cached[1] or len(cached[0]) >= limit):
+                self._results.move_to_end(query)
+                return cached[0][:limit]
+        docs = self._sorted_docs()
+        ids = docs.search(query, limit)
+        with self._lock:
+            if docs.generation == self._generation:
+                self._results[query] = (ids, len(ids) < limit)
+                self._results.move_to_end(query)
+                if len(self._results) > CACHED_QUERIES:
+                    self._results.popitem(last=False)
+        return ids
+
+    def _sorted_docs(self):
+        docs = self._sorted
+        if docs is not None and docs.generation == self._generation:
+            return docs
+        with self._build_lock:
+            docs = self._sorted
+            if docs is None or docs.generation != self._generation:
+                with self._lock:
+                    current, generation = dict(self._docs), self._generation
+                    changed, self._changed_ids = self._changed_ids, set()
+                if docs is None or len(changed) > INCREMENTAL_CHANGES:
+                    docs = _SortedDocs.build(current, generation)
+                else:
+                    docs = docs.changed(current, changed, generation)
+                self._sorted = docs
+            return docs
+
+    def _changed(self, *item_ids):
+        self._changed_ids.update(item_ids)
+        self._generation += 1
+        self._results.clear()
+
+    def _add(self, row):
+        self._docs[row.get('id')] = (normalize(row.get('name')), normalize(row.get('Manufacturer')))
@@ -0,0 +1,186 @@
+# snapshot.py
+"""Binary column snapshots of CSV files, for loading them without parsing any text.
+
+A snapshot sits next to its CSV file (``<file>.snap``) and records the CSV's
+version (mtime, size, inode) when it was taken; the CSV stays the source of
+truth and a snapshot whose version no longer matches is ignored. Columns are
+stored as native arrays: integers as int64, amounts with at most two decimals
+as int64 hundredths, ISO dates as int32 day ordinals, and other text as an
+index into a table of the column's distinct values, so rows loaded from a
+snapshot share one string object per distinct name or date.
+
+Every row is still decoded into a dict, because every caller relies on
+that, so a load reads the whole snapshot at once rather than mapping it.
+"""
+import gc
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from datetime import date
+from itertools import repeat
+from operator import truediv
+
+from datastore import to_int, to_float
+from metrics import BYTES_WRITTEN, STORAGE_ERRORS
+
+MAGIC = b'PMSNAP1\n'
+_HEADER_LENGTH = struct.Struct('<I')
+
+# Column kinds: array typecode and how values are stored
+INTEGER, CENTS, FLOAT, DATE, TEXT = 'q', 'c', 'd', 'D', 's'
+_TYPECODES = {INTEGER: 'q', CENTS: 'q', FLOAT: 'd', DATE: 'i', TEXT: 'i'}
+
+
+def snapshot_path(filename):
+    return filename + '.snap'
+
+
+def _is_cents(value):
+    return abs(value) < 2 ** 53 / 100 and round(value * 100) / 100 == value
+
+
+def _is_date(value):
+    try:
+        return value == '' or date.fromisoformat(value).isoformat() == value
+    except (TypeError, ValueError):
+        return False
+
+
+def _encode(values, convert):
+    """Returns (kind, array, distinct values or None) for one column."""
+    if convert is to_int:
+        return INTEGER, array('q', values), None
+    if convert is to_float:
+        if all(_is_cents(value) for value in values):
+            return CENTS, array('q', [round(value * 100) for value in values]), None
+        return FLOAT, array('d', values), None
+    values = ['' if value is None else str(value) for value in values]
+    if all(_is_date(value) for value in values):
+        return DATE, array('i', [date.fromisoformat(value).toordinal() if value else 0 for value in values]), None
+    table = {}
+    indexes = array('i', [table.setdefault(value, len(table)) for value in values])
+    return TEXT, indexes, list(table)
+
+
+def _decode(kind, column, table):
+    values = column.tolist()
+    if kind == CENTS:
+        return list(map(truediv, values, repeat(100)))
+    if kind == DATE:
+        dates = {ordinal: date.fromordinal(ordinal).isoformat() if ordinal else '' for ordinal in set(values)}
+        return list(map(dates.__getitem__, values))
+    if kind == TEXT:
+        return list(map(table.__getitem__, values))
+    return values
+
+
+def _build_rows(names, columns):
+    """Returns a row dict per position of ``columns``, keyed by ``names``.
+
+    ``map`` keeps the dict and zip calls out of a Python-level loop.
+    """
+    return list(map(dict, map(zip, repeat(names), zip(*columns))))
+
+
+def write_snapshot(filename, rows, fieldnames, types, version):
+    """Writes the snapshot of ``rows``, read from ``filename`` at ``version``. Returns False on failure."""
+    if version is None:
+        return False
+    columns, tables, blobs = [], {}, []
+    offset = 0
+    for field in fieldnames:
+        kind, values, table = _encode([row.get(field) for row in rows], types.get(field))
+        data = values.tobytes()
+        columns.append({'name': field, 'kind': kind, 'offset': offset, 'length': len(data)})
+        if table is not None:
+            tables[field] = table
+        blobs.append(data)
+        # Keep every column 8-byte aligned so it can be cast in place
+        padding = -len(data) % 8
+        blobs.append(b'\0' * padding)
+        offset += len(data) + padding
+    header = json.dumps({'version': list(version), 'byteorder': sys.byteorder, 'rows': len(rows),
+                         'columns': columns, 'tables': tables}).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + _HEADER_LENGTH.size + len(header)) % 8)
+
+    path = snapshot_path(filename)
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    except OSError as e:
+        STORAGE_ERRORS.inc(operation='snapshot')
+        print(f"Error writing snapshot {path}: {e}")
+        return False
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(MAGIC)
+            file.write(_HEADER_LENGTH.pack(len(header)))
+            file.write(header)
+            for blob in blobs:
+                file.write(blob)
+            size = file.tell()
+        os.replace(temp_path, path)
+    except OSError as e:
+        STORAGE_ERRORS.inc(operation='snapshot')
+        print(f"Error writing snapshot {path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+    BYTES_WRITTEN.inc(size)
+    return True
+
+
+def read_snapshot(filename, version):
+    """Returns the rows of ``filename`` from its snapshot, or None if it is missing, stale or unreadable."""
+    if version is None:
+        return None
+    try:
+        with open(snapshot_path(filename), 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    try:
+        return _read(memoryview(data), version)
+    except (ValueError, KeyError, TypeError, BufferError, struct.error):
+        # A missing, empty, truncated or foreign file; the CSV is read instead
+        return None
+
+
+def _read(view, version):
+    try:
+        if view[:len(MAGIC)] != MAGIC:
+            return None
+        start = len(MAGIC) + _HEADER_LENGTH.size
+        (length,) = _HEADER_LENGTH.unpack(view[len(MAGIC):start])
+        header = json.loads(bytes(view[start:start + length]))
+        if tuple(header['version']) != tuple(version) or header['byteorder'] != sys.byteorder:
+            return None
+        base = start + length
+        values = []
+        for column in header['columns']:
+            begin = base + column['offset']
+            data = view[begin:begin + column['length']].cast(_TYPECODES[column['kind']])
+            try:
+                if len(data) != header['rows']:
+                    return None
+                values.append(_decode(column['kind'], data, header['tables'].get(column['name'])))
+            finally:
+                data.release()
+        if not values:
+            return []
+        names = [column['name'] for column in header['columns']]
+        # Hundreds of thousands of new dicts would otherwise trigger many pointless GC passes
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return _build_rows(names, values)
+        finally:
+            if collecting:
+                gc.enable()
+    finally:
+        view.release()
@@ -127,6 +127,16 @@ document.addEventListener('DOMContentLoaded', () => {
     // ===================================
     //  DASHBOARD PAGE ('/') LOGIC
     // ===================================
+    // --- LIVE UPDATES ---
+    // Bills and stock changes made on other tills arrive as Server-Sent Events
+    const listenForStoreEvents = (handlers) => {
+        if (!window.EventSource) return;
+        const source = new EventSource('/api/events');
+        Object.entries(handlers).forEach(([eventName, handler]) => {
+            source.addEventListener(eventName, (event) => handler(JSON.parse(event.data)));
+        });
+    };
+
     if (currentPath === '/') {
         // Handle "View Expiring Soon" modal
         const expiringModal = document.getElementById('expiring-soon-modal');
@@ -169,9 +179,13 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         }
     
-        let fullInventory = [];
-        let displayedItemsCount = 0;
+        // Full inventory is paged from the server, itemsPerLoad rows at a time
+        let nextInventoryOffset = 0;
         const itemsPerLoad = 5;
+        // Search results are paged the same way while the search box is in use
+        let searchQuery = '';
+        let nextSearchOffset = null;
+        const searchResultsPerLoad = 50;
 
         // Element selectors
         const searchInput = document.getElementById('search-input');
@@ -180,47 +194,27 @@ document.addEventListener('DOMContentLoaded', () => {
         const inventoryCard = document.getElementById('total-inventory-card');
         const loadMoreBtn = document.getElementById('load-more-btn');
 
-        const fetchKpiData = async () => {
+        // All dashboard widgets come from one request; the browser revalidates
+        // its copy with the ETag, so an unchanged dashboard costs a 304
+        const fetchDashboard = async () => {
             try {
-                const [invRes, lowStockRes, salesRes] = await Promise.all([
-                    fetch('/api/inventory/summary'),
-                    fetch('/api/inventory/low_stock'),
-                    fetch('/api/sales/summary')
-                ]);
-                const invSummary = await invRes.json();
-                const lowStock = await lowStockRes.json();
-                const salesSummary = await salesRes.json();
-
-                document.getElementById('total-inventory-value').textContent = invSummary.total_quantity || 0;
-                document.getElementById('low-stock-value').textContent = lowStock.low_stock_count || 0;
-                document.getElementById('todays-sales-value').textContent = `₹${(salesSummary.todays_sales || 0).toFixed(2)}`;
-            } catch (error) {
-                console.error('Failed to load KPI data:', error);
-            }
-        };
-
-        const fetchStatusDistribution = async () => {
-            try {
-                const response = await fetch('/api/inventory/status_distribution');
+                const response = await fetch('/api/dashboard');
                 const data = await response.json();
-                document.getElementById('in-stock-percent').textContent = `${data.in_stock_percent || 0}%`;
-                document.getElementById('low-stock-percent').textContent = `${data.low_stock_percent || 0}%`;
-                document.getElementById('expiring-soon-percent').textContent = `${data.expiring_soon_percent || 0}%`;
-                document.getElementById('out-of-stock-percent').textContent = `${data.out_of_stock_percent || 0}%`;
-            } catch (error) {
-                console.error('Failed to load status distribution:', error);
-            }
-        };
 
-        const fetchExpiringSoon = async () => {
-            try {
-                const response = await fetch('/api/inventory/expiring_soon');
-                const expiringSoon = await response.json();
+                document.getElementById('total-inventory-value').textContent = data.total_quantity || 0;
+                document.getElementById('low-stock-value').textContent = data.low_stock_count || 0;
+                document.getElementById('todays-sales-value').textContent = `₹${(data.todays_sales || 0).toFixed(2)}`;
+
+                const distribution = data.status_distribution || {};
+                document.getElementById('in-stock-percent').textContent = `${distribution.in_stock_percent || 0}%`;
+                document.getElementById('low-stock-percent').textContent = `${distribution.low_stock_percent || 0}%`;
+                document.getElementById('expiring-soon-percent').textContent = `${distribution.expiring_soon_percent || 0}%`;
+                document.getElementById('out-of-stock-percent').textContent = `${distribution.out_of_stock_percent || 0}%`;
+
                 const tableBody = document.getElementById('inventory-table-body');
                 if (!tableBody) return;
-
                 tableBody.innerHTML = '';
-                expiringSoon.slice(0, 5).forEach(item => {
+                (data.expiring_soon || []).forEach(item => {
                     const row = tableBody.insertRow();
                     row.innerHTML = `
                         <td>${item.name}</td>
@@ -231,17 +225,25 @@ document.addEventListener('DOMContentLoaded', () => {
                     `;
                 });
             } catch (error) {
-                console.error('Failed to load expiring soon data:', error);
+                console.error('Failed to load dashboard data:', error);
             }
         };
 
-        const renderInventorySlice = () => {
+        const renderInventorySlice = async () => {
             const tableBody = document.getElementById('full-inventory-table-body');
-            if (!tableBody) return;
-            const itemsToRender = fullInventory.slice(displayedItemsCount, displayedItemsCount + itemsPerLoad);
+            if (!tableBody || nextInventoryOffset === null) return;
+            let page;
+            try {
+                const response = await fetch(`/api/inventory/all?limit=${itemsPerLoad}&offset=${nextInventoryOffset}`);
+                page = await response.json();
+            } catch (error) {
+                console.error('Failed to load inventory page:', error);
+                return;
+            }
 
-            itemsToRender.forEach(item => {
+            page.items.forEach(item => {
                 const row = tableBody.insertRow();
+                row.dataset.id = item.id;
                 row.innerHTML = `
                     <td>${item.id}</td>
                     <td>${item.name}</td>
@@ -252,32 +254,43 @@ document.addEventListener('DOMContentLoaded', () => {
                 `;
             });
 
-            displayedItemsCount += itemsToRender.length;
+            nextInventoryOffset = page.next_offset;
 
             if (loadMoreBtn) {
-                loadMoreBtn.style.display = displayedItemsCount >= fullInventory.length ? 'none' : 'block';
+                loadMoreBtn.style.display = nextInventoryOffset === null ? 'none' : 'block';
             }
         };
 
         const fetchFullInventory = async () => {
+            const tableBody = document.getElementById('full-inventory-table-body');
+            if(tableBody) tableBody.innerHTML = '';
+            searchQuery = '';
+            nextInventoryOffset = 0;
+            await renderInventorySlice();
+        };
+
+        // Appends the next page of matches for searchQuery; one extra row is
+        // asked for to tell whether there are more
+        const renderSearchSlice = async () => {
+            const tableBody = document.getElementById('full-inventory-table-body');
+            if (!tableBody || nextSearchOffset === null) return;
+            const query = searchQuery;
+            const offset = nextSearchOffset;
+            let matches;
             try {
-                const response = await fetch('/api/inventory/all');
-                fullInventory = await response.json();
-                const tableBody = document.getElementById('full-inventory-table-body');
-                if(tableBody) tableBody.innerHTML = '';
-                displayedItemsCount = 0;
-                renderInventorySlice();
+                const response = await fetch(`/api/inventory/search?q=${encodeURIComponent(query)}&limit=${searchResultsPerLoad + 1}&offset=${offset}`);
+                matches = await response.json();
             } catch (error) {
-                console.error('Failed to load full inventory:', error);
+                console.error('Search failed:', error);
+                return;
             }
-        };
+            // A newer search has started meanwhile
+            if (query !== searchQuery) return;
+            if (offset === 0) tableBody.innerHTML = '';
 
-        const renderFilteredInventory = (inventory) => {
-            const tableBody = document.getElementById('full-inventory-table-body');
-            if(!tableBody) return;
-            tableBody.innerHTML = '';
-            inventory.forEach(item => {
+            matches.slice(0, searchResultsPerLoad).forEach(item => {
                 const row = tableBody.insertRow();
+                row.dataset.id = item.id;
                 row.innerHTML = `
                     <td>${item.id}</td>
                     <td>${item.name}</td>
@@ -287,7 +300,12 @@ document.addEventListener('DOMContentLoaded', () => {
                     <td><span class="status-cell ${item.status.className}">${item.status.text}</span></td>
                 `;
             });
-            if(loadMoreBtn) loadMoreBtn.style.display = 'none';
+
+            nextSearchOffset = matches.length > searchResultsPerLoad ? offset + searchResultsPerLoad : null;
+
+            if (loadMoreBtn) {
+                loadMoreBtn.style.display = nextSearchOffset === null ? 'none' : 'block';
+            }
         };
 
         if (searchInput) {
@@ -301,25 +319,19 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
                 const query = event.target.value.toLowerCase();
                 if (query.length > 2) {
-                    try {
-                        const response = await fetch(`/api/inventory/search?q=${query}`);
-                        const filteredInventory = await response.json();
-                        renderFilteredInventory(filteredInventory);
-                    } catch (error) {
-                        console.error('Search failed:', error);
-                    }
+                    if (query === searchQuery) return;
+                    searchQuery = query;
+                    nextSearchOffset = 0;
+                    await renderSearchSlice();
                 } else if (query.length === 0) {
-                    // Reset to full inventory if search is cleared
-                    const tableBody = document.getElementById('full-inventory-table-body');
-                    if(tableBody) tableBody.innerHTML = '';
-                    displayedItemsCount = 0;
-                    renderInventorySlice(); // Re-render the initial slice
+                    // Reset to the first page of the full inventory if search is cleared
+                    fetchFullInventory();
                 }
             });
         }
         
         if (loadMoreBtn) {
-            loadMoreBtn.addEventListener('click', renderInventorySlice);
+            loadMoreBtn.addEventListener('click', () => (searchQuery ? renderSearchSlice() : renderInventorySlice()));
         }
 
         if (lowStockCard) {
@@ -335,10 +347,41 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         }
         
+        // Shows a changed medicine's new quantity and status if its row is on screen
+        const updateInventoryRow = (item) => {
+            const row = document.querySelector(`#full-inventory-table-body tr[data-id="${item.id}"]`);
+            if (!row) return;
+            row.cells[4].textContent = item.quantity;
+            row.cells[5].innerHTML = `<span class="status-cell ${item.status.className}">${item.status.text}</span>`;
+        };
+
+        // Totals are patched right away; status percentages and the expiring
+        // list are refetched once things go quiet
+        let dashboardRefreshTimeout;
+        const applyStoreChange = (change) => {
+            const totalValue = document.getElementById('total-inventory-value');
+            totalValue.textContent = (parseInt(totalValue.textContent, 10) || 0) + change.quantity_delta;
+            change.items.forEach(updateInventoryRow);
+            clearTimeout(dashboardRefreshTimeout);
+            dashboardRefreshTimeout = setTimeout(fetchDashboard, 2000);
+        };
+
+        listenForStoreEvents({
+            inventory: applyStoreChange,
+            bill: (bill) => {
+                const salesValue = document.getElementById('todays-sales-value');
+                const todaysSales = parseFloat(salesValue.textContent.replace('₹', '')) || 0;
+                salesValue.textContent = `₹${(todaysSales + bill.revenue).toFixed(2)}`;
+                applyStoreChange(bill);
+            },
+            resync: () => {
+                fetchDashboard();
+                fetchFullInventory();
+            }
+        });
+
         // Initial data fetches
-        fetchKpiData();
-        fetchStatusDistribution();
-        fetchExpiringSoon();
+        fetchDashboard();
         fetchFullInventory();
     }
 
@@ -366,25 +409,31 @@ document.addEventListener('DOMContentLoaded', () => {
     //  SALES REPORT PAGE LOGIC
     // ===================================
     if (currentPath === '/sales') {
-        let currentSalesData = []; // Holds the data for searching
+        // Sales rows are filtered and paged on the server, newest first
+        const pageSize = 50;
+        let currentFilter = 'today';
+        let nextSalesOffset = 0;
+        let salesSearchTimeout;
         const searchInput = document.getElementById('sales-search-input');
         const tableBody = document.getElementById('sales-table-body');
+        const loadMoreSalesBtn = document.getElementById('sales-load-more-btn');
         const pageTitle = document.getElementById('page-title');
         const filterTabs = document.querySelectorAll('.filter-tab');
+        // KPI figures for the current tab, kept so live bills can be added on
+        let kpiTotals = { total_revenue: 0, total_transactions: 0, total_items_sold: 0 };
 
-        // Re-usable function to render the table
-        const renderSalesTable = (sales) => {
+        const renderKpis = () => {
+            document.getElementById('total-revenue').textContent = `₹${(kpiTotals.total_revenue || 0).toFixed(2)}`;
+            document.getElementById('total-transactions').textContent = kpiTotals.total_transactions || 0;
+            document.getElementById('total-items-sold').textContent = kpiTotals.total_items_sold || 0;
+        };
+
+        // Appends a page of rows to the table (clearing it first when reset)
+        const renderSalesRows = (sales, reset) => {
             if (!tableBody) return;
-            tableBody.innerHTML = '';
-            
-            // Sort by Bill ID (newest first)
-            sales.sort((a, b) => {
-                const idA = parseInt(a.bill_id, 10);
-                const idB = parseInt(b.bill_id, 10);
-                return idB - idA;
-            });
+            if (reset) tableBody.innerHTML = '';
 
-            if (sales.length === 0) {
+            if (reset && sales.length === 0) {
                 tableBody.innerHTML = '<tr><td colspan="6">No sales data found for this period.</td></tr>';
             } else {
                 sales.forEach(sale => {
@@ -401,8 +450,28 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         };
 
+        // Fetches the next page for the current tab and search box (or the first page when reset)
+        const fetchSalesPage = async (reset) => {
+            if (reset) nextSalesOffset = 0;
+            if (nextSalesOffset === null) return;
+            const params = new URLSearchParams({ limit: pageSize, offset: nextSalesOffset, order: 'desc' });
+            const query = searchInput ? searchInput.value.trim() : '';
+            if (query) params.set('q', query);
+
+            try {
+                const dataResponse = await fetch(`/api/sales/${currentFilter}?${params}`);
+                const page = await dataResponse.json();
+                renderSalesRows(page.items, reset);
+                nextSalesOffset = page.next_offset;
+                if (loadMoreSalesBtn) loadMoreSalesBtn.style.display = nextSalesOffset === null ? 'none' : 'block';
+            } catch (error) {
+                console.error(`Failed to load sales data for ${currentFilter}:`, error);
+            }
+        };
+
         // Main function to load all data based on filter
         const loadSalesData = async (filter) => {
+            currentFilter = filter;
             // 1. Set active tab
             filterTabs.forEach(tab => {
                 tab.classList.toggle('active', tab.dataset.filter === filter);
@@ -432,30 +501,18 @@ document.addEventListener('DOMContentLoaded', () => {
                 if(kpiLabels.items) kpiLabels.items.textContent = "Total Items Sold";
             }
 
-            // 3. Define endpoints based on filter
-            let kpiEndpoint = `/api/sales/kpi_summary/${filter}`;
-            let dataEndpoint = `/api/sales/${filter}`;
-
-            // 4. Fetch and update KPIs
+            // 3. Fetch and update KPIs
             try {
-                const kpiResponse = await fetch(kpiEndpoint);
-                const kpiData = await kpiResponse.json();
-                document.getElementById('total-revenue').textContent = `₹${(kpiData.total_revenue || 0).toFixed(2)}`;
-                document.getElementById('total-transactions').textContent = kpiData.total_transactions || 0;
-                document.getElementById('total-items-sold').textContent = kpiData.total_items_sold || 0;
+                const kpiResponse = await fetch(`/api/sales/kpi_summary/${filter}`);
+                kpiTotals = await kpiResponse.json();
+                renderKpis();
             } catch (error) {
                 console.error(`Failed to load KPIs for ${filter}:`, error);
             }
 
-            // 5. Fetch, store, and render table data
-            try {
-                const dataResponse = await fetch(dataEndpoint);
-                currentSalesData = await dataResponse.json(); // Store for searching
-                renderSalesTable(currentSalesData); // Render full data
-                if (searchInput) searchInput.value = ''; // Clear search on tab change
-            } catch (error) {
-                console.error(`Failed to load sales data for ${filter}:`, error);
-            }
+            // 4. Fetch the first page of table data
+            if (searchInput) searchInput.value = ''; // Clear search on tab change
+            await fetchSalesPage(true);
         };
 
         // Add click handlers to filter tabs
@@ -465,19 +522,46 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         });
 
-        // Search functionality
+        // Search is done by the server; wait for the user to pause typing
         if (searchInput) {
             searchInput.addEventListener('keyup', () => {
-                const query = searchInput.value.toLowerCase().trim();
-                const filteredData = currentSalesData.filter(sale => {
-                    return sale.product_name.toLowerCase().includes(query) ||
-                           sale.bill_id.toString().includes(query) ||
-                           sale.date.includes(query);
-                });
-                renderSalesTable(filteredData);
+                clearTimeout(salesSearchTimeout);
+                salesSearchTimeout = setTimeout(() => fetchSalesPage(true), 300);
             });
         }
 
+        if (loadMoreSalesBtn) {
+            loadMoreSalesBtn.addEventListener('click', () => fetchSalesPage(false));
+        }
+
+        // Every tab covers today, so a new bill always counts and, unless a
+        // search is active, goes on top of the newest-first table
+        listenForStoreEvents({
+            bill: (bill) => {
+                kpiTotals.total_revenue = (kpiTotals.total_revenue || 0) + bill.revenue;
+                kpiTotals.total_transactions = (kpiTotals.total_transactions || 0) + 1;
+                kpiTotals.total_items_sold = (kpiTotals.total_items_sold || 0) + bill.items_sold;
+                renderKpis();
+
+                if (!tableBody || (searchInput && searchInput.value.trim())) return;
+                if (tableBody.rows.length === 1 && tableBody.rows[0].cells.length === 1) tableBody.innerHTML = '';
+                bill.lines.forEach(sale => {
+                    const row = tableBody.insertRow(0);
+                    row.innerHTML = `
+                        <td>#${sale.bill_id}</td>
+                        <td>${sale.date} ${sale.time}</td>
+                        <td>${sale.product_name}</td>
+                        <td>${sale.quantity}</td>
+                        <td>₹${parseFloat(sale.unit_price || 0).toFixed(2)}</td>
+                        <td>₹${parseFloat(sale.total_amount || 0).toFixed(2)}</td>
+                    `;
+                });
+                // The rows already shown moved down by the new lines
+                if (nextSalesOffset !== null) nextSalesOffset += bill.lines.length;
+            },
+            resync: () => loadSalesData(currentFilter)
+        });
+
         // Initial load (default to 'today')
         loadSalesData('today');
     }
@@ -0,0 +1,162 @@
+# status.py
+"""Stock status classification ("In Stock", "Low Stock", ...) for whole inventories at once."""
+import threading
+from array import array
+from bisect import bisect_right, insort
+from datetime import date, datetime
+
+from datastore import to_int
+from metrics import phase
+
+UNKNOWN, OUT_OF_STOCK, EXPIRING_SOON, LOW_STOCK, IN_STOCK = range(5)
+
+# Indexed by the codes above; shared, so callers must not modify them
+STATUSES = (
+    {'text': 'Unknown', 'className': ''},
+    {'text': 'Out of Stock', 'className': 'status-out-of-stock'},
+    {'text': 'Expiring Soon', 'className': 'status-expiring-soon'},
+    {'text': 'Low Stock', 'className': 'status-low-stock'},
+    {'text': 'In Stock', 'className': 'status-in-stock'},
+)
+
+# Ordinal stored for a missing or malformed expiry date
+NO_EXPIRY = 0
+
+
+def expiry_ordinal(value):
+    """Returns the proleptic ordinal of a 'YYYY-MM-DD' date, or NO_EXPIRY if it does not parse."""
+    try:
+        if len(value) == 10:
+            # Much faster than strptime, and identical for zero-padded dates
+            return date.fromisoformat(value).toordinal()
+        return datetime.strptime(value, '%Y-%m-%d').toordinal()
+    except (TypeError, ValueError):
+        return NO_EXPIRY
+
+
+class StatusRules:
+    """Thresholds for the "Expiring Soon" and "Low Stock" statuses."""
+
+    __slots__ = ('expiring_days', 'low_stock_quantity')
+
+    def __init__(self, expiring_days=90, low_stock_quantity=20):
+        self.expiring_days = expiring_days
+        self.low_stock_quantity = low_stock_quantity
+
+    def key(self):
+        return (self.expiring_days, self.low_stock_quantity)
+
+    def is_expiring(self, ordinal, today):
+        """True if an expiry ordinal falls within the window after ``today``.
+
+        Matches the original datetime comparison: an item expiring today (at
+        midnight, so before "now") is not expiring soon, one expiring exactly
+        ``expiring_days`` from now is.
+        """
+        return today < ordinal <= today + self.expiring_days
+
+    def classify(self, ordinal, quantity, today):
+        """Returns the status code for one row's expiry ordinal and quantity."""
+        if ordinal == NO_EXPIRY:
+            return UNKNOWN
+        if quantity <= 0:
+            return OUT_OF_STOCK
+        if self.is_expiring(ordinal, today):
+            return EXPIRING_SOON
+        if quantity <= self.low_stock_quantity:
+            return LOW_STOCK
+        return IN_STOCK
+
+    def classify_row(self, row, today):
+        """Returns the status code of a single inventory row."""
+        return self.classify(expiry_ordinal(row.get('expiry_date')), to_int(row.get('quantity')), today)
+
+
+class InventoryColumns:
+    """Expiry ordinals and quantities of an inventory's rows, one array slot per row.
+
+    Expiry dates are parsed once when the columns are built or a row changes,
+    and a (ordinal, position) list kept sorted by expiry turns "expiring
+    within N days" into two bisections. ``classify`` evaluates every row in
+    one pass over the arrays and keeps the result until a row changes, the
+    date rolls over or the thresholds change.
+    """
+
+    def __init__(self, rows=()):
+        with phase('classification'):
+            self._build(rows)
+
+    def _build(self, rows):
+        self.expiry = array('l')
+        self.quantity = array('q')
+        self.version = 0
+        self._timeline = []  # (expiry ordinal, position), sorted
+        self._classified = None  # (cache key, codes, counts per code)
+        self._lock = threading.Lock()
+        for position, row in enumerate(rows):
+            ordinal = expiry_ordinal(row.get('expiry_date'))
+            self.expiry.append(ordinal)
+            self.quantity.append(to_int(row.get('quantity')))
+            if ordinal != NO_EXPIRY:
+                self._timeline.append((ordinal, position))
+        self._timeline.sort()
+
+    def __len__(self):
+        return len(self.expiry)
+
+    def append(self, row):
+        """Adds the columns of a new last row."""
+        ordinal = expiry_ordinal(row.get('expiry_date'))
+        position = len(self.expiry)
+        self.expiry.append(ordinal)
+        self.quantity.append(to_int(row.get('quantity')))
+        if ordinal != NO_EXPIRY:
+            insort(self._timeline, (ordinal, position))
+        self.version += 1
+
+    def set(self, position, row):
+        """Replaces the columns of the row at ``position``."""
+        old = self.expiry[position]
+        ordinal = expiry_ordinal(row.get('expiry_date'))
+        if ordinal != old:
+            if old != NO_EXPIRY:
+                index = bisect_right(self._timeline, (old, position)) - 1
+                if index >= 0 and self._timeline[index] == (old, position):
+                    del self._timeline[index]
+            if ordinal != NO_EXPIRY:
+                insort(self._timeline, (ordinal, position))
+            self.expiry[position] = ordinal
+        self.quantity[position] = to_int(row.get('quantity'))
+        self.version += 1
+
+    def classify(self, rules, today):
+        """Returns (codes, counts): a status code per row and the number of rows per code."""
+        key = (rules.key(), today, self.version)
+        classified = self._classified
+        if classified is not None and classified[0] == key:
+            return classified[1], classified[2]
+        with self._lock:
+            classified = self._classified
+            if classified is not None and classified[0] == key:
+                return classified[1], classified[2]
+            soon = today + rules.expiring_days
+            low = rules.low_stock_quantity
+            with phase('classification'):
+                codes = array('b', [
+                    UNKNOWN if ordinal == NO_EXPIRY
+                    else OUT_OF_STOCK if quantity <= 0
+                    else EXPIRING_SOON if today < ordinal <= soon
+                    else LOW_STOCK if quantity <= low
+                    else IN_STOCK
+                    for ordinal, quantity in zip(self.expiry, self.quantity)])
+                counts = [codes.count(code) for code in range(len(STATUSES))]
+            self._classified = (key, codes, counts)
+            return codes, counts
+
+    def expiring(self, rules, today):
+        """Returns the positions of rows expiring within the window after ``today``, soonest first."""
+        timeline = self._timeline
+        start = bisect_right(timeline, (today, float('inf')))
+        end = bisect_right(timeline, (today + rules.expiring_days, float('inf')))
+        return [position for _, position in timeline[start:end]]
+
@@ -0,0 +1,746 @@
+# storage.py
+"""Storage backends for users, inventory and sales.
+
+``CsvBackend`` keeps the original one-file-per-user CSV layout and is the
+default. ``SqliteBackend`` keeps everything in one SQLite database (WAL mode,
+indexed, row-level updates). Both cache parsed data in a shared DataStore and
+expose the same methods, so the app does not care which one is configured.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+from datastore import (DataStore, INVENTORY_FIELDNAMES, SALES_FIELDNAMES, USER_FIELDNAMES,
+                       BILL_KEY_FIELDNAMES, SALES_MANIFEST_FIELDNAMES, INVENTORY_TYPES, SALES_TYPES, BILL_KEY_TYPES,
+                       SALES_MANIFEST_TYPES, file_version, read_csv_rows, write_csv_rows, append_csv_rows,
+                       read_json_file, write_json_file, to_int, to_float)
+from inventory import Inventory
+from sales import SalesLedger, SalesManifest, PartitionedSales, BillKeys
+from locks import UserLocks
+from metrics import ROWS_PARSED
+from snapshot import read_snapshot, write_snapshot
+from users import UserRegistry
+
+
+def next_user_id(users):
+    """Returns the id to give a newly registered user."""
+    return max((int(u['id']) for u in users if str(u.get('id', '')).isdigit()), default=0) + 1
+
+
+@contextmanager
+def transaction(conn):
+    """Runs a block in an IMMEDIATE transaction on an autocommit connection."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+class CsvBackend:
+    """users.csv plus ``<username>_inventory.csv`` and a ``<username>_sales/`` directory per store.
+
+    Sales are split by month: ``YYYY-MM.csv`` segments hold closed days,
+    ``current.csv`` (the hot segment) takes new bills, and ``manifest.csv``
+    lists the per-day totals of every day in the monthly segments. Closed
+    days are rolled out of the hot segment by ``compact_sales``, which runs in
+    the background once a bill for a new day comes in. A store still on a
+    single ``<username>_sales.csv`` is split up the first time it is used.
+
+    With ``snapshots`` on, inventories and monthly segments also get a binary
+    column snapshot (see snapshot.py) that is loaded instead of parsing the
+    CSV while it is current, and rewritten whenever it is not.
+    """
+
+    name = 'csv'
+
+    def __init__(self, data_dir='.', cache=None, snapshots=False):
+        self.data_dir = data_dir
+        self.cache = cache if cache is not None else DataStore()
+        self.snapshots = snapshots
+        self.locks = UserLocks(data_dir)
+        self._compacting = set()
+        self._compacting_guard = threading.Lock()
+
+    def lock(self, name):
+        """Serializes read-modify-write cycles on one store's data."""
+        return self.locks.lock(name)
+
+    def registry_lock(self):
+        """Serializes changes to the user list."""
+        return self.locks.registry()
+
+    def inventory_file(self, username):
+        return os.path.join(self.data_dir, f"{username}_inventory.csv")
+
+    def sales_file(self, username):
+        """The single sales file used before sales were partitioned; only read to migrate it."""
+        return os.path.join(self.data_dir, f"{username}_sales.csv")
+
+    def sales_dir(self, username):
+        return os.path.join(self.data_dir, f"{username}_sales")
+
+    def sales_manifest_file(self, username):
+        return os.path.join(self.sales_dir(username), 'manifest.csv')
+
+    def hot_sales_file(self, username):
+        return os.path.join(self.sales_dir(username), 'current.csv')
+
+    def sales_segment_file(self, username, month):
+        """The segment of a 'YYYY-MM' month; lines without a date go to ``undated.csv``."""
+        return os.path.join(self.sales_dir(username), f"{month or 'undated'}.csv")
+
+    def users_file(self):
+        return os.path.join(self.data_dir, 'users.csv')
+
+    def bill_keys_file(self, username):
+        return os.path.join(self.data_dir, f"{username}_bill_keys.csv")
+
+    def reorder_file(self, username):
+        return os.path.join(self.data_dir, f"{username}_reorder.json")
+
+    def _read_rows(self, path, fieldnames, types):
+        """Reads a CSV file's typed rows, from its snapshot when there is a current one."""
+        if not self.snapshots:
+            return read_csv_rows(path, types)
+        version = file_version(path)
+        rows = read_snapshot(path, version)
+        if rows is not None:
+            ROWS_PARSED.inc(len(rows), source='snapshot')
+            return rows
+        rows = read_csv_rows(path, types)
+        # Only if the file did not change while it was being parsed
+        if version is not None and file_version(path) == version:
+            write_snapshot(path, rows, fieldnames, types, version)
+        return rows
+
+    def _write_rows(self, path, rows, fieldnames, types):
+        """Rewrites a CSV file (and its snapshot, if enabled). Returns False if the CSV write failed."""
+        if not write_csv_rows(path, rows, fieldnames):
+            return False
+        if self.snapshots:
+            write_snapshot(path, rows, fieldnames, types, file_version(path))
+        return True
+
+    # --- Users ---
+
+    def load_users(self):
+        """Returns every user row (string fields, as stored in users.csv)."""
+        return read_csv_rows(self.users_file())
+
+    def load_user_registry(self):
+        """Returns the cached UserRegistry, re-read only when users.csv changes on disk."""
+        path = self.users_file()
+        return self.cache.get(path, file_version(path), lambda: UserRegistry(self.load_users()))
+
+    def create_user(self, username, password_hash):
+        """Registers a user with empty inventory and sales files and returns its id."""
+        path = self.users_file()
+        users = self.load_users()
+        new_id = next_user_id(users)
+        users.append({'id': new_id, 'username': username, 'password_hash': password_hash})
+        if write_csv_rows(path, users, USER_FIELDNAMES):
+            self.cache.put(path, file_version(path), UserRegistry(users))
+        else:
+            self.cache.invalidate(path)
+        # The sales directory is created by the store's first load_sales
+        self.save_inventory(username, Inventory())
+        return new_id
+
+    def update_password_hash(self, user_id, password_hash):
+        """Replaces the stored password hash of a user; call with the registry lock held."""
+        path = self.users_file()
+        users = self.load_users()
+        for user in users:
+            if str(user['id']) == str(user_id):
+                user['password_hash'] = password_hash
+                break
+        else:
+            return
+        if write_csv_rows(path, users, USER_FIELDNAMES):
+            self.cache.put(path, file_version(path), UserRegistry(users))
+        else:
+            self.cache.invalidate(path)
+
+    # --- Inventory ---
+
+    def load_inventory(self, username):
+        """Returns the cached, indexed Inventory of ``username``."""
+        path = self.inventory_file(username)
+        return self.cache.get(path, file_version(path),
+                              lambda: Inventory(self._read_rows(path, INVENTORY_FIELDNAMES, INVENTORY_TYPES)))
+
+    def save_inventory(self, username, inventory):
+        """Rewrites the inventory file and keeps ``inventory`` as the cached copy."""
+        path = self.inventory_file(username)
+        inventory.take_changes()
+        if self._write_rows(path, inventory.rows, INVENTORY_FIELDNAMES, INVENTORY_TYPES):
+            self.cache.put(path, file_version(path), inventory)
+        else:
+            self.cache.invalidate(path)
+
+    # --- Sales ---
+
+    def load_sales(self, username):
+        """Returns the cached PartitionedSales of ``username``."""
+        if file_version(self.sales_manifest_file(username)) is None:
+            with self.lock(username):
+                self._ensure_partitions(username)
+        sales = self._partitioned_sales(username)
+        days = sales.hot.days()
+        if days and days[0] < date.today().isoformat():
+            self.schedule_compaction(username)
+        return sales
+
+    def _partitioned_sales(self, username):
+        manifest = self._load_manifest(username)
+        hot = self._load_hot(username, manifest)
+        return PartitionedSales(manifest, hot, lambda month: self._load_segment(username, month, manifest))
+
+    def _load_manifest(self, username):
+        path = self.sales_manifest_file(username)
+        version = file_version(path)
+        return self.cache.get(path, version,
+                              lambda: SalesManifest(read_csv_rows(path, SALES_MANIFEST_TYPES), version))
+
+    def _hot_version(self, username):
+        return (file_version(self.hot_sales_file(username)), file_version(self.sales_manifest_file(username)))
+
+    def _load_hot(self, username, manifest):
+        """Returns the hot segment's SalesLedger, leaving out lines the manifest says were moved.
+
+        Those are only still there if a compaction stopped between writing
+        the manifest and rewriting the hot segment; the next one drops them.
+        """
+        path = self.hot_sales_file(username)
+        return self.cache.get(path, (file_version(path), manifest.version), lambda: SalesLedger(
+            row for row in read_csv_rows(path, SALES_TYPES) if not manifest.covers(row)))
+
+    def _load_segment(self, username, month, manifest):
+        """Returns a monthly segment's SalesLedger, leaving out lines the manifest does not list.
+
+        Those were written by a compaction that stopped before its manifest
+        was; they are still in the hot segment.
+        """
+        path = self.sales_segment_file(username, month)
+        # Keyed by the manifest the rows are filtered with, not the one on disk now
+        version = (file_version(path), manifest.version)
+
+        def load():
+            rows = self._read_rows(path, SALES_FIELDNAMES, SALES_TYPES)
+            if len(rows) != manifest.month_rows(month):
+                rows = [row for row in rows if manifest.covers(row)]
+            return SalesLedger(rows)
+
+        return self.cache.get(path, version, load)
+
+    def next_bill_id(self, username):
+        """Returns the bill id after the highest one of ``username``, without loading the monthly segments.
+
+        The manifest records the highest bill id of every compacted day,
+        undated lines included, and the hot segment holds the rest. Ids given
+        to idempotency keys whose lines never got written are not reused
+        either. Call with the store's lock held.
+        """
+        self._ensure_partitions(username)
+        manifest = self._load_manifest(username)
+        hot = self._load_hot(username, manifest)
+        return max([manifest.last_bill_id, self.load_bill_keys(username).last_bill_id] +
+                   [row['bill_id'] for row in hot]) + 1
+
+    def append_sales(self, username, rows, bill_keys=()):
+        """Appends bill lines to the hot sales segment; errors are raised.
+
+        ``bill_keys`` ({'key': ..., 'bill_id': ...} rows) are recorded first,
+        with the date of their bills, in ``<username>_bill_keys.csv``: a key
+        whose lines then fail to be written is found missing from the ledger
+        by ``find_bill_ids`` and its bill is taken again, whereas lines
+        without their key would be recorded twice. Call with the store's
+        lock held.
+        """
+        self._ensure_partitions(username)
+        if bill_keys:
+            dates = {row['bill_id']: row['date'] for row in rows}
+            path = self.bill_keys_file(username)
+            self._upgrade_bill_keys(path)
+            self.load_bill_keys(username)
+            before = file_version(path)
+            bill_keys = [dict(key, date=dates.get(key['bill_id'], '')) for key in bill_keys]
+            append_csv_rows(path, bill_keys, BILL_KEY_FIELDNAMES)
+            self.cache.extend(path, before, file_version(path), bill_keys)
+        path = self.hot_sales_file(username)
+        before = self._hot_version(username)
+        append_csv_rows(path, rows, SALES_FIELDNAMES)
+        self.cache.extend(path, before, self._hot_version(username), [dict(row) for row in rows])
+        # The first bill of a new day closes the previous ones
+        hot = self.cache.peek(path, self._hot_version(username))
+        if rows and hot is not None and hot.days()[0] < rows[0]['date']:
+            self.schedule_compaction(username)
+
+    def _upgrade_bill_keys(self, path):
+        # Files written before keys carried their bill's date get the new header; their rows keep no date
+        try:
+            with open(path, newline='', encoding='utf-8') as file:
+                header = file.readline().strip()
+        except OSError:
+            return
+        if header and header.split(',') != BILL_KEY_FIELDNAMES:
+            if not write_csv_rows(path, read_csv_rows(path, BILL_KEY_TYPES), BILL_KEY_FIELDNAMES):
+                raise OSError(f"Could not rewrite {path}")
+
+    def load_bill_keys(self, username):
+        """Returns the cached BillKeys of ``username``."""
+        path = self.bill_keys_file(username)
+        return self.cache.get(path, file_version(path), lambda: BillKeys(read_csv_rows(path, BILL_KEY_TYPES)))
+
+    def find_bill_ids(self, username, keys):
+        """Returns {key: bill id} for those of ``keys`` that already created a bill.
+
+        A key only counts once its bill's lines are in the ledger. Call with
+        the store's lock held.
+        """
+        bill_keys = self.load_bill_keys(username)
+        sales = None
+        found = {}
+        for key in keys:
+            entry = bill_keys.get(key)
+            if entry is None:
+                continue
+            bill_id, day = entry
+            if day is not None:
+                sales = sales or self.load_sales(username)
+                if not any(row['bill_id'] == bill_id for row in sales.rows_for_day(day)):
+                    continue
+            found[key] = bill_id
+        return found
+
+    def _ensure_partitions(self, username):
+        """Creates the partitioned sales layout, splitting up a legacy sales file if there is one.
+
+        Call with the store's lock held. The segments are written to a
+        scratch directory that is renamed into place, and the legacy file is
+        kept as ``<username>_sales.csv.migrated``.
+        """
+        if file_version(self.sales_manifest_file(username)) is not None:
+            return
+        legacy = self.sales_file(username)
+        self._write_partitions(username, read_csv_rows(legacy, SALES_TYPES))
+        if os.path.exists(legacy):
+            os.replace(legacy, legacy + '.migrated')
+
+    def _write_partitions(self, username, rows):
+        """Replaces the store's sales directory with ``rows`` split into segments."""
+        target = self.sales_dir(username)
+        scratch = target + '.partial'
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        today = date.today().isoformat()
+        manifest = SalesManifest()
+        months = {}
+        for row in rows:
+            if row['date'] < today:
+                months.setdefault(row['date'][:7], []).append(row)
+        for month, month_rows in months.items():
+            path = os.path.join(scratch, os.path.basename(self.sales_segment_file(username, month)))
+            if not write_csv_rows(path, month_rows, SALES_FIELDNAMES):
+                raise OSError(f"Could not write the {month} sales segment of {username}")
+            manifest.add_ledger(SalesLedger(month_rows))
+        hot_rows = [row for row in rows if row['date'] >= today]
+        if not (write_csv_rows(os.path.join(scratch, 'current.csv'), hot_rows, SALES_FIELDNAMES) and
+                write_csv_rows(os.path.join(scratch, 'manifest.csv'), manifest.to_rows(), SALES_MANIFEST_FIELDNAMES)):
+            raise OSError(f"Could not write the sales manifest of {username}")
+        # Whatever is in the way has no manifest: a leftover of an interrupted migration
+        shutil.rmtree(target, ignore_errors=True)
+        os.rename(scratch, target)
+
+    def compact_sales(self, username, today=None):
+        """Rolls the closed days of the hot segment into their monthly segments.
+
+        Takes the store's lock. Each touched month is rewritten whole (a few
+        thousand rows at most), then the manifest, then the hot segment, each
+        atomically; re-running after a crash at any point repairs the state.
+        Returns the number of sales lines moved.
+        """
+        today = today or date.today().isoformat()
+        with self.lock(username):
+            self._ensure_partitions(username)
+            manifest_path = self.sales_manifest_file(username)
+            hot_path = self.hot_sales_file(username)
+            manifest = SalesManifest(read_csv_rows(manifest_path, SALES_MANIFEST_TYPES))
+            hot_rows = read_csv_rows(hot_path, SALES_TYPES)
+            kept = [row for row in hot_rows if row['date'] >= today and not manifest.covers(row)]
+            closed = [row for row in hot_rows if row['date'] < today and not manifest.covers(row)]
+            if len(kept) == len(hot_rows):
+                return 0
+
+            months = {}
+            for row in closed:
+                months.setdefault(row['date'][:7], []).append(row)
+            for month, month_rows in months.items():
+                path = self.sales_segment_file(username, month)
+                # Lines the manifest does not list are leftovers of an interrupted compaction
+                existing = [row for row in self._read_rows(path, SALES_FIELDNAMES, SALES_TYPES)
+                            if manifest.covers(row)]
+                if not self._write_rows(path, existing + month_rows, SALES_FIELDNAMES, SALES_TYPES):
+                    return 0
+            manifest.add_ledger(SalesLedger(closed))
+            if not write_csv_rows(manifest_path, manifest.to_rows(), SALES_MANIFEST_FIELDNAMES):
+                return 0
+            manifest.version = file_version(manifest_path)
+            self.cache.put(manifest_path, manifest.version, manifest)
+            if write_csv_rows(hot_path, kept, SALES_FIELDNAMES):
+                self.cache.put(hot_path, self._hot_version(username), SalesLedger(kept))
+            return len(closed)
+
+    def schedule_compaction(self, username):
+        """Runs ``compact_sales`` for ``username`` in a background thread, unless one is already pending."""
+        with self._compacting_guard:
+            if username in self._compacting:
+                return
+            self._compacting.add(username)
+
+        def run():
+            try:
+                self.compact_sales(username)
+            except Exception as e:
+                print(f"Error compacting sales of {username}: {e}")
+            finally:
+                with self._compacting_guard:
+                    self._compacting.discard(username)
+
+        threading.Thread(target=run, name=f"compact-{username}", daemon=True).start()
+
+    def read_sales(self, username):
+        """Yields every sales row of ``username``, oldest day first, without migrating a legacy file."""
+        if file_version(self.sales_manifest_file(username)) is None:
+            return iter(read_csv_rows(self.sales_file(username), SALES_TYPES))
+        return iter(self._partitioned_sales(username))
+
+    def data_version(self, username):
+        """Returns a value that changes whenever the inventory or sales of ``username`` change."""
+        return (file_version(self.inventory_file(username)),) + self._hot_version(username)
+
+    # --- Reorder forecasts ---
+
+    def save_reorder_forecast(self, username, version, rows):
+        """Stores the reorder forecast of ``username`` made at ``version`` (a string) for any process to read."""
+        write_json_file(self.reorder_file(username), {'version': version, 'rows': rows})
+
+    def load_reorder_forecast(self, username):
+        """Returns (version, rows) of the stored reorder forecast of ``username``, or None."""
+        stored = read_json_file(self.reorder_file(username))
+        if not isinstance(stored, dict) or 'version' not in stored:
+            return None
+        return stored['version'], stored.get('rows') or []
+
+    # --- Discovery ---
+
+    def usernames(self):
+        """Returns every username with inventory or sales in the data directory."""
+        names = {u['username'] for u in self.load_users()}
+        for filename in os.listdir(self.data_dir):
+            for suffix in ('_inventory.csv', '_sales.csv', '_sales'):
+                if filename.endswith(suffix):
+                    if suffix != '_sales' or os.path.isdir(os.path.join(self.data_dir, filename)):
+                        names.add(filename[:-len(suffix)])
+        return sorted(names)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inventory (
+    username TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    Manufacturer TEXT,
+    expiry_date TEXT,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    price REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, id)
+);
+CREATE INDEX IF NOT EXISTS inventory_name ON inventory (username, name, Manufacturer);
+CREATE TABLE IF NOT EXISTS sales (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    bill_id INTEGER NOT NULL,
+    date TEXT,
+    time TEXT,
+    product_id INTEGER,
+    product_name TEXT,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    unit_price REAL NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sales_date ON sales (username, date);
+CREATE INDEX IF NOT EXISTS sales_bill_id ON sales (username, bill_id);
+CREATE TABLE IF NOT EXISTS bill_keys (
+    username TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bill_id INTEGER NOT NULL,
+    PRIMARY KEY (username, key)
+);
+-- The latest reorder forecast per store, as JSON, with the version it was made at
+CREATE TABLE IF NOT EXISTS reorder_forecasts (
+    username TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    rows TEXT NOT NULL
+);
+-- Bumped on every write so cached copies can be validated with one lookup
+CREATE TABLE IF NOT EXISTS generations (
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (username, kind)
+);
+"""
+
+
+class SqliteBackend:
+    """Single SQLite database in WAL mode with row-level inventory updates."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, cache=None):
+        self.path = path
+        self.cache = cache if cache is not None else DataStore()
+        self.locks = UserLocks(os.path.dirname(os.path.abspath(path)))
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def lock(self, name):
+        """Serializes read-modify-write cycles on one store's data.
+
+        Transactions already keep each write atomic; the lock additionally
+        stops two writers from validating against the same cached Inventory.
+        """
+        return self.locks.lock(name)
+
+    def registry_lock(self):
+        """Serializes changes to the user list."""
+        return self.locks.registry()
+
+    def _connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _generation(self, conn, username, kind):
+        row = conn.execute('SELECT generation FROM generations WHERE username = ? AND kind = ?',
+                           (username, kind)).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, conn, username, kind):
+        conn.execute('INSERT INTO generations (username, kind, generation) VALUES (?, ?, 1) '
+                     'ON CONFLICT (username, kind) DO UPDATE SET generation = generation + 1',
+                     (username, kind))
+        return self._generation(conn, username, kind)
+
+    # --- Users ---
+
+    def load_users(self):
+        """Returns every user row, with string ids like users.csv."""
+        rows = self._connection().execute('SELECT id, username, password_hash FROM users ORDER BY id')
+        return [{'id': str(r['id']), 'username': r['username'], 'password_hash': r['password_hash']}
+                for r in rows]
+
+    def load_user_registry(self):
+        """Returns the cached UserRegistry, reloaded only after a user is added or imported."""
+        conn = self._connection()
+        generation = self._generation(conn, '', 'users')
+        return self.cache.get(('users',), generation, lambda: UserRegistry(self.load_users()))
+
+    def create_user(self, username, password_hash, user_id=None):
+        """Registers a user and returns its id."""
+        conn = self._connection()
+        with transaction(conn):
+            cursor = conn.execute('INSERT INTO users (id, username, password_hash) VALUES (?, ?, ?)',
+                                  (user_id, username, password_hash))
+            self._bump(conn, '', 'users')
+        self.cache.invalidate(('users',))
+        return cursor.lastrowid
+
+    def update_password_hash(self, user_id, password_hash):
+        """Replaces the stored password hash of a user."""
+        conn = self._connection()
+        with transaction(conn):
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, to_int(user_id)))
+            self._bump(conn, '', 'users')
+        self.cache.invalidate(('users',))
+
+    # --- Inventory ---
+
+    def load_inventory(self, username):
+        """Returns the cached, indexed Inventory of ``username``."""
+        conn = self._connection()
+        generation = self._generation(conn, username, 'inventory')
+
+        def load():
+            rows = conn.execute('SELECT id, name, Manufacturer, expiry_date, quantity, price '
+                                'FROM inventory WHERE username = ? ORDER BY id', (username,))
+            inventory = Inventory(dict(row) for row in rows)
+            ROWS_PARSED.inc(len(inventory), source='sqlite')
+            return inventory
+
+        return self.cache.get(('inventory', username), generation, load)
+
+    def save_inventory(self, username, inventory):
+        """Writes only the rows added or updated since the last save."""
+        changed = inventory.take_changes()
+        conn = self._connection()
+        with transaction(conn):
+            conn.executemany(
+                'INSERT INTO inventory (username, id, name, Manufacturer, expiry_date, quantity, price) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (username, id) DO UPDATE SET '
+                'name = excluded.name, Manufacturer = excluded.Manufacturer, '
+                'expiry_date = excluded.expiry_date, quantity = excluded.quantity, price = excluded.price',
+                [(username, row['id'], row.get('name'), row.get('Manufacturer'), row.get('expiry_date'),
+                  to_int(row.get('quantity')), to_float(row.get('price'))) for row in changed])
+            generation = self._bump(conn, username, 'inventory')
+        self.cache.put(('inventory', username), generation, inventory)
+
+    # --- Sales ---
+
+    def load_sales(self, username):
+        """Returns the cached SalesLedger of ``username``."""
+        conn = self._connection()
+        generation = self._generation(conn, username, 'sales')
+
+        def load():
+            rows = conn.execute('SELECT ' + ', '.join(SALES_FIELDNAMES) +
+                                ' FROM sales WHERE username = ? ORDER BY seq', (username,))
+            sales = SalesLedger(dict(row) for row in rows)
+            ROWS_PARSED.inc(len(sales), source='sqlite')
+            return sales
+
+        return self.cache.get(('sales', username), generation, load)
+
+    def next_bill_id(self, username):
+        """Returns the bill id after the highest one of ``username``, via the bill_id index."""
+        row = self._connection().execute(
+            'SELECT MAX(bill_id) FROM sales WHERE username = ?', (username,)).fetchone()
+        return (row[0] or 0) + 1
+
+    def append_sales(self, username, rows, bill_keys=()):
+        """Inserts bill lines (and the batch ``bill_keys`` behind them) in one transaction; errors are raised."""
+        conn = self._connection()
+        with transaction(conn):
+            before = self._generation(conn, username, 'sales')
+            conn.executemany(
+                'INSERT INTO sales (username, ' + ', '.join(SALES_FIELDNAMES) + ') '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(username,) + tuple(row.get(field) for field in SALES_FIELDNAMES) for row in rows])
+            conn.executemany('INSERT OR IGNORE INTO bill_keys (username, key, bill_id) VALUES (?, ?, ?)',
+                             [(username, row['key'], row['bill_id']) for row in bill_keys])
+            after = self._bump(conn, username, 'sales')
+        self.cache.extend(('sales', username), before, after, [dict(row) for row in rows])
+
+    def data_version(self, username):
+        """Returns a value that changes whenever the inventory or sales of ``username`` change."""
+        conn = self._connection()
+        return (self._generation(conn, username, 'inventory'), self._generation(conn, username, 'sales'))
+
+    def save_reorder_forecast(self, username, version, rows):
+        """Stores the reorder forecast of ``username`` made at ``version`` (a string) for any process to read."""
+        conn = self._connection()
+        with transaction(conn):
+            conn.execute('INSERT OR REPLACE INTO reorder_forecasts (username, version, rows) VALUES (?, ?, ?)',
+                         (username, version, json.dumps(rows, separators=(',', ':'))))
+
+    def load_reorder_forecast(self, username):
+        """Returns (version, rows) of the stored reorder forecast of ``username``, or None."""
+        row = self._connection().execute('SELECT version, rows FROM reorder_forecasts WHERE username = ?',
+                                         (username,)).fetchone()
+        return None if row is None else (row['version'], json.loads(row['rows']))
+
+    def find_bill_ids(self, username, keys):
+        """Returns {key: bill id} for those of ``keys`` that already created a bill."""
+        conn = self._connection()
+        found = {}
+        keys = list(keys)
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute('SELECT key, bill_id FROM bill_keys WHERE username = ? AND key IN (' +
+                                ', '.join('?' * len(chunk)) + ')', [username] + chunk)
+            found.update((row['key'], row['bill_id']) for row in rows)
+        return found
+
+    # --- Discovery ---
+
+    def usernames(self):
+        """Returns every username with users, inventory or sales rows."""
+        rows = self._connection().execute(
+            'SELECT username FROM users UNION SELECT username FROM inventory '
+            'UNION SELECT username FROM sales ORDER BY 1')
+        return [row[0] for row in rows]
+
+    # --- Import ---
+
+    def import_csv(self, source):
+        """Copies users, inventories and sales from a CsvBackend, replacing existing rows.
+
+        Returns a summary dict of row counts.
+        """
+        conn = self._connection()
+        summary = {'users': 0, 'inventory': 0, 'sales': 0}
+        with transaction(conn):
+            for user in source.load_users():
+                conn.execute('INSERT OR REPLACE INTO users (id, username, password_hash) VALUES (?, ?, ?)',
+                             (to_int(user['id']) or None, user['username'], user['password_hash']))
+                summary['users'] += 1
+            self._bump(conn, '', 'users')
+            for username in source.usernames():
+                inventory = Inventory(read_csv_rows(source.inventory_file(username), INVENTORY_TYPES))
+                conn.execute('DELETE FROM inventory WHERE username = ?', (username,))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO inventory (username, id, name, Manufacturer, expiry_date, quantity, price) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(username, row['id'], row.get('name'), row.get('Manufacturer'), row.get('expiry_date'),
+                      row['quantity'], row['price']) for row in inventory])
+                summary['inventory'] += len(inventory)
+
+                sales = list(source.read_sales(username))
+                conn.execute('DELETE FROM sales WHERE username = ?', (username,))
+                conn.executemany(
+                    'INSERT INTO sales (username, ' + ', '.join(SALES_FIELDNAMES) + ') '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(username,) + tuple(row.get(field) for field in SALES_FIELDNAMES) for row in sales])
+                summary['sales'] += len(sales)
+
+                # Keys whose bills never reached the ledger are left out; later rows of a key win
+                bill_ids = {row['bill_id'] for row in sales}
+                bill_keys = [row for row in read_csv_rows(source.bill_keys_file(username), BILL_KEY_TYPES)
+                             if not row.get('date') or row['bill_id'] in bill_ids]
+                conn.execute('DELETE FROM bill_keys WHERE username = ?', (username,))
+                conn.executemany('INSERT OR REPLACE INTO bill_keys (username, key, bill_id) VALUES (?, ?, ?)',
+                                 [(username, row['key'], row['bill_id']) for row in bill_keys])
+
+                self._bump(conn, username, 'inventory')
+                self._bump(conn, username, 'sales')
+        return summary
+
+
+def create_backend(config, cache=None):
+    """Builds the backend selected by ``config['STORAGE_BACKEND']`` ('csv' or 'sqlite')."""
+    kind = config.get('STORAGE_BACKEND', 'csv')
+    if kind == 'csv':
+        return CsvBackend(config.get('DATA_DIR', '.'), cache, config.get('CSV_SNAPSHOTS', False))
+    if kind == 'sqlite':
+        return SqliteBackend(config.get('SQLITE_PATH', 'pharmacy.db'), cache)
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r}; expected 'csv' or 'sqlite'")
@@ -0,0 +1,43 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Hash passwords on the calling thread; set before app.py reads its settings
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """app.py with its storage pointed at a fresh CSV data directory."""
+    monkeypatch.setenv('DATA_DIR', str(tmp_path))
+    import app as app_module
+    from metrics import TimedBackend
+    from storage import CsvBackend
+    backend = CsvBackend(str(tmp_path), app_module.store)
+    monkeypatch.setattr(app_module, 'backend', TimedBackend(backend))
+    app_module.store.clear()
+    app_module.app.config['TESTING'] = True
+    return app_module
+
+
+@pytest.fixture
+def store_client(app_module):
+    """A test client signed in to store 'pharma', which sells ids 1 (100 in stock) and 2 (50)."""
+    from inventory import Inventory
+    user_id = app_module.backend.create_user('pharma', 'unused-hash')
+    app_module.backend.save_inventory('pharma', Inventory([
+        {'id': 1, 'name': 'Dolo 650', 'Manufacturer': 'Micro Labs', 'expiry_date': '2030-01-01',
+         'quantity': 100, 'price': 30.0},
+        {'id': 2, 'name': 'Crocin', 'Manufacturer': 'GSK', 'expiry_date': '2030-01-01', 'quantity': 50,
+         'price': 20.0},
+    ]))
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,72 @@
+# tests/test_billing_batch.py
+import pytest
+
+import storage
+
+BATCH = {'bills': [
+    {'idempotency_key': 'till1-0001', 'items': [{'id': 1, 'quantity': 2}]},
+    {'idempotency_key': 'till1-0002', 'items': [{'id': 1, 'quantity': 1}, {'id': 2, 'quantity': 5}]},
+]}
+
+
+def stock(app_module):
+    return {row['id']: row['quantity'] for row in app_module.backend.load_inventory('pharma')}
+
+
+def ledger(app_module):
+    return [(row['bill_id'], row['product_id'], row['quantity'])
+            for row in app_module.backend.load_sales('pharma').select()]
+
+
+def fail_appends_to(monkeypatch, suffix):
+    """Makes the next append to a file ending in ``suffix`` fail, as a full disk would."""
+    append_csv_rows = storage.append_csv_rows
+    failed = []
+
+    def failing(path, rows, fieldnames):
+        if path.endswith(suffix) and not failed:
+            failed.append(path)
+            raise OSError('No space left on device')
+        return append_csv_rows(path, rows, fieldnames)
+
+    monkeypatch.setattr(storage, 'append_csv_rows', failing)
+    return failed
+
+
+def test_resent_batch_is_reported_as_duplicates(app_module, store_client):
+    first = store_client.post('/api/billing/batch', json=BATCH).get_json()
+    assert first['processed'] == 2
+    again = store_client.post('/api/billing/batch', json=BATCH).get_json()
+    assert again['processed'] == 0 and again['duplicates'] == 2
+    assert [result['bill_id'] for result in again['results']] == [1, 2]
+    assert stock(app_module) == {1: 97, 2: 45}
+    assert ledger(app_module) == [(1, 1, 2), (2, 1, 1), (2, 2, 5)]
+
+
+@pytest.mark.parametrize('suffix', ['_bill_keys.csv', 'current.csv'])
+def test_batch_resent_after_a_failed_append_is_charged_once(app_module, store_client, monkeypatch, suffix):
+    failed = fail_appends_to(monkeypatch, suffix)
+    response = store_client.post('/api/billing/batch', json=BATCH)
+    assert response.status_code == 500 and failed
+    assert stock(app_module) == {1: 100, 2: 50}
+
+    again = store_client.post('/api/billing/batch', json=BATCH).get_json()
+    assert again['processed'] == 2 and again['duplicates'] == 0
+    assert stock(app_module) == {1: 97, 2: 45}
+    bills = [result['bill_id'] for result in again['results']]
+    assert len(ledger(app_module)) == 3 and {bill_id for bill_id, _, _ in ledger(app_module)} == set(bills)
+
+    third = store_client.post('/api/billing/batch', json=BATCH).get_json()
+    assert third['duplicates'] == 2
+    assert [result['bill_id'] for result in third['results']] == bills
+    assert stock(app_module) == {1: 97, 2: 45}
+
+
+def test_a_bill_with_a_bad_item_id_names_the_id_sent(app_module, store_client):
+    response = store_client.post('/api/billing/create', json={'items': [{'id': 'abc', 'quantity': 1}]})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "Invalid item ID 'abc'."
+    results = store_client.post('/api/billing/batch', json={'bills': [
+        {'idempotency_key': 'till1-0003', 'items': [{'id': 9, 'quantity': 1}]}]}).get_json()['results']
+    assert results[0]['message'] == 'Item with ID 9 not found in inventory.'
+    assert stock(app_module) == {1: 100, 2: 50}
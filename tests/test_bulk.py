@@ -0,0 +1,27 @@
+# tests/test_bulk.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk import clean_record  # noqa: E402
+
+
+def test_clean_record_accepts_a_valid_row():
+    medicine = clean_record({'name': 'Neg', 'Manufacturer': 'Z', 'quantity': '5', 'price': '1',
+                             'expiry_date': '2030-01-01'})
+    assert medicine == {'name': 'Neg', 'Manufacturer': 'Z', 'quantity': 5, 'price': 1.0,
+                        'expiry_date': '2030-01-01'}
+
+
+def test_clean_record_rejects_negative_quantity():
+    with pytest.raises(ValueError, match="quantity cannot be negative"):
+        clean_record({'name': 'Neg', 'Manufacturer': 'Z', 'quantity': '-5', 'price': '1',
+                      'expiry_date': '2030-01-01'})
+
+
+def test_clean_record_rejects_negative_price():
+    with pytest.raises(ValueError, match="price cannot be negative"):
+        clean_record({'name': 'Neg', 'Manufacturer': 'Z', 'quantity': '5', 'price': '-1'})
@@ -0,0 +1,68 @@
+# tests/test_forecast.py
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forecast as forecast_module  # noqa: E402
+from analytics import SalesAnalytics  # noqa: E402
+from datastore import DataStore  # noqa: E402
+from forecast import ReorderForecaster, ReorderRules  # noqa: E402
+from inventory import Inventory  # noqa: E402
+from storage import CsvBackend, SqliteBackend  # noqa: E402
+
+TODAY = date(2025, 3, 20).toordinal()
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def make_backend(request, tmp_path):
+    """Opens the same storage the way another process would, with its own cache."""
+    def make():
+        if request.param == 'csv':
+            backend = CsvBackend(str(tmp_path), DataStore())
+            backend.schedule_compaction = lambda username: None
+            return backend
+        return SqliteBackend(str(tmp_path / 'pharmacy.db'), DataStore())
+    backend = make()
+    backend.create_user('u', 'unused-hash')
+    inventory = Inventory()
+    inventory.add({'id': 1, 'name': 'Dolo 650', 'Manufacturer': 'Micro Labs', 'expiry_date': '2030-01-01',
+                   'quantity': 20, 'price': 30.0})
+    backend.save_inventory('u', inventory)
+    backend.append_sales('u', [{'bill_id': 1, 'date': '2025-03-15', 'time': '10:00:00', 'product_id': 1,
+                                'product_name': 'Dolo 650', 'quantity': 30, 'unit_price': 30.0,
+                                'total_amount': 900.0}])
+    return make
+
+
+def forecaster(backend):
+    analytics = SalesAnalytics(backend.cache)
+    return ReorderForecaster(backend, analytics, {}, workers=0)
+
+
+def test_a_refreshed_forecast_is_read_by_another_process(make_backend, monkeypatch):
+    rows = forecaster(make_backend()).refresh(['u'], ReorderRules(), TODAY)['u']
+    assert rows[0]['units_per_day'] == 1.0 and rows[0]['days_until_stockout'] == 20.0
+
+    def not_again(*args):
+        raise AssertionError('the saved forecast should have been used')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(forecast_module, 'forecast_store', not_again)
+        assert forecaster(make_backend()).forecast('u', ReorderRules(), TODAY) == rows
+
+
+def test_a_saved_forecast_is_not_used_after_a_change(make_backend):
+    rules = ReorderRules()
+    forecaster(make_backend()).refresh(['u'], rules, TODAY)
+
+    assert forecaster(make_backend()).forecast('u', ReorderRules(window_days=60), TODAY)[0]['units_per_day'] == 0.5
+    assert forecaster(make_backend()).forecast('u', rules, TODAY + 30)[0]['units_per_day'] == 0.0
+    backend = make_backend()
+    inventory = backend.load_inventory('u')
+    inventory.update(1, quantity=5)
+    backend.save_inventory('u', inventory)
+    assert forecaster(make_backend()).forecast('u', rules, TODAY)[0]['days_until_stockout'] == 5.0
@@ -0,0 +1,100 @@
+# tests/test_sales_partitions.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from storage import CsvBackend  # noqa: E402
+
+# Three closed days of one month; "today" is passed to compact_sales explicitly
+DAY1, DAY2, DAY3 = '2025-03-10', '2025-03-11', '2025-03-12'
+
+
+def bill(bill_id, day):
+    return {'bill_id': bill_id, 'date': day, 'time': '10:00:00', 'product_id': 1, 'product_name': 'Dettol',
+            'quantity': 1, 'unit_price': 50.0, 'total_amount': 50.0}
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = CsvBackend(str(tmp_path))
+    # Compactions run where the tests say, not in a background thread
+    monkeypatch.setattr(backend, 'schedule_compaction', lambda username: None)
+    return backend
+
+
+def bill_ids(backend):
+    return [row['bill_id'] for row in backend.load_sales('u').select()]
+
+
+def fresh_bill_ids(backend):
+    """What a new process reading the same files sees."""
+    return [row['bill_id'] for row in CsvBackend(backend.data_dir).read_sales('u')]
+
+
+def fail_writes_to(patch, filename):
+    """Makes CSV writes to ``filename`` fail as if the process had stopped there."""
+    write_csv_rows = storage.write_csv_rows
+
+    def failing(path, rows, fieldnames):
+        if os.path.basename(path) == filename:
+            return False
+        return write_csv_rows(path, rows, fieldnames)
+
+    patch.setattr(storage, 'write_csv_rows', failing)
+
+
+def test_a_view_older_than_a_compaction_does_not_leave_a_stale_segment_cached(backend):
+    backend.append_sales('u', [bill(1, DAY1)])
+    assert backend.compact_sales('u', today=DAY2) == 1
+    backend.append_sales('u', [bill(2, DAY2)])
+    stale = backend.load_sales('u')
+
+    assert backend.compact_sales('u', today=DAY3) == 1
+    # The old view still reads DAY2 from its hot segment and loads the month through its old manifest
+    assert [row['bill_id'] for row in stale.select()] == [1, 2]
+
+    sales = backend.load_sales('u')
+    assert sales.count() == 2
+    assert bill_ids(backend) == [1, 2]
+    assert [row['bill_id'] for row in sales.rows_for_day(DAY2)] == [2]
+    assert fresh_bill_ids(backend) == [1, 2]
+
+
+def test_compaction_stopped_before_the_manifest_is_repaired(backend, monkeypatch):
+    backend.append_sales('u', [bill(1, DAY1), bill(2, DAY2)])
+    with monkeypatch.context() as patch:
+        fail_writes_to(patch, 'manifest.csv')
+        assert backend.compact_sales('u', today=DAY3) == 0
+    # The segment holds both lines, but only the hot segment counts until the manifest lists them
+    assert fresh_bill_ids(backend) == [1, 2]
+
+    assert backend.compact_sales('u', today=DAY3) == 2
+    assert bill_ids(backend) == [1, 2]
+    assert fresh_bill_ids(backend) == [1, 2]
+    assert backend.load_sales('u').hot.days() == []
+
+
+def test_compaction_stopped_before_the_hot_segment_is_repaired(backend, monkeypatch):
+    backend.append_sales('u', [bill(1, DAY1), bill(2, DAY3)])
+    with monkeypatch.context() as patch:
+        fail_writes_to(patch, 'current.csv')
+        assert backend.compact_sales('u', today=DAY3) == 1
+    # The moved line is still in current.csv; the manifest says it belongs to the segment
+    assert fresh_bill_ids(backend) == [1, 2]
+
+    assert backend.compact_sales('u', today=DAY3) == 0
+    with open(backend.hot_sales_file('u')) as f:
+        assert f.read().count(DAY1) == 0
+    assert fresh_bill_ids(backend) == [1, 2]
+
+
+def test_next_bill_id_counts_compacted_and_hot_lines(backend):
+    backend.append_sales('u', [bill(4, DAY1)])
+    backend.compact_sales('u', today=DAY2)
+    assert backend.next_bill_id('u') == 5
+    backend.append_sales('u', [bill(5, DAY2)])
+    assert backend.next_bill_id('u') == 6
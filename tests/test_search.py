@@ -0,0 +1,45 @@
+# tests/test_search.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import Inventory  # noqa: E402
+from search import SearchIndex  # noqa: E402
+
+ROWS = [
+    {'id': 1, 'name': 'Crocin Advance', 'Manufacturer': 'GSK'},
+    {'id': 2, 'name': 'Dolo', 'Manufacturer': 'Micro Labs'},
+    {'id': 3, 'name': 'Paracetamol', 'Manufacturer': 'Dolo Pharma'},
+    {'id': 4, 'name': 'Dolonex', 'Manufacturer': 'Pfizer'},
+    {'id': 5, 'name': 'Cold Dolo Plus', 'Manufacturer': 'Cipla'},
+    {'id': 6, 'name': 'Antidolor', 'Manufacturer': 'Sun'},
+    {'id': 7, 'name': 'Vitamin C', 'Manufacturer': 'Apex Dolo'},
+    {'id': 8, 'name': 'dolo', 'Manufacturer': 'Cipla'},
+]
+
+
+def test_results_are_ranked_then_in_name_order():
+    index = SearchIndex(ROWS)
+    # Exact names, name prefix, word prefix, other name match, manufacturer prefix, other manufacturer match
+    assert index.search('Dolo', 50) == [2, 8, 4, 5, 6, 3, 7]
+    assert index.search('dolo', 3) == [2, 8, 4]
+    assert index.search('nothing', 50) == []
+    assert index.search('  ', 50) == []
+
+
+def test_changes_are_searchable_and_drop_cached_results():
+    index = SearchIndex(ROWS)
+    assert index.search('dolo', 50) == [2, 8, 4, 5, 6, 3, 7]
+    index.add({'id': 9, 'name': 'Dolo 650', 'Manufacturer': 'Micro Labs'})
+    index.update(ROWS[3], dict(ROWS[3], name='Nexdol'))
+    assert index.search('dolo', 50) == [2, 8, 9, 5, 6, 3, 7]
+    assert index.search('nexdol', 50) == [4]
+
+
+def test_inventory_search_sees_rows_changed_after_the_index_was_built():
+    inventory = Inventory([dict(row) for row in ROWS])
+    assert [row['id'] for row in inventory.search('crocin', 5)] == [1]
+    inventory.update(1, name='Crocin Pain Relief')
+    inventory.add({'name': 'Crocin Cold', 'Manufacturer': 'GSK'})
+    assert [row['name'] for row in inventory.search('crocin', 5)] == ['Crocin Cold', 'Crocin Pain Relief']
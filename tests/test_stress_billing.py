@@ -0,0 +1,71 @@
+# tests/test_stress_billing.py
+"""A small run of benchmarks/stress_billing.py: concurrent tills must not lose stock updates."""
+import threading
+from collections import Counter
+
+import pytest
+
+THREADS = 8
+BILLS = 20
+START_QUANTITY = 1000
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request, app_module, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        from metrics import TimedBackend
+        from storage import SqliteBackend
+        monkeypatch.setattr(app_module, 'backend',
+                            TimedBackend(SqliteBackend(str(tmp_path / 'stress.db'), app_module.store)))
+    return app_module.backend
+
+
+def test_concurrent_bills_keep_stock_ledger_and_bill_ids_consistent(app_module, backend):
+    from inventory import Inventory
+    user_id = backend.create_user('stress', 'unused-hash')
+    inventory = Inventory()
+    for item_id in (1, 2, 3):
+        inventory.add({'id': item_id, 'name': f'Medicine {item_id}', 'Manufacturer': 'Stress Labs',
+                       'expiry_date': '2099-12-31', 'quantity': START_QUANTITY, 'price': 1.5})
+    backend.save_inventory('stress', inventory)
+
+    sold = Counter()
+    bill_ids = []
+    failures = []
+    guard = threading.Lock()
+
+    def till(n):
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        for bill in range(BILLS):
+            lines = [{'id': 1, 'quantity': 1}, {'id': 2 + (n + bill) % 2, 'quantity': 1 + bill % 3}]
+            response = client.post('/api/billing/create', json={'items': lines})
+            with guard:
+                if response.status_code == 200:
+                    bill_ids.append(response.get_json()['bill_id'])
+                    for line in lines:
+                        sold[line['id']] += line['quantity']
+                else:
+                    failures.append(response.get_json())
+
+    tills = [threading.Thread(target=till, args=(n,)) for n in range(THREADS)]
+    for thread in tills:
+        thread.start()
+    for thread in tills:
+        thread.join()
+
+    assert failures == []
+    assert len(bill_ids) == THREADS * BILLS and len(set(bill_ids)) == len(bill_ids)
+    # Read back from storage, bypassing anything cached
+    app_module.store.clear()
+    inventory = backend.load_inventory('stress')
+    assert {item_id: inventory.get(item_id)['quantity'] for item_id in (1, 2, 3)} == \
+        {item_id: START_QUANTITY - sold[item_id] for item_id in (1, 2, 3)}
+    ledger = list(backend.load_sales('stress'))
+    assert {line['bill_id'] for line in ledger} == set(bill_ids)
+    units = Counter()
+    for line in ledger:
+        units[line['product_id']] += line['quantity']
+    assert units == sold
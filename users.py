@@ -0,0 +1,59 @@
+# users.py
+"""Registered users and the in-memory registry Flask-Login looks them up in."""
+
+
+class User:
+    """User class for Flask-Login.
+
+    Slotted rather than built on UserMixin (which would give every instance a
+    __dict__), since the registry keeps one of these per registered store.
+    """
+
+    __slots__ = ('id', 'username', 'password_hash')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, username, password_hash):
+        self.id = id
+        self.username = username
+        self.password_hash = password_hash
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self.get_id())
+
+
+class UserRegistry:
+    """Users indexed by id and by case-folded username, built once per users.csv version."""
+
+    def __init__(self, rows=()):
+        self._by_id = {}
+        self._by_name = {}
+        for row in rows:
+            user = User(str(row['id']), row['username'], row['password_hash'])
+            self._by_id.setdefault(user.id, user)
+            self._by_name.setdefault(user.username.casefold(), user)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, user_id):
+        """Returns the User with ``user_id`` (a string, as stored in the session), or None."""
+        return self._by_id.get(user_id)
+
+    def find(self, username):
+        """Returns the User called ``username`` (case-insensitive), or None."""
+        return self._by_name.get((username or '').casefold())